@@ -0,0 +1,150 @@
+"""
+End-to-end benchmark of ``POST /task/estimate_time``: latency and requests per
+second of the FastAPI app under concurrent load.
+
+The app runs in-process behind ``httpx.ASGITransport``, the Slack and Anthropic
+APIs are local stand-ins with a configurable latency and the ranker models are
+replaced by light encoders, so the numbers show the overhead and concurrency of
+the service itself.
+
+    python -m benchmarks.api --requests 500 --concurrency 32 --llm-latency-ms 300
+"""
+
+import asyncio
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+from typer import Typer
+
+from benchmarks.common import latency_stats, write_results
+from benchmarks.service import build_artifacts, fake_registry_dependencies
+from benchmarks.stand_ins import make_task_text
+from src.api.registry import ModelRegistry
+from src.main import app as fastapi_app
+
+app = Typer(pretty_exceptions_enable=False)
+
+
+def make_payload(i: int, rng: random.Random) -> dict:
+    return {
+        "jira_title": f"Task {i}",
+        "jira_description": make_task_text(rng, 30),
+        "slack_link": f"https://team.slack.com/archives/C1/p{1700000000 + i}000100",
+    }
+
+
+async def load_test(
+    client: httpx.AsyncClient, payloads: list[dict], concurrency: int
+) -> dict:
+    """
+    Send the payloads with at most ``concurrency`` requests in flight.
+
+    :param client:
+    :param payloads:
+    :param concurrency:
+    :return:
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    samples, errors = [], 0
+
+    async def send(payload: dict) -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/task/estimate_time", json=payload)
+            samples.append(time.perf_counter() - start)
+            errors += response.status_code != 200
+
+    start = time.perf_counter()
+    await asyncio.gather(*(send(payload) for payload in payloads))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(payloads),
+        "errors": errors,
+        "seconds": elapsed,
+        "requests_per_second": len(payloads) / elapsed,
+        "latency": latency_stats(samples),
+    }
+
+
+async def arun(
+    n_requests: int = 200,
+    concurrency_levels: tuple[int, ...] = (1, 8, 32),
+    corpus_size: int = 10_000,
+    slack_latency_seconds: float = 0.05,
+    llm_latency_seconds: float = 0.3,
+    seed: int = 0,
+) -> dict:
+    rng = random.Random(seed)  # noqa: S311
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        artifacts = build_artifacts(Path(tmp_dir), corpus_size)
+        with fake_registry_dependencies(
+            artifacts, slack_latency_seconds, llm_latency_seconds
+        ):
+            registry = ModelRegistry(model_path=artifacts["sparse_path"])
+            registry.load()
+        fastapi_app.state.registry = registry
+
+        transport = httpx.ASGITransport(app=fastapi_app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark", timeout=60
+        ) as client:
+            await load_test(client, [make_payload(-1, rng)], 1)  # warm up
+            for concurrency in concurrency_levels:
+                payloads = [make_payload(i, rng) for i in range(n_requests)]
+                results[str(concurrency)] = await load_test(
+                    client, payloads, concurrency
+                )
+
+        await registry.aclose()
+
+    return {
+        "corpus_size": corpus_size,
+        "slack_latency_ms": slack_latency_seconds * 1000,
+        "llm_latency_ms": llm_latency_seconds * 1000,
+        "by_concurrency": results,
+    }
+
+
+def run(**kwargs) -> dict:
+    return asyncio.run(arun(**kwargs))
+
+
+@app.command()
+def main(
+    requests: int = 200,
+    concurrency: str = "1,8,32",
+    corpus_size: int = 10_000,
+    slack_latency_ms: float = 50,
+    llm_latency_ms: float = 300,
+    output_path: Path | None = None,
+):
+    """
+    Load test of the estimation endpoint.
+
+    :param requests: requests per concurrency level
+    :param concurrency: comma-separated numbers of requests in flight
+    :param corpus_size: tasks in the ranker corpus and the model training data
+    :param slack_latency_ms: latency of the fake Slack API
+    :param llm_latency_ms: latency of the fake Anthropic API
+    :param output_path: write the results as JSON, stdout otherwise
+    :return:
+    """
+    results = run(
+        n_requests=requests,
+        concurrency_levels=tuple(int(c) for c in concurrency.split(",")),
+        corpus_size=corpus_size,
+        slack_latency_seconds=slack_latency_ms / 1000,
+        llm_latency_seconds=llm_latency_ms / 1000,
+    )
+    write_results({"api": results}, output_path)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,106 @@
+"""
+Timing helpers and the JSON results format shared by the benchmarks.
+"""
+
+import json
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def timed(func: Callable, *args, **kwargs) -> tuple[float, object]:
+    """
+    :return: wall time in seconds and the result of the call
+    """
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def latency_stats(samples_seconds) -> dict:
+    """
+    Summary of latency samples in milliseconds.
+
+    :param samples_seconds:
+    :return:
+    """
+    samples = np.asarray(samples_seconds, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        "n": len(samples),
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "max_ms": float(samples.max()),
+    }
+
+
+def measure_latency(func: Callable, inputs: list, warmup: int = 3) -> dict:
+    """
+    Latency of ``func`` called on every input in turn.
+
+    :param func:
+    :param inputs:
+    :param warmup: calls not measured, to fill caches and lazy imports
+    :return: ``latency_stats`` of the calls
+    """
+    for item in inputs[:warmup]:
+        func(item)
+
+    samples = []
+    for item in inputs:
+        elapsed, _ = timed(func, item)
+        samples.append(elapsed)
+    return latency_stats(samples)
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(  # noqa: S603
+            ["git", "rev-parse", "--short", "HEAD"],  # noqa: S607
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_metadata() -> dict:
+    return {
+        "commit": git_commit(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+
+
+def write_results(results: dict, output_path: Path | None = None) -> None:
+    """
+    Print the results as JSON or write them to ``output_path``, together with
+    the commit and the machine they were measured on.
+
+    :param results:
+    :param output_path:
+    :return:
+    """
+    text = json.dumps({"meta": run_metadata(), **results}, indent=4)
+    if output_path:
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        Path(output_path).write_text(text)
+    else:
+        print(text)
+
+
+def parse_sizes(sizes: str) -> list[int]:
+    return [int(size) for size in sizes.split(",") if size.strip()]
@@ -0,0 +1,190 @@
+"""
+Benchmark of the ``src/data`` stages on synthetic Jira exports.
+
+Every stage runs its real ``main`` on the output of the previous one, with the
+Slack and Anthropic APIs replaced by local stand-ins and incremental runs off.
+
+    python -m benchmarks.data_stages --sizes 1000,10000,100000 --workers 4
+"""
+
+import random
+import tempfile
+from functools import partial
+from pathlib import Path
+
+from typer import Typer
+
+from benchmarks.common import parse_sizes, timed, write_results
+from benchmarks.stand_ins import (
+    fake_slack_client,
+    fake_task_creator,
+    make_employees,
+    make_issue,
+    patched,
+)
+from src.data import combine_text_info_into_one_task as combine_stage
+from src.data import enrich_with_slack_thread as enrich_stage
+from src.data import filter_tasks_n_fields_jira_json as filter_stage
+from src.data import get_final_data_to_train as final_stage
+from src.data import remove_pii_from_data as pii_stage
+from src.data.storage import append_jsonl, read_dataset
+from src.tools.pii_purifier import PIIPurifier
+from src.tools.pii_redactor import PIIRedactor
+
+app = Typer(pretty_exceptions_enable=False)
+
+
+def run_stages(
+    directory: Path,
+    n_issues: int,
+    workers: int = 4,
+    slack_latency_seconds: float = 0.0,
+    llm_latency_seconds: float = 0.0,
+    seed: int = 42,
+) -> dict:
+    """
+    Generate an export of ``n_issues`` and time every stage on it.
+
+    :param directory: working directory of the run
+    :param n_issues:
+    :param workers: processes of the CPU-bound stages
+    :param slack_latency_seconds: latency of the fake Slack API
+    :param llm_latency_seconds: latency of the fake Anthropic API
+    :param seed:
+    :return: stage -> seconds, input and output records
+    """
+    rng = random.Random(seed)  # noqa: S311
+    n_employees = max(10, n_issues // 50)
+    employees = make_employees(n_employees)
+    issue_types = {"types": [{"id": str(i)} for i in range(20)]}
+    names = ["John Doe", "John", "Doe"]
+
+    export_path = directory / "raw_jira_tasks_from_api.jsonl"
+    append_jsonl(
+        export_path, (make_issue(i, n_employees, rng) for i in range(n_issues))
+    )
+
+    paths = {
+        name: directory / f"{name}_jira_tasks.parquet"
+        for name in ("filtered", "enriched", "cleaned", "combined", "final")
+    }
+    stages = [
+        (
+            "filter",
+            export_path,
+            paths["filtered"],
+            partial(filter_stage.main, workers=workers),
+        ),
+        (
+            "enrich_with_slack",
+            paths["filtered"],
+            paths["enriched"],
+            partial(enrich_stage.main, incremental=False),
+        ),
+        (
+            "remove_pii",
+            paths["enriched"],
+            paths["cleaned"],
+            partial(pii_stage.main, workers=workers, incremental=False),
+        ),
+        (
+            "combine_with_llm",
+            paths["cleaned"],
+            paths["combined"],
+            partial(
+                combine_stage.main,
+                use_cache=False,
+                checkpoint_path=directory / "combined.checkpoint.jsonl",
+                requests_per_minute=1e9,
+                incremental=False,
+            ),
+        ),
+        (
+            "final",
+            paths["combined"],
+            paths["final"],
+            partial(final_stage.main, workers=workers),
+        ),
+    ]
+
+    results = {}
+    with (
+        patched(
+            filter_stage,
+            read_employees_information=lambda: employees,
+            read_issues_information=lambda: issue_types,
+        ),
+        patched(
+            enrich_stage,
+            get_slack_client=partial(fake_slack_client, slack_latency_seconds),
+        ),
+        patched(
+            pii_stage,
+            PIIPurifier=partial(PIIPurifier, api_key="", redactor=PIIRedactor(names)),
+        ),
+        patched(
+            combine_stage,
+            TaskCreator=lambda **kwargs: fake_task_creator(llm_latency_seconds),
+        ),
+    ):
+        for name, input_path, output_path, stage in stages:
+            seconds, _ = timed(stage, input_path=input_path, output_path=output_path)
+            n_input = n_issues if name == "filter" else len(read_dataset(input_path))
+            results[name] = {
+                "seconds": seconds,
+                "input_records": n_input,
+                "output_records": len(read_dataset(output_path)),
+                "records_per_second": n_input / seconds,
+            }
+
+    return results
+
+
+def run(
+    sizes: list[int],
+    workers: int = 4,
+    slack_latency_seconds: float = 0.0,
+    llm_latency_seconds: float = 0.0,
+) -> dict:
+    results = {}
+    for n_issues in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            results[str(n_issues)] = run_stages(
+                Path(tmp_dir),
+                n_issues,
+                workers=workers,
+                slack_latency_seconds=slack_latency_seconds,
+                llm_latency_seconds=llm_latency_seconds,
+            )
+    return results
+
+
+@app.command()
+def main(
+    sizes: str = "1000,10000,100000",
+    workers: int = 4,
+    slack_latency_ms: float = 0.0,
+    llm_latency_ms: float = 0.0,
+    output_path: Path | None = None,
+):
+    """
+    Time every data stage on synthetic exports of the given sizes.
+
+    :param sizes: comma-separated numbers of issues in the export
+    :param workers: processes of the CPU-bound stages
+    :param slack_latency_ms: latency of the fake Slack API
+    :param llm_latency_ms: latency of the fake Anthropic API
+    :param output_path: write the results as JSON, stdout otherwise
+    :return:
+    """
+    results = run(
+        parse_sizes(sizes),
+        workers=workers,
+        slack_latency_seconds=slack_latency_ms / 1000,
+        llm_latency_seconds=llm_latency_ms / 1000,
+    )
+    write_results({"data_stages": results}, output_path)
+
+
+if __name__ == "__main__":
+    app()
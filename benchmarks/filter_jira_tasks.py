@@ -0,0 +1,148 @@
+"""
+Benchmark of the Jira filter stage: streaming pipeline with hash indexes vs the
+naive approach (whole export in memory, list passes, list membership and a
+linear employee scan per ticket).
+
+    python -m benchmarks.filter_jira_tasks --n-tickets 20000 --n-employees 2000
+"""
+
+import json
+import random
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from typer import Typer
+
+from benchmarks.common import write_results
+from benchmarks.stand_ins import make_employees, make_issue
+from src.data import filter_tasks_n_fields_jira_json as jira_filter
+from src.data.storage import (
+    append_jsonl,
+    iter_latest_by_key,
+    latest_by_key,
+    write_json_array,
+)
+
+app = Typer(pretty_exceptions_enable=False)
+
+
+class LinearEmployees:
+    """Employees list with the lookups of the original stage: linear scans."""
+
+    def __init__(self, employees: list[dict]):
+        self.employees = employees
+        self.emails = [employee["email"] for employee in employees]
+
+    def __contains__(self, email) -> bool:
+        return email in self.emails
+
+    def get(self, email):
+        return next((e for e in self.employees if e["email"] == email), None)
+
+
+def run_naive(input_path: Path, output_path: Path, employees, issue_types) -> int:
+    data = latest_by_key(
+        json.loads(line) for line in input_path.read_text().splitlines()
+    )
+    linear_employees = LinearEmployees(employees)
+    issue_types = list(issue_types)
+
+    data = list(jira_filter.filter_by_assignees(data, linear_employees))
+    data = list(jira_filter.filter_done_issues(data))
+    data = list(jira_filter.filter_by_issue_types(data, issue_types))
+    data = list(jira_filter.handle_custom_12039_12040_12041_fields(data))
+    data = list(jira_filter.filter_necessary_fields(data))
+    data = list(jira_filter.add_employee_information(data, linear_employees))
+    data = list(jira_filter.extract_slack_link_from_description(data))
+    data = list(jira_filter.calculate_experience_weeks(data))
+    data = list(jira_filter.filter_null_timeestimates(data))
+    data = list(jira_filter.calculate_time_to_complete(data))
+    data = list(jira_filter.rename_fields(data, jira_filter.FIELDS_RENAMING))
+
+    output_path.write_text(json.dumps(data, indent=4, ensure_ascii=False))
+    return len(data)
+
+
+def run_streaming(input_path: Path, output_path: Path, employees, issue_types):
+    data = iter_latest_by_key(input_path)
+    data = jira_filter.filter_jira_tasks(
+        data, jira_filter.index_employees_by_email(employees), set(issue_types)
+    )
+    return write_json_array(output_path, data)
+
+
+def measure(func, *args) -> dict:
+    start = time.perf_counter()
+    count = func(*args)
+    elapsed = time.perf_counter() - start
+
+    # tracing slows the run down, so memory is measured in a separate run
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"tasks": count, "seconds": elapsed, "peak_memory_mb": peak / 2**20}
+
+
+def run(n_tickets: int = 20_000, n_employees: int = 2_000, seed: int = 42) -> dict:
+    """
+    Generate a synthetic export and time both implementations on it.
+
+    :param n_tickets:
+    :param n_employees:
+    :param seed:
+    :return:
+    """
+    rng = random.Random(seed)  # noqa: S311
+    employees = make_employees(n_employees)
+    issue_types = [str(i) for i in range(10)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        export_path = tmp_dir / "raw_jira_tasks.jsonl"
+        append_jsonl(
+            export_path, (make_issue(i, n_employees, rng) for i in range(n_tickets))
+        )
+
+        naive = measure(
+            run_naive, export_path, tmp_dir / "naive.json", employees, issue_types
+        )
+        streaming = measure(
+            run_streaming, export_path, tmp_dir / "stream.json", employees, issue_types
+        )
+
+    return {
+        "n_tickets": n_tickets,
+        "n_employees": n_employees,
+        "naive": naive,
+        "streaming": streaming,
+        "speedup": naive["seconds"] / streaming["seconds"],
+        "memory_ratio": naive["peak_memory_mb"] / streaming["peak_memory_mb"],
+    }
+
+
+@app.command()
+def main(
+    n_tickets: int = 20_000,
+    n_employees: int = 2_000,
+    seed: int = 42,
+    output_path: Path | None = None,
+):
+    """
+    Compare the naive and the streaming filter on a synthetic export.
+
+    :param n_tickets:
+    :param n_employees:
+    :param seed:
+    :param output_path: write the results as JSON, stdout otherwise
+    :return:
+    """
+    results = run(n_tickets, n_employees, seed)
+    write_results({"filter_jira_tasks": results}, output_path)
+
+
+if __name__ == "__main__":
+    app()
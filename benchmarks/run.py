@@ -0,0 +1,137 @@
+"""
+Run all benchmarks and compare the results of two commits.
+
+    python -m benchmarks.run all
+    python -m benchmarks.run compare benchmarks/results/<old>.json \\
+        benchmarks/results/<new>.json
+"""
+
+import json
+from pathlib import Path
+
+from typer import Typer
+
+from benchmarks import api, data_stages, filter_jira_tasks, service
+from benchmarks.common import RESULTS_DIR, git_commit, parse_sizes, write_results
+
+app = Typer(pretty_exceptions_enable=False)
+
+# suffixes of the metrics where lower is better, the rest of the rates are
+# higher-is-better
+LOWER_IS_BETTER = ("seconds", "_ms", "peak_memory_mb")
+HIGHER_IS_BETTER = ("per_second",)
+
+
+@app.command(name="all")
+def run_all(
+    sizes: str = "1000,10000,100000",
+    workers: int = 4,
+    output_path: Path | None = None,
+):
+    """
+    Run every benchmark and save the results as
+    ``benchmarks/results/<commit>.json``.
+
+    :param sizes: comma-separated sizes of the synthetic exports and of the
+        ranker corpus
+    :param workers: processes of the CPU-bound data stages
+    :param output_path:
+    :return:
+    """
+    sizes = parse_sizes(sizes)
+    results = {
+        "service": service.run(sizes),
+        "data_stages": data_stages.run(sizes, workers=workers),
+        "filter_jira_tasks": filter_jira_tasks.run(n_tickets=max(sizes)),
+        "api": api.run(),
+    }
+
+    output_path = output_path or RESULTS_DIR / f"{git_commit() or 'unknown'}.json"
+    write_results(results, output_path)
+    print(f"Saved benchmark results to {output_path}")
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    """
+    Numeric leaves of the results by their dotted path.
+
+    :param results:
+    :param prefix:
+    :return:
+    """
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{path}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare_results(baseline: dict, candidate: dict, threshold: float = 0.1) -> dict:
+    """
+    Relative change of every timing and rate present in both results.
+
+    :param baseline:
+    :param candidate:
+    :param threshold: relative change that counts as a regression
+    :return: metric -> baseline, candidate, change and whether it regressed
+    """
+    baseline, candidate = flatten(baseline), flatten(candidate)
+    comparison = {}
+    for metric in sorted(baseline.keys() & candidate.keys()):
+        if metric.startswith("meta."):
+            continue
+        if metric.endswith(LOWER_IS_BETTER):
+            sign = 1
+        elif metric.endswith(HIGHER_IS_BETTER):
+            sign = -1
+        else:
+            continue
+        if not baseline[metric]:
+            continue
+
+        change = (candidate[metric] - baseline[metric]) / baseline[metric]
+        comparison[metric] = {
+            "baseline": baseline[metric],
+            "candidate": candidate[metric],
+            "change": change,
+            "regression": sign * change > threshold,
+        }
+    return comparison
+
+
+@app.command()
+def compare(baseline_path: Path, candidate_path: Path, threshold: float = 0.1):
+    """
+    Print the metrics that changed by more than ``threshold`` between two runs.
+
+    :param baseline_path:
+    :param candidate_path:
+    :param threshold: relative change, 0.1 is 10%
+    :return:
+    """
+    comparison = compare_results(
+        json.loads(baseline_path.read_text()),
+        json.loads(candidate_path.read_text()),
+        threshold,
+    )
+    changed = {
+        metric: values
+        for metric, values in comparison.items()
+        if abs(values["change"]) > threshold
+    }
+    for metric, values in changed.items():
+        status = "REGRESSION" if values["regression"] else "improvement"
+        print(
+            f"{status:>11} {values['change']:+7.1%} {metric}: "
+            f"{values['baseline']:.4g} -> {values['candidate']:.4g}"
+        )
+
+    regressions = sum(values["regression"] for values in changed.values())
+    print(f"{len(comparison)} metrics compared, {regressions} regressions")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,299 @@
+"""
+Benchmarks of the estimation service artifacts: service construction, the
+regression model and the ranker.
+
+    python -m benchmarks.service --corpus-sizes 1000,10000,100000
+"""
+
+import random
+import tempfile
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+
+import joblib
+import numpy as np
+from typer import Typer
+
+from benchmarks.common import (
+    latency_stats,
+    measure_latency,
+    parse_sizes,
+    timed,
+    write_results,
+)
+from benchmarks.stand_ins import (
+    HashingEncoder,
+    OverlapCrossEncoder,
+    fake_slack_client,
+    fake_task_creator,
+    fake_task_estimator,
+    make_final_tasks,
+    make_task_text,
+    patched,
+)
+from src.api import ranker as ranker_module
+from src.api import registry as registry_module
+from src.api import services as services_module
+from src.api.ranker import Ranker
+from src.api.registry import ModelRegistry
+from src.api.services import AsyncTaskEstimatorService
+from src.data.datasets import FINAL_SCHEMA
+from src.data.storage import write_dataset
+from src.modeling.embedding_index import TaskEmbeddingIndex
+from src.modeling.sparse_model import SPARSE_MODEL_FILE, SparseTextRegression
+from src.modeling.train import TokenizedCorpus, fit_model, transform_target
+
+app = Typer(pretty_exceptions_enable=False)
+
+ENCODER_NAME = "benchmark-hashing-encoder"
+
+
+def build_artifacts(directory: Path, n_tasks: int, seed: int = 42) -> dict:
+    """
+    Final dataset, embedding index and both model formats trained on it.
+
+    :param directory:
+    :param n_tasks:
+    :param seed:
+    :return: paths of the artifacts
+    """
+    tasks = make_final_tasks(n_tasks, seed)
+    data_path = directory / "final_data_to_train.parquet"
+    write_dataset(data_path, tasks, FINAL_SCHEMA)
+
+    texts = [task["task_text"] for task in tasks]
+    index_path = directory / "task_embeddings.npy"
+    TaskEmbeddingIndex.build(texts, HashingEncoder(), ENCODER_NAME).save(index_path)
+
+    y = transform_target(np.array([task["time_to_complete_hours"] for task in tasks]))
+    model = fit_model(TokenizedCorpus.from_texts(texts), y)
+    model_path = directory / "regression_model.pkl"
+    joblib.dump(model, model_path)
+    sparse_path = directory / SPARSE_MODEL_FILE
+    SparseTextRegression.from_pipeline(model).save(sparse_path)
+
+    return {
+        "data_path": data_path,
+        "index_path": index_path,
+        "model_path": model_path,
+        "sparse_path": sparse_path,
+    }
+
+
+def fake_models():
+    """
+    The ranker models replaced with the local stand-ins.
+
+    :return: context manager
+    """
+    return patched(
+        ranker_module,
+        SentenceTransformer=lambda name: HashingEncoder(),
+        CrossEncoder=lambda name: OverlapCrossEncoder(),
+    )
+
+
+@contextmanager
+def fake_registry_dependencies(
+    artifacts: dict,
+    slack_latency_seconds: float = 0.0,
+    llm_latency_seconds: float = 0.0,
+):
+    """
+    ``ModelRegistry.load`` builds the service from the benchmark artifacts and
+    the local stand-ins.
+
+    :param artifacts:
+    :param slack_latency_seconds:
+    :param llm_latency_seconds:
+    :return:
+    """
+    with (
+        fake_models(),
+        patched(
+            registry_module,
+            Ranker=partial(load_ranker, artifacts),
+            TaskCreator=lambda **kwargs: fake_task_creator(llm_latency_seconds),
+            TaskEstimator=partial(fake_task_estimator, llm_latency_seconds),
+            get_llm_cache=lambda: None,
+        ),
+        patched(
+            services_module,
+            get_slack_client=partial(
+                fake_slack_client, slack_latency_seconds, max_concurrency=64
+            ),
+        ),
+    ):
+        yield
+
+
+def load_ranker(artifacts: dict, n_candidates: int = 50) -> Ranker:
+    return Ranker(
+        data_path=artifacts["data_path"],
+        index_path=artifacts["index_path"],
+        bi_encoder_name=ENCODER_NAME,
+        n_candidates=n_candidates,
+    )
+
+
+def bench_construction(artifacts: dict, repeat: int = 5) -> dict:
+    """
+    Cold start: the registry loads every artifact from disk, with the pickled
+    and with the memory-mapped sparse model. Warm: a service is built around
+    already loaded artifacts, as on a model hot swap.
+
+    :param artifacts:
+    :param repeat:
+    :return:
+    """
+    results = {}
+    with fake_registry_dependencies(artifacts):
+        for name, path in (
+            ("cold_pickle", artifacts["model_path"]),
+            ("cold_sparse", artifacts["sparse_path"]),
+        ):
+            samples = []
+            for _ in range(repeat):
+                registry = ModelRegistry(model_path=path)
+                elapsed, _ = timed(registry.load)
+                samples.append(elapsed)
+            results[name] = latency_stats(samples)
+
+        service = registry.service
+        samples = []
+        for _ in range(repeat):
+            elapsed, _ = timed(
+                AsyncTaskEstimatorService,
+                task_creator=service.task_creator,
+                task_estimator=service.task_estimator,
+                ranker=service.ranker,
+                model=service.model,
+                executor=service.executor,
+                slack_client=service.slack_client,
+            )
+            samples.append(elapsed)
+        results["warm"] = latency_stats(samples)
+
+        model_seconds = {
+            "pickle_load_seconds": timed(joblib.load, artifacts["model_path"])[0],
+            "sparse_load_seconds": timed(
+                SparseTextRegression.load, artifacts["sparse_path"]
+            )[0],
+        }
+
+    return {**results, **model_seconds}
+
+
+def bench_predict(
+    artifacts: dict, batch_sizes: list[int], n_texts: int = 4096, seed: int = 0
+) -> dict:
+    """
+    Throughput of ``model.predict`` of both model formats.
+
+    :param artifacts:
+    :param batch_sizes:
+    :param n_texts:
+    :param seed:
+    :return:
+    """
+    rng = random.Random(seed)  # noqa: S311
+    texts = [make_task_text(rng) for _ in range(n_texts)]
+    models = {
+        "pickle": joblib.load(artifacts["model_path"]),
+        "sparse": SparseTextRegression.load(artifacts["sparse_path"]),
+    }
+
+    results = {}
+    for name, model in models.items():
+        for batch_size in batch_sizes:
+            batches = [
+                texts[i : i + batch_size] for i in range(0, len(texts), batch_size)
+            ]
+            stats = measure_latency(model.predict, batches)
+            stats["texts_per_second"] = batch_size / (stats["mean_ms"] / 1000)
+            results[f"{name}_batch_{batch_size}"] = stats
+
+    return results
+
+
+def bench_ranker(
+    corpus_sizes: list[int], n_queries: int = 50, top_k: int = 5, seed: int = 0
+) -> dict:
+    """
+    Latency of ``Ranker.rank`` and throughput of ``Ranker.rank_batch`` versus
+    the corpus size.
+
+    :param corpus_sizes:
+    :param n_queries:
+    :param top_k:
+    :param seed:
+    :return:
+    """
+    rng = random.Random(seed)  # noqa: S311
+    queries = [make_task_text(rng, 15) for _ in range(n_queries)]
+
+    results = {}
+    for corpus_size in corpus_sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir, fake_models():
+            artifacts = build_artifacts(Path(tmp_dir), corpus_size)
+            load_seconds, ranker = timed(load_ranker, artifacts)
+
+            stats = measure_latency(lambda query: ranker.rank(query, top_k), queries)
+            batch_seconds, _ = timed(ranker.rank_batch, queries, top_k)
+
+        results[str(corpus_size)] = {
+            "load_seconds": load_seconds,
+            "rank": stats,
+            "rank_batch_queries_per_second": n_queries / batch_seconds,
+        }
+
+    return results
+
+
+def run(
+    corpus_sizes: list[int],
+    n_tasks: int = 10_000,
+    batch_sizes: tuple[int, ...] = (1, 32, 1024),
+) -> dict:
+    """
+    All service benchmarks.
+
+    :param corpus_sizes: ranker corpus sizes
+    :param n_tasks: training data of the model and corpus of the construction
+        benchmark
+    :param batch_sizes: ``model.predict`` batch sizes
+    :return:
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir, fake_models():
+        artifacts = build_artifacts(Path(tmp_dir), n_tasks)
+        construction = bench_construction(artifacts)
+        predict = bench_predict(artifacts, list(batch_sizes))
+
+    return {
+        "construction": construction,
+        "predict": predict,
+        "ranker": bench_ranker(corpus_sizes),
+    }
+
+
+@app.command()
+def main(
+    corpus_sizes: str = "1000,10000,100000",
+    n_tasks: int = 10_000,
+    output_path: Path | None = None,
+):
+    """
+    Benchmark the service construction, the model and the ranker.
+
+    :param corpus_sizes: comma-separated ranker corpus sizes
+    :param n_tasks: tasks the model is trained on
+    :param output_path: write the results as JSON, stdout otherwise
+    :return:
+    """
+    results = run(parse_sizes(corpus_sizes), n_tasks=n_tasks)
+    write_results({"service": results}, output_path)
+
+
+if __name__ == "__main__":
+    app()
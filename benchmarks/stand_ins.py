@@ -0,0 +1,287 @@
+"""
+Local stand-ins for the external services and synthetic data for the benchmarks.
+
+The Anthropic and Slack fakes answer like the real APIs after a configurable
+latency, so the benchmarks measure our code and the concurrency it allows, not
+the network. The encoders replace the sentence-transformers models, which
+cannot be downloaded in CI.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.data.slack_client import SlackClient
+from src.tools.ask_anthropic import TaskEstimator
+from src.tools.task_creator import TaskCreator
+
+STEMS = [
+    "dashboard", "pipeline", "report", "query", "etl", "model", "api", "button",
+    "login", "retention", "metric", "table", "job", "cohort", "alert", "export",
+    "schema", "feature", "segment", "funnel",
+]  # fmt: skip
+VERBS = ["fix", "add", "build", "refactor", "update", "remove", "speed", "check"]
+
+
+def make_employees(n_employees: int) -> list[dict]:
+    return [
+        {
+            "email": f"employee{i}@example.com",
+            "level": "middle",
+            "join_date": "2020-01-01",
+            "level_order": i % 5,
+        }
+        for i in range(n_employees)
+    ]
+
+
+def make_task_text(rng: random.Random, n_words: int = 40) -> str:
+    words = [
+        rng.choice(VERBS) if i % 4 == 0 else f"{rng.choice(STEMS)}{rng.randrange(50)}"
+        for i in range(n_words)
+    ]
+    return "**Summary** " + " ".join(words)
+
+
+def make_issue(i: int, n_employees: int, rng: random.Random) -> dict:
+    """
+    One issue of the Jira export. About a third of them pass the filter stage.
+
+    :param i:
+    :param n_employees:
+    :param rng:
+    :return:
+    """
+    return {
+        "key": f"PRT-{i}",
+        "fields": {
+            "summary": f"Task {i}",
+            "description": f"{make_task_text(rng, 20)} ask John Doe +1 (555) 123-4567 "
+            f"https://team.slack.com/archives/C1/p{1700000000 + i}000100",
+            "issuetype": {"id": str(rng.randrange(20))},
+            "status": {"name": rng.choice(["Done", "Done", "In Progress"])},
+            "created": "2024-01-01T10:00:00.000+0000",
+            "updated": "2024-01-02T10:00:00.000+0000",
+            "timeestimate": rng.choice([None, 3600 * rng.randrange(1, 40)]),
+            "timeoriginalestimate": 3600 * rng.randrange(1, 40),
+            "assignee": {
+                "emailAddress": f"employee{rng.randrange(2 * n_employees)}"
+                "@example.com"
+            },
+        },
+    }
+
+
+def make_final_tasks(n_tasks: int, seed: int = 42) -> list[dict]:
+    """
+    Rows of the final dataset: the ranker corpus and the model training data.
+
+    :param n_tasks:
+    :param seed:
+    :return:
+    """
+    rng = random.Random(seed)  # noqa: S311
+    return [
+        {
+            "assignee_level_order": i % 5,
+            "jira_key": f"PRT-{i}",
+            "jira_created": f"2024-01-01T{i % 24:02d}:00:00.000+0000",
+            "weeks_since_member_join": rng.randrange(200),
+            "time_to_complete_hours": rng.randrange(1, 24),
+            "task_text": make_task_text(rng),
+        }
+        for i in range(n_tasks)
+    ]
+
+
+class HashingEncoder:
+    """Stand-in for ``SentenceTransformer``: hashed bag of words."""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def encode(self, texts, batch_size: int = 64, **kwargs) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                digest = hashlib.blake2b(word.encode(), digest_size=4).digest()
+                vectors[row, int.from_bytes(digest, "little") % self.dim] += 1
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class OverlapCrossEncoder:
+    """Stand-in for ``CrossEncoder``: shared words of the query and the task."""
+
+    def predict(self, pairs, **kwargs) -> np.ndarray:
+        return np.array(
+            [len(set(query.split()) & set(text.split())) for query, text in pairs],
+            dtype=np.float32,
+        )
+
+
+def fake_message(params: dict) -> SimpleNamespace:
+    """
+    Answer of the Messages API in the format the tools expect: a task summary
+    for ``TaskCreator`` and a JSON estimate for ``TaskEstimator``.
+
+    :param params: ``messages.create`` parameters
+    :return:
+    """
+    prompt = params["messages"][0]["content"][-1]["text"]
+    prefill = params["messages"][-1]["content"][0]["text"]
+    if prefill.startswith("```json"):
+        text = json.dumps({"estimated_time": 6, "explanation": "similar tasks"}) + "```"
+    else:
+        text = f"**Summary** {prompt[-300:]}\n```"
+
+    usage = SimpleNamespace(
+        input_tokens=len(prompt) // 4,
+        output_tokens=len(text) // 4,
+        cache_creation_input_tokens=0,
+        cache_read_input_tokens=0,
+    )
+    return SimpleNamespace(content=[SimpleNamespace(text=text)], usage=usage)
+
+
+class FakeMessageStream:
+    """Stand-in for the ``messages.stream`` context manager: the answer word by
+    word, spread over the latency."""
+
+    def __init__(self, message: SimpleNamespace, latency_seconds: float = 0.0):
+        self.message = message
+        self.latency_seconds = latency_seconds
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    @property
+    async def text_stream(self):
+        words = self.message.content[0].text.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.latency_seconds / len(words))
+            yield word if i == 0 else f" {word}"
+
+    async def get_final_message(self) -> SimpleNamespace:
+        return self.message
+
+
+class FakeAnthropic:
+    """Stand-in for ``anthropic.Anthropic``."""
+
+    def __init__(self, latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.messages = self
+
+    def create(self, **params) -> SimpleNamespace:
+        time.sleep(self.latency_seconds)
+        return fake_message(params)
+
+
+class FakeAsyncAnthropic(FakeAnthropic):
+    """Stand-in for ``anthropic.AsyncAnthropic``."""
+
+    async def create(self, **params) -> SimpleNamespace:
+        await asyncio.sleep(self.latency_seconds)
+        return fake_message(params)
+
+    def stream(self, **params) -> FakeMessageStream:
+        return FakeMessageStream(fake_message(params), self.latency_seconds)
+
+
+def fake_task_creator(latency_seconds: float = 0.0) -> TaskCreator:
+    task_creator = TaskCreator(api_key="")
+    task_creator.client = FakeAnthropic(latency_seconds)
+    task_creator.async_client = FakeAsyncAnthropic(latency_seconds)
+    return task_creator
+
+
+def fake_task_estimator(latency_seconds: float = 0.0) -> TaskEstimator:
+    task_estimator = TaskEstimator(api_key="")
+    task_estimator.client = FakeAnthropic(latency_seconds)
+    task_estimator.async_client = FakeAsyncAnthropic(latency_seconds)
+    return task_estimator
+
+
+def replies_response(params: dict, n_messages: int = 5) -> SimpleNamespace:
+    ts = float(params["ts"])
+    messages = [
+        {"type": "message", "text": f"reply {i} about the task", "ts": f"{ts + i:.6f}"}
+        for i in range(n_messages)
+    ]
+    payload = {"ok": True, "messages": messages}
+    return SimpleNamespace(status_code=200, json=lambda: payload, headers={})
+
+
+class FakeSlackSession:
+    """Stand-in for the ``requests.Session`` of ``SlackClient``."""
+
+    def __init__(self, latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+
+    def get(self, url, headers, params, timeout=None) -> SimpleNamespace:
+        time.sleep(self.latency_seconds)
+        return replies_response(params)
+
+    def close(self):
+        pass
+
+
+class FakeAsyncSlackSession(FakeSlackSession):
+    """Stand-in for the ``httpx.AsyncClient`` of ``SlackClient``."""
+
+    async def get(self, url, headers, params, timeout=None) -> SimpleNamespace:
+        await asyncio.sleep(self.latency_seconds)
+        return replies_response(params)
+
+    async def aclose(self):
+        pass
+
+
+def fake_slack_client(
+    latency_seconds: float = 0.0, max_concurrency: int = 4
+) -> SlackClient:
+    """
+    Slack client without the rate limit and the disk cache, talking to the fakes.
+
+    :param latency_seconds:
+    :param max_concurrency:
+    :return:
+    """
+    slack_client = SlackClient(
+        token="",
+        cache=None,
+        requests_per_minute=1e9,
+        max_concurrency=max_concurrency,
+    )
+    slack_client.session = FakeSlackSession(latency_seconds)
+    slack_client.async_client = FakeAsyncSlackSession(latency_seconds)
+    return slack_client
+
+
+@contextmanager
+def patched(module, **attributes):
+    """
+    Temporarily replace module attributes, e.g. the model classes of the ranker.
+
+    :param module:
+    :param attributes: name -> replacement
+    :return:
+    """
+    originals = {name: getattr(module, name) for name in attributes}
+    for name, value in attributes.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in originals.items():
+            setattr(module, name, value)
@@ -1,19 +1,186 @@
-from fastapi import APIRouter
-from src.api.schemas import TaskInputSchema, TaskOutputSchema
-from src.api.services import TaskEstimatorService
+import json
+from collections.abc import AsyncIterator
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from loguru import logger
+
+from src.api.metrics import CONTENT_TYPE, REGISTRY, service_metrics
+from src.api.registry import ModelRegistry
+from src.api.schemas import (
+    ReadinessSchema,
+    ServiceStatsSchema,
+    TaskBatchInputSchema,
+    TaskBatchOutputSchema,
+    TaskInputSchema,
+    TaskOutputSchema,
+)
+from src.api.services import AsyncTaskEstimatorService
 
 router = APIRouter(
     prefix="/task",
 )
 
+health_router = APIRouter(
+    prefix="/health",
+)
+
+metrics_router = APIRouter()
+
+
+def get_registry(request: Request) -> ModelRegistry:
+    """
+    Реестр моделей текущего воркера (создается в lifespan приложения).
+
+    :param request:
+    :return:
+    """
+    return request.app.state.registry
+
+
+def get_service(
+    registry: ModelRegistry = Depends(get_registry),
+) -> AsyncTaskEstimatorService:
+    """
+    Сервис оценки с уже загруженными моделями.
+
+    :param registry:
+    :return:
+    """
+    if not registry.ready:
+        raise HTTPException(status_code=503, detail="Models are not loaded yet")
+
+    return registry.service
+
 
 @router.post("/estimate_time")
-async def estimate_time(task: TaskInputSchema) -> TaskOutputSchema:
+async def estimate_time(
+    task: TaskInputSchema,
+    service: AsyncTaskEstimatorService = Depends(get_service),
+) -> TaskOutputSchema:
     """
     Оценка времени выполнения задачи.
 
     :param task:
+    :param service:
+    :return:
+    """
+
+    return await service(task)
+
+
+def sse_event(event: str, data: dict) -> str:
+    """
+    Событие в формате server-sent events.
+
+    :param event:
+    :param data:
+    :return:
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/estimate_time/stream")
+async def estimate_time_stream(
+    task: TaskInputSchema,
+    service: AsyncTaskEstimatorService = Depends(get_service),
+) -> StreamingResponse:
+    """
+    Оценка времени выполнения задачи потоком server-sent events: клиент
+    получает черновую оценку, не дожидаясь LLM. Порядок событий описан в
+    ``AsyncTaskEstimatorService.astream_estimate``, при ошибке поток
+    завершается событием ``error``.
+
+    :param task:
+    :param service:
+    :return:
+    """
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            async for event, data in service.astream_estimate(task):
+                yield sse_event(event, data)
+        except Exception as e:
+            logger.exception(f"Streaming estimation failed: {e}")
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/estimate_time/batch")
+async def estimate_time_batch(
+    batch: TaskBatchInputSchema,
+    service: AsyncTaskEstimatorService = Depends(get_service),
+) -> TaskBatchOutputSchema:
+    """
+    Оценка времени выполнения пачки задач (например, импорт спринта).
+
+    :param batch:
+    :param service:
+    :return:
+    """
+    results = await service.aestimate_batch(batch.tasks, batch.include_related_tasks)
+    return TaskBatchOutputSchema(results=results)
+
+
+@router.get("/stats")
+async def stats(
+    registry: ModelRegistry = Depends(get_registry),
+    service: AsyncTaskEstimatorService = Depends(get_service),
+) -> ServiceStatsSchema:
+    """
+    Счетчики воркера: доля объединенных одновременных запросов и попадания
+    в кэш ответов.
+
+    :param registry:
+    :param service:
+    :return:
+    """
+    return ServiceStatsSchema(model_version=registry.model_version, **service.stats())
+
+
+@health_router.get("/live")
+async def live() -> dict:
+    """
+    Процесс запущен.
+
+    :return:
+    """
+    return {"status": "ok"}
+
+
+@health_router.get("/ready")
+async def ready(registry: ModelRegistry = Depends(get_registry)) -> ReadinessSchema:
+    """
+    Модели загружены, сервис готов принимать запросы.
+
+    :param registry:
+    :return:
+    """
+    if not registry.ready:
+        detail = "Models are not loaded yet"
+        if registry.load_error is not None:
+            detail = f"Models failed to load: {registry.load_error}"
+        raise HTTPException(status_code=503, detail=detail)
+
+    return ReadinessSchema(ready=True, model_version=registry.model_version)
+
+
+@metrics_router.get("/metrics")
+async def metrics(registry: ModelRegistry = Depends(get_registry)) -> Response:
+    """
+    Метрики воркера в формате Prometheus: длительность этапов оценки, запросы,
+    токены LLM, попадания в кэши.
+
+    :param registry:
     :return:
     """
+    extra = []
+    if registry.ready:
+        extra = service_metrics(registry.service, registry.model_version)
 
-    return TaskEstimatorService()(task)
+    return Response(REGISTRY.render(extra), media_type=CONTENT_TYPE)
@@ -0,0 +1,351 @@
+import math
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+from uuid import uuid4
+
+from fastapi import Request, Response
+from loguru import logger
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+TRACE_HEADER = "X-Trace-Id"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 60)
+LOG_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | "
+    "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> | "
+    "trace_id={extra[trace_id]} - <level>{message}</level>"
+)
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+
+    pairs = (
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metric:
+    """
+    Thread-safe metric in the Prometheus text exposition format. The values
+    are kept per combination of the label values.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict[tuple, float] = {}
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterator[tuple[str, dict, float]]:
+        """
+        :return: name suffix, labels and value of every sample
+        """
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield "", dict(zip(self.labelnames, key)), value
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for suffix, labels, value in self.samples():
+            lines.append(
+                f"{self.name}{suffix}{format_labels(labels)} {format_value(value)}"
+            )
+        return "\n".join(lines)
+
+    def _add(self, amount: float, labels: dict) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        self._add(amount, labels)
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        self._add(amount, labels)
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self._add(-amount, labels)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        buckets: tuple = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._histograms: dict[tuple, tuple[list[int], float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        i = next(
+            (i for i, bound in enumerate(self.buckets) if value <= bound),
+            len(self.buckets),
+        )
+        with self._lock:
+            counts, total = self._histograms.get(
+                key, ([0] * (len(self.buckets) + 1), 0)
+            )
+            counts[i] += 1
+            self._histograms[key] = (counts, total + value)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            counts, _ = self._histograms.get(self._key(labels), ([0], 0))
+            return sum(counts)
+
+    def samples(self) -> Iterator[tuple[str, dict, float]]:
+        with self._lock:
+            histograms = {
+                key: (list(counts), total)
+                for key, (counts, total) in self._histograms.items()
+            }
+        for key, (counts, total) in sorted(histograms.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                yield "_bucket", {**labels, "le": format_value(bound)}, cumulative
+            yield "_sum", labels, total
+            yield "_count", labels, cumulative
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self, extra: Iterable[Metric] = ()) -> str:
+        """
+        All metrics in the Prometheus text format.
+
+        :param extra: metrics collected at scrape time, e.g. from the service
+        :return:
+        """
+        return "\n".join(metric.render() for metric in (*self.metrics, *extra)) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+STAGE_SECONDS = REGISTRY.register(
+    Histogram(
+        "estimator_stage_duration_seconds",
+        "Duration of the estimation stages.",
+        ("stage",),
+    )
+)
+STAGE_ERRORS = REGISTRY.register(
+    Counter("estimator_stage_errors_total", "Failed estimation stages.", ("stage",))
+)
+LLM_DEADLINE_MISSES = REGISTRY.register(
+    Counter(
+        "estimator_llm_deadline_misses_total",
+        "Hedged estimates answered by the model alone, the LLM was late.",
+    )
+)
+HTTP_REQUESTS = REGISTRY.register(
+    Counter(
+        "http_requests_total", "Finished HTTP requests.", ("method", "path", "status")
+    )
+)
+HTTP_REQUEST_SECONDS = REGISTRY.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Time to the response headers of HTTP requests.",
+        ("method", "path"),
+    )
+)
+HTTP_IN_FLIGHT = REGISTRY.register(
+    Gauge("http_requests_in_flight", "HTTP requests being processed.")
+)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """
+    Time a stage of the estimation into ``STAGE_SECONDS`` and log it with the
+    trace id of the request. Errors are counted in ``STAGE_ERRORS`` and raised.
+
+    :param stage:
+    :return:
+    """
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except Exception:
+        status = "error"
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        logger.bind(span=stage, duration_ms=seconds * 1000).info(
+            f"Span {stage} {status} in {seconds * 1000:.1f} ms"
+        )
+
+
+def configure_logging() -> None:
+    """
+    Log records with the trace id of the request, ``-`` outside of requests.
+
+    :return:
+    """
+    logger.configure(extra={"trace_id": "-"})
+    logger.remove()
+    logger.add(sys.stderr, format=LOG_FORMAT)
+
+
+async def trace_requests(request: Request, call_next) -> Response:
+    """
+    HTTP middleware: the trace id of the request (from the ``X-Trace-Id``
+    header or a new one) in every log record and in the response, request
+    counters and latency.
+
+    :param request:
+    :param call_next:
+    :return:
+    """
+    trace_id = request.headers.get(TRACE_HEADER) or uuid4().hex
+    start = time.perf_counter()
+    status = 500
+    HTTP_IN_FLIGHT.inc()
+    with logger.contextualize(trace_id=trace_id):
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = request.scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start, method=request.method, path=path
+            )
+            HTTP_REQUESTS.inc(method=request.method, path=path, status=status)
+
+    response.headers[TRACE_HEADER] = trace_id
+    return response
+
+
+def service_metrics(service, model_version: str | None = None) -> list[Metric]:
+    """
+    Counters the service artifacts keep themselves, collected at scrape time:
+    LLM calls and tokens, cache lookups, request coalescing.
+
+    :param service: ``AsyncTaskEstimatorService``
+    :param model_version:
+    :return:
+    """
+    model_info = Gauge("estimator_model_info", "Loaded model version.", ("version",))
+    model_info.set(1, version=model_version)
+
+    llm_requests = Counter("llm_requests_total", "LLM API calls.", ("tool",))
+    llm_tokens = Counter("llm_tokens_total", "LLM tokens.", ("tool", "type"))
+    for tool, llm_tool in (
+        ("task_creator", service.task_creator),
+        ("task_estimator", service.task_estimator),
+    ):
+        usage = getattr(llm_tool, "usage", None)
+        if usage is None:
+            continue
+        snapshot = usage.snapshot()
+        llm_requests.inc(snapshot.pop("requests"), tool=tool)
+        for token_type, tokens in snapshot.items():
+            llm_tokens.inc(tokens, tool=tool, type=token_type.removesuffix("_tokens"))
+
+    lookups = Counter("cache_lookups_total", "Cache lookups.", ("cache", "result"))
+    hit_ratio = Gauge("cache_hit_ratio", "Share of cache lookups that hit.", ("cache",))
+    caches = {
+        "llm": getattr(service.task_creator, "cache", None),
+        "slack": getattr(service.slack_client, "cache", None),
+    }
+    for name, cache in caches.items():
+        if cache is None:
+            continue
+        lookups.inc(cache.hits, cache=name, result="hit")
+        lookups.inc(cache.misses, cache=name, result="miss")
+        hit_ratio.set(cache.hit_rate, cache=name)
+
+    if service.response_cache is not None:
+        stats = service.response_cache.stats()
+        for key, result in (
+            ("exact_hits", "exact_hit"),
+            ("near_hits", "near_hit"),
+            ("misses", "miss"),
+        ):
+            lookups.inc(stats[key], cache="response", result=result)
+        hit_ratio.set(stats["hit_rate"], cache="response")
+
+    flights = service.single_flight.stats()
+    single_flight_calls = Counter(
+        "single_flight_calls_total", "Estimation calls by outcome.", ("result",)
+    )
+    single_flight_calls.inc(flights["executions"], result="executed")
+    single_flight_calls.inc(flights["coalesced"], result="coalesced")
+    in_flight = Gauge("single_flight_in_flight", "Estimations being computed.")
+    in_flight.set(flights["in_flight"])
+
+    return [
+        model_info,
+        llm_requests,
+        llm_tokens,
+        lookups,
+        hit_ratio,
+        single_flight_calls,
+        in_flight,
+    ]
@@ -1,10 +1,31 @@
+from pathlib import Path
+
+from loguru import logger
 from pydantic import BaseModel
+from sentence_transformers import SentenceTransformer
 from sentence_transformers.cross_encoder import CrossEncoder
 from src.config import BaseConfig
-import pandas as pd
+from src.data.storage import read_dataframe
+from src.modeling.embedding_index import (
+    DEFAULT_BI_ENCODER,
+    TaskEmbeddingIndex,
+    encode,
+    texts_fingerprint,
+)
+import numpy as np
 
 config = BaseConfig()
 
+# the ranker needs only these columns of the final dataset, the estimate and
+# the assignee of the related tasks are context for ``TaskEstimator``
+DATA_COLUMNS = (
+    "jira_key",
+    "task_text",
+    "time_to_complete_hours",
+    "assignee_level_order",
+    "weeks_since_member_join",
+)
+
 
 class RankerInput(BaseModel):
     query: str
@@ -16,13 +37,56 @@ class RankerOutput(RankerInput):
 
 
 class Ranker:
+    """
+    Two-stage retriever: the bi-encoder index selects ``n_candidates`` tasks with
+    one matrix product, then the cross-encoder re-scores only those candidates.
+    """
+
     def __init__(
         self,
         model_name: str = "cross-encoder/stsb-distilroberta-base",
-        data_path: str = config.processed_data_dir / "final_data_to_train.json",
+        data_path: str = config.processed_data_dir / "final_data_to_train.parquet",
+        bi_encoder_name: str = DEFAULT_BI_ENCODER,
+        index_path: Path = config.processed_data_dir / "task_embeddings.npy",
+        n_candidates: int = 50,
+        use_ann: bool = False,
+        columns: tuple[str, ...] = DATA_COLUMNS,
     ):
         self.model = CrossEncoder(model_name)
-        self.data = pd.read_json(data_path)
+        self.data = read_dataframe(data_path, columns=list(columns))
+        self.bi_encoder = SentenceTransformer(bi_encoder_name)
+        self.n_candidates = n_candidates
+        self.index = self._load_index(
+            Path(index_path), bi_encoder_name, use_ann=use_ann
+        )
+
+    def _load_index(
+        self, index_path: Path, bi_encoder_name: str, use_ann: bool
+    ) -> TaskEmbeddingIndex:
+        """
+        Load the prebuilt index if it matches the data, otherwise encode the
+        corpus in memory.
+
+        :param index_path:
+        :param bi_encoder_name:
+        :param use_ann:
+        :return:
+        """
+        texts = self.data["task_text"].fillna("").tolist()
+        fingerprint = texts_fingerprint(texts)
+
+        if index_path.exists():
+            index = TaskEmbeddingIndex.load(index_path, use_ann=use_ann)
+            if index.fingerprint == fingerprint and index.model_name == bi_encoder_name:
+                return index
+            logger.warning(f"Embedding index {index_path} is stale, rebuilding")
+        else:
+            logger.warning(f"Embedding index {index_path} not found, building")
+
+        index = TaskEmbeddingIndex.build(texts, self.bi_encoder, bi_encoder_name)
+        if use_ann:
+            index = TaskEmbeddingIndex(index.embeddings, index.meta, use_ann=True)
+        return index
 
     def rank(self, query: str, top_k: int = 5):
         """
@@ -30,9 +94,59 @@ class Ranker:
 
         :param query:
         :param top_k:
+        :return: list of ``{"corpus_id", "score"}`` sorted by score, where
+            ``corpus_id`` is the row number in ``self.data``
+        """
+        return self.rank_batch([query], top_k)[0]
+
+    def rank_batch(self, queries: list[str], top_k: int = 5) -> list[list[dict]]:
+        """
+        Rank tasks for many queries at once: one bi-encoder pass over all queries,
+        one matrix product for the candidates and one cross-encoder pass over all
+        (query, candidate) pairs.
+
+        :param queries:
+        :param top_k:
+        :return: results of ``rank`` for every query
+        """
+        if not queries:
+            return []
+
+        query_embeddings = encode(self.bi_encoder, queries)
+        candidates, _ = self.index.search(query_embeddings, self.n_candidates)
+        if candidates.shape[1] == 0:
+            return [[] for _ in queries]
+
+        task_texts = self.data["task_text"].fillna("")
+        pairs = [
+            [query, task_texts.iloc[corpus_id]]
+            for query, row in zip(queries, candidates)
+            for corpus_id in row
+        ]
+        scores = self.model.predict(pairs, show_progress_bar=False)
+        scores = np.asarray(scores).reshape(candidates.shape)
+
+        order = np.argsort(-scores, axis=1)[:, :top_k]
+        return [
+            [
+                {"corpus_id": int(candidates[i, j]), "score": float(scores[i, j])}
+                for j in row
+            ]
+            for i, row in enumerate(order)
+        ]
+
+    def related_tasks(self, results: list[dict]) -> list[dict]:
+        """
+        Rows of the ranked tasks with their scores.
+
+        :param results: output of ``rank``
         :return:
         """
-        return self.model.rank(query, self.data["task_text"])[:top_k]
+        rows = self.data.iloc[[result["corpus_id"] for result in results]]
+        return [
+            {**row, "score": result["score"]}
+            for row, result in zip(rows.to_dict(orient="records"), results)
+        ]
 
     def __call__(self, input: RankerInput) -> RankerOutput:
         """
@@ -0,0 +1,201 @@
+import asyncio
+import threading
+from pathlib import Path
+
+from loguru import logger
+
+from src.api.ranker import Ranker
+from src.api.response_cache import ResponseCache
+from src.api.services import AsyncTaskEstimatorService
+from src.config import BaseConfig
+from src.modeling.embedding_index import meta_path
+from src.modeling.sparse_model import SPARSE_MODEL_FILE, load_model
+from src.tools.ask_anthropic import TaskEstimator
+from src.tools.task_creator import TaskCreator, get_llm_cache
+
+config = BaseConfig()
+
+
+class ModelRegistry:
+    """
+    Process-wide holder of the artifacts used by ``AsyncTaskEstimatorService``.
+
+    The ranker, the LLM tools and the regression model are loaded once per worker
+    and shared between requests. When the model file changes on disk the registry
+    loads it in the background and swaps the service in one reference assignment,
+    so in-flight requests finish on the old model and new requests get the new one.
+    """
+
+    def __init__(self, model_path: Path | None = None):
+        """
+        :param model_path: regression model. By default the memory-mapped
+            ``models/regression_model.npy`` if it exists and the pickled
+            pipeline otherwise, chosen again on every reload check, so a model
+            published in the other format is picked up too
+        """
+        self.pinned_model_path = model_path is not None
+        self.model_path = (
+            Path(model_path) if model_path is not None else self._resolve_model_path()
+        )
+
+        self._lock = threading.Lock()
+        self._service: AsyncTaskEstimatorService | None = None
+        self._model_version: str | None = None
+        # error of the last failed ``load``, retried by ``watch``
+        self.load_error: Exception | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self._service is not None
+
+    @property
+    def model_version(self) -> str | None:
+        return self._model_version
+
+    @property
+    def service(self) -> AsyncTaskEstimatorService:
+        service = self._service
+        if service is None:
+            raise RuntimeError("Models are not loaded yet")
+
+        return service
+
+    def load(self) -> None:
+        """
+        Load all artifacts and publish a ready service. A failure is kept in
+        ``load_error`` and raised.
+
+        :return:
+        """
+        logger.info("Loading models into registry")
+        try:
+            model_path = self._resolve_model_path()
+            version = self._model_file_version(model_path)
+            service = AsyncTaskEstimatorService(
+                task_creator=TaskCreator(cache=get_llm_cache()),
+                task_estimator=TaskEstimator(),
+                ranker=Ranker(),
+                model=load_model(model_path),
+                response_cache=ResponseCache.from_config(),
+                model_version=version,
+            )
+        except Exception as e:
+            self.load_error = e
+            raise
+
+        self.load_error = None
+        self.model_path = model_path
+        self._publish(service, version)
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reload the regression model if its file was replaced since the last load.
+
+        The other artifacts are reused. If the new file cannot be loaded (e.g. it is
+        still being copied), the current model is kept and the reload is retried on
+        the next call.
+
+        :return: True if the model was swapped
+        """
+        current = self._service
+        if current is None:
+            return False
+
+        model_path = self._resolve_model_path()
+        try:
+            version = self._model_file_version(model_path)
+        except FileNotFoundError:
+            logger.warning(f"Model file {model_path} disappeared, keeping current")
+            return False
+
+        if version == self._model_version:
+            return False
+
+        logger.info(f"New model file detected: {model_path} ({version=})")
+        try:
+            model = load_model(model_path)
+        except Exception as e:
+            logger.error(f"Failed to load new model, keeping current: {e}")
+            return False
+
+        service = AsyncTaskEstimatorService(
+            task_creator=current.task_creator,
+            task_estimator=current.task_estimator,
+            ranker=current.ranker,
+            model=model,
+            executor=current.executor,
+            slack_client=current.slack_client,
+            response_cache=current.response_cache,
+            model_version=version,
+            single_flight=current.single_flight,
+        )
+        self.model_path = model_path
+        self._publish(service, version)
+        return True
+
+    async def watch(self, interval_seconds: float) -> None:
+        """
+        Poll the model file and hot swap it when it changes. While no service
+        is published because the load failed, the full load is retried.
+
+        :param interval_seconds:
+        :return:
+        """
+        while True:
+            await asyncio.sleep(interval_seconds)
+            if self._service is not None:
+                await asyncio.to_thread(self.reload_if_changed)
+            elif self.load_error is not None:
+                logger.info("Retrying the failed model load")
+                try:
+                    await asyncio.to_thread(self.load)
+                except Exception as e:
+                    logger.error(f"Failed to load models, retrying later: {e}")
+
+    async def aclose(self) -> None:
+        """
+        Release the resources shared by the published service.
+
+        :return:
+        """
+        if self._service is not None:
+            await self._service.aclose()
+
+    def _publish(self, service: AsyncTaskEstimatorService, version: str) -> None:
+        if service.response_cache is not None:
+            service.response_cache.set_model_version(version)
+        with self._lock:
+            self._service = service
+            self._model_version = version
+        logger.info(f"Registry is ready, model version {version}")
+
+    def _resolve_model_path(self) -> Path:
+        """
+        Model file to load: the given one, or the preferred artifact that
+        exists now.
+
+        :return:
+        """
+        if self.pinned_model_path:
+            return self.model_path
+
+        model_path = config.models_dir / SPARSE_MODEL_FILE
+        if not model_path.exists():
+            model_path = config.models_dir / "regression_model.pkl"
+        return model_path
+
+    @staticmethod
+    def _model_file_version(model_path: Path) -> str:
+        """
+        Version of the model files on disk: modification times and sizes of the
+        model and, for the sparse ``.npy`` model, of its ``.meta.json``.
+
+        :param model_path:
+        :return:
+        """
+        paths = [model_path]
+        if model_path.suffix == ".npy":
+            paths.append(meta_path(model_path))
+
+        stats = [path.stat() for path in paths]
+        return "-".join(f"{stat.st_mtime_ns}-{stat.st_size}" for stat in stats)
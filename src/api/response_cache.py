@@ -0,0 +1,366 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable
+from uuid import uuid4
+
+import numpy as np
+from loguru import logger
+
+from src.api.schemas import TaskInputSchema, TaskOutputSchema
+from src.config import BaseConfig
+from src.tools.kv_cache import SQLiteCache
+
+config = BaseConfig()
+
+
+def normalize_text(text: str | None) -> str:
+    """
+    Case and whitespace insensitive form of the text, so that re-submissions
+    with a changed case or extra spaces share the cache entry.
+
+    :param text:
+    :return:
+    """
+    return " ".join((text or "").casefold().split())
+
+
+def normalize_link(link: str | None) -> str:
+    return (link or "").strip()
+
+
+def task_text(task: TaskInputSchema) -> str:
+    """
+    Normalized title and description, the text the near duplicates are
+    searched by.
+
+    :param task:
+    :return:
+    """
+    return f"{normalize_text(task.jira_title)}\n{normalize_text(task.jira_description)}"
+
+
+def task_context(task: TaskInputSchema) -> str:
+    """
+    The part of the input a near duplicate must share exactly: the Slack thread
+    and the assignee.
+
+    :param task:
+    :return:
+    """
+    return SQLiteCache.make_key(
+        normalize_link(task.slack_link),
+        task.assignee_level_order,
+        task.weeks_since_member_join,
+    )
+
+
+def task_key(task: TaskInputSchema) -> str:
+    """
+    Hash of the normalized title, description, Slack link and assignee.
+
+    :param task:
+    :return:
+    """
+    return SQLiteCache.make_key(
+        normalize_text(task.jira_title),
+        normalize_text(task.jira_description),
+        task_context(task),
+    )
+
+
+def answer_for(response: TaskOutputSchema, task: TaskInputSchema) -> TaskOutputSchema:
+    """
+    Response computed for another request with the same or a similar task,
+    with a new id and the input fields of the task.
+
+    :param response:
+    :param task:
+    :return:
+    """
+    return response.model_copy(
+        update={**task.model_dump(), "id": str(uuid4())}, deep=True
+    )
+
+
+@dataclass
+class CacheEntry:
+    response: TaskOutputSchema
+    context: str
+    expires_at: float
+    slot: int | None = None
+
+
+@dataclass
+class CacheLookup:
+    """
+    Result of ``ResponseCache.lookup``. Misses keep the key and the embedding
+    of the task, so that storing the computed response does not redo them.
+    """
+
+    key: str
+    response: TaskOutputSchema | None = None
+    embedding: np.ndarray | None = None
+    similarity: float | None = None
+
+
+class ResponseCache:
+    """
+    In-process cache of ``/task/estimate_time`` responses.
+
+    Exact hits are found by the hash of the normalized input. Near duplicates,
+    e.g. a re-submitted ticket with a small edit, are found by the cosine
+    similarity of the title and description embeddings, among the entries with
+    the same Slack link and assignee. The embeddings live in a preallocated matrix, so the
+    search is one matrix-vector product. Entries expire after ``ttl_seconds``,
+    the least recently used are evicted above ``max_entries`` and all of them
+    are dropped when the model version changes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        ttl_seconds: float = 3600,
+        similarity_threshold: float = 0.95,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        :param max_entries:
+        :param ttl_seconds:
+        :param similarity_threshold: minimal cosine similarity of a near hit,
+            values above 1 turn the near duplicates search off
+        :param clock: source of the current time in seconds
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._model_version: str | None = None
+        self._embeddings: np.ndarray | None = None
+        self._slot_keys: list[str | None] = [None] * max_entries
+        self._free_slots = list(range(max_entries - 1, -1, -1))
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls) -> "ResponseCache | None":
+        """
+        Cache with the settings of the service, None if it is turned off.
+
+        :return:
+        """
+        if config.response_cache_max_entries <= 0:
+            return None
+
+        return cls(
+            max_entries=config.response_cache_max_entries,
+            ttl_seconds=config.response_cache_ttl_seconds,
+            similarity_threshold=config.response_cache_similarity_threshold,
+        )
+
+    @property
+    def near_duplicates(self) -> bool:
+        return self.similarity_threshold <= 1
+
+    @property
+    def model_version(self) -> str | None:
+        return self._model_version
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.near_hits + self.misses
+        return {
+            "entries": len(self),
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.near_hits) / lookups if lookups else 0,
+        }
+
+    def set_model_version(self, model_version: str | None) -> None:
+        """
+        Drop all entries if the responses were computed by another model.
+
+        :param model_version:
+        :return:
+        """
+        with self._lock:
+            if model_version == self._model_version:
+                return
+
+            if self._entries:
+                logger.info(
+                    f"Model version changed to {model_version}, dropping "
+                    f"{len(self._entries)} cached responses"
+                )
+            self._model_version = model_version
+            self._clear()
+
+    def lookup(
+        self,
+        task: TaskInputSchema,
+        embed: Callable[[list[str]], np.ndarray] | None = None,
+    ) -> CacheLookup:
+        """
+        Cached response for the task or its near duplicate. The response keeps
+        the estimate and the task text of the cached one and gets a new id and
+        the input fields of the task.
+
+        :param task:
+        :param embed: texts -> L2-normalized embeddings, without it only exact
+            hits are found
+        :return:
+        """
+        key = task_key(task)
+        with self._lock:
+            entry = self._get_entry(key)
+            if entry is not None:
+                self.exact_hits += 1
+                return CacheLookup(key, answer_for(entry.response, task))
+
+        if embed is None or not self.near_duplicates:
+            with self._lock:
+                self.misses += 1
+            return CacheLookup(key)
+
+        embedding = embed([task_text(task)])[0]
+        with self._lock:
+            entry, similarity = self._get_similar_entry(embedding, task_context(task))
+            if entry is None:
+                self.misses += 1
+                return CacheLookup(key, embedding=embedding)
+
+            self.near_hits += 1
+            return CacheLookup(
+                key, answer_for(entry.response, task), embedding, similarity
+            )
+
+    def store(
+        self,
+        lookup: CacheLookup,
+        response: TaskOutputSchema,
+        model_version: str | None = None,
+    ) -> None:
+        """
+        Cache the response computed after a miss. Responses of a model other
+        than the current one, e.g. of a request that was in flight during a hot
+        swap, are not stored.
+
+        :param lookup: the miss
+        :param response:
+        :param model_version: version of the model that computed the response
+        :return:
+        """
+        if self.max_entries <= 0:
+            return
+
+        with self._lock:
+            if model_version != self._model_version:
+                return
+
+            self._remove(lookup.key)
+            entry = CacheEntry(
+                response=response,
+                context=task_context(response),
+                expires_at=self.clock() + self.ttl_seconds,
+            )
+            while len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+            if lookup.embedding is not None:
+                entry.slot = self._free_slots.pop()
+                self._store_embedding(entry.slot, lookup.embedding)
+                self._slot_keys[entry.slot] = lookup.key
+
+            self._entries[lookup.key] = entry
+
+    def put(
+        self,
+        response: TaskOutputSchema,
+        embed: Callable[[list[str]], np.ndarray] | None = None,
+        model_version: str | None = None,
+    ) -> None:
+        """
+        Cache a response computed outside of a request, e.g. an estimate that
+        arrived after the request was answered.
+
+        :param response:
+        :param embed: texts -> L2-normalized embeddings
+        :param model_version: version of the model that computed the response
+        :return:
+        """
+        embedding = None
+        if embed is not None and self.near_duplicates:
+            embedding = embed([task_text(response)])[0]
+
+        self.store(
+            CacheLookup(task_key(response), embedding=embedding),
+            response,
+            model_version,
+        )
+
+    def _get_entry(self, key: str) -> CacheEntry | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        if entry.expires_at <= self.clock():
+            self._remove(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return entry
+
+    def _get_similar_entry(
+        self, embedding: np.ndarray, context: str
+    ) -> tuple[CacheEntry | None, float | None]:
+        """
+        The most similar live entry with the same context above the threshold.
+
+        :param embedding:
+        :param context: ``task_context`` of the task
+        :return: entry and its similarity
+        """
+        if self._embeddings is None or not self._entries:
+            return None, None
+
+        similarities = self._embeddings @ embedding
+        candidates = np.flatnonzero(similarities >= self.similarity_threshold)
+        for slot in candidates[np.argsort(-similarities[candidates])]:
+            key = self._slot_keys[slot]
+            if key is None or self._entries[key].context != context:
+                continue
+
+            entry = self._get_entry(key)
+            if entry is not None:
+                return entry, float(similarities[slot])
+
+        return None, None
+
+    def _store_embedding(self, slot: int, embedding: np.ndarray) -> None:
+        if self._embeddings is None:
+            self._embeddings = np.zeros(
+                (self.max_entries, embedding.shape[0]), dtype=np.float32
+            )
+        self._embeddings[slot] = embedding
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None or entry.slot is None:
+            return
+
+        # a zero row never passes a positive threshold
+        self._embeddings[entry.slot] = 0
+        self._slot_keys[entry.slot] = None
+        self._free_slots.append(entry.slot)
+
+    def _clear(self) -> None:
+        for key in list(self._entries):
+            self._remove(key)
@@ -1,10 +1,13 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class TaskInputSchema(BaseModel):
     jira_title: str
     jira_description: str | None = None
     slack_link: str | None = None
+    # the assignee, if known, for the LLM estimate
+    assignee_level_order: int | None = None
+    weeks_since_member_join: int | None = None
 
 
 class TaskOutputSchema(TaskInputSchema):
@@ -12,3 +15,28 @@ class TaskOutputSchema(TaskInputSchema):
 
     task_text: str | None = None
     predicted_hours: int | None = None
+    related_tasks: list[dict] | None = None
+    # both estimates of the hedged mode, ``predicted_hours`` combines them
+    model_predicted_hours: int | None = None
+    llm_predicted_hours: int | None = None
+    llm_explanation: str | None = None
+
+
+class TaskBatchInputSchema(BaseModel):
+    tasks: list[TaskInputSchema] = Field(min_length=1, max_length=1000)
+    include_related_tasks: bool = False
+
+
+class TaskBatchOutputSchema(BaseModel):
+    results: list[TaskOutputSchema]
+
+
+class ReadinessSchema(BaseModel):
+    ready: bool
+    model_version: str | None = None
+
+
+class ServiceStatsSchema(BaseModel):
+    model_version: str | None = None
+    single_flight: dict
+    response_cache: dict | None = None
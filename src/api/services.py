@@ -1,10 +1,32 @@
+import asyncio
+import contextvars
+import statistics
+from collections.abc import AsyncIterator, Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from uuid import uuid4
 
+from src.api.metrics import LLM_DEADLINE_MISSES, STAGE_ERRORS, span
+from src.api.response_cache import CacheLookup, ResponseCache, answer_for, task_key
 from src.api.schemas import TaskInputSchema, TaskOutputSchema
-from src.data.enrich_with_slack_thread import enrich_with_slack_thread
+from src.api.single_flight import SingleFlight
+from src.data.enrich_with_slack_thread import (
+    aenrich_with_slack_thread,
+    enrich_with_slack_thread,
+)
+from src.data.slack_client import (
+    SlackClient,
+    aclose_slack_client,
+    get_slack_client,
+)
 from src.tools.task_creator import TaskCreator, TaskSchema, TaskCreatedSchema
-from src.tools.ask_anthropic import TaskEstimator
+from src.tools.ask_anthropic import (
+    LLMEvaluationResultSchema,
+    QuerySchema,
+    TaskEstimator,
+)
 from src.api.ranker import Ranker, RankerOutput, RankerInput
+from src.modeling.embedding_index import encode
 from src.config import BaseConfig
 from loguru import logger
 
@@ -14,11 +36,30 @@ config = BaseConfig()
 
 
 class TaskEstimatorService:
-    def __init__(self):
-        self.task_creator = TaskCreator()
-        self.task_estimator = TaskEstimator()
-        self.ranker = Ranker()
-        self.model = joblib.load(config.models_dir / "regression_model.pkl")
+    def __init__(
+        self,
+        task_creator: TaskCreator | None = None,
+        task_estimator: TaskEstimator | None = None,
+        ranker: Ranker | None = None,
+        model=None,
+    ):
+        """
+        Все тяжелые артефакты можно передать снаружи (см. ``ModelRegistry``),
+        тогда сервис ничего не загружает сам.
+
+        :param task_creator:
+        :param task_estimator:
+        :param ranker:
+        :param model: sklearn-совместимая модель с методом ``predict``
+        """
+        self.task_creator = task_creator or TaskCreator()
+        self.task_estimator = task_estimator or TaskEstimator()
+        self.ranker = ranker or Ranker()
+        self.model = (
+            model
+            if model is not None
+            else joblib.load(config.models_dir / "regression_model.pkl")
+        )
 
     def __call__(self, task: TaskInputSchema) -> TaskOutputSchema:
         return self._estimate_time(task)
@@ -41,10 +82,22 @@ class TaskEstimatorService:
         eta = self._estimate_task_time(task_created)
         logger.info("Task estimated")
 
+        return self._build_output(input_task, task_created, eta)
+
+    @staticmethod
+    def _build_output(
+        task: TaskInputSchema, task_created: TaskCreatedSchema, eta: int
+    ) -> TaskOutputSchema:
+        """
+        Формирование ответа сервиса.
+
+        :param task: исходная задача из запроса
+        :param task_created:
+        :param eta:
+        :return:
+        """
         return TaskOutputSchema(
-            jira_title=input_task.jira_title,
-            jira_description=input_task.jira_description,
-            slack_link=input_task.slack_link,
+            **task.model_dump(),
             id=str(uuid4()),
             task_text=task_created.result,
             predicted_hours=eta,
@@ -57,8 +110,30 @@ class TaskEstimatorService:
         :param task:
         :return:
         """
-        result = self.model.predict([task.result])
-        return round(result[0], 0)
+        return self._estimate_tasks_time([task])[0]
+
+    def _estimate_tasks_time(self, tasks: list[TaskCreatedSchema]) -> list[int]:
+        """
+        Оценка времени выполнения задач одним векторизованным вызовом модели.
+
+        :param tasks:
+        :return:
+        """
+        if not tasks:
+            return []
+
+        return self._predict_hours([task.result for task in tasks])
+
+    def _predict_hours(self, texts: list[str]) -> list[int]:
+        """
+        Предсказание модели для текстов задач.
+
+        :param texts:
+        :return:
+        """
+        with span("predict"):
+            result = self.model.predict(texts)
+        return [round(eta, 0) for eta in result]
 
     def _get_relevant_tasks(self, task: TaskCreatedSchema) -> RankerOutput:
         """
@@ -71,7 +146,8 @@ class TaskEstimatorService:
             raise ValueError("Task quality is not ok")
 
         input_ = RankerInput(query=task.result)
-        result = self.ranker(input_)
+        with span("ranker"):
+            result = self.ranker(input_)
         return result
 
     def _create_task(self, task: TaskSchema) -> TaskCreatedSchema:
@@ -82,21 +158,563 @@ class TaskEstimatorService:
         :return:
         """
         text = self.task_creator.combine_json_to_task(task)
-        result = self.task_creator.create_task(text)
+        with span("task_creator"):
+            result = self.task_creator.create_task(text)
+        if not result.flg_llm_work_done:
+            STAGE_ERRORS.inc(stage="task_creator")
         return result
 
     @staticmethod
     def _enrich_with_slack_thread(task: TaskInputSchema) -> TaskSchema:
+        """
+        Обогащение данных задачи данными из Slack. Треды берутся через общий
+        клиент Slack, повторные ссылки отдаются из кэша.
+
+        :param task:
+        :return:
+        """
+        with span("slack"):
+            result = enrich_with_slack_thread({"slack_link": task.slack_link})
+
+        return TaskSchema(
+            jira_title=task.jira_title,
+            jira_description=task.jira_description,
+            slack_messages=result.get("slack_thread_messages"),
+        )
+
+
+class AsyncTaskEstimatorService(TaskEstimatorService):
+    """
+    Асинхронная версия сервиса: запросы в Slack и Anthropic не блокируют
+    event loop, а CPU-bound инференс (модель, ранкер) выполняется в
+    ограниченном пуле потоков. Так один воркер обслуживает много запросов.
+    """
+
+    def __init__(
+        self,
+        task_creator: TaskCreator | None = None,
+        task_estimator: TaskEstimator | None = None,
+        ranker: Ranker | None = None,
+        model=None,
+        executor: ThreadPoolExecutor | None = None,
+        slack_client: SlackClient | None = None,
+        response_cache: ResponseCache | None = None,
+        model_version: str | None = None,
+        single_flight: SingleFlight | None = None,
+        hedged: bool | None = None,
+    ):
+        """
+        :param executor: пул для CPU-bound инференса, общий для всех запросов
+        :param slack_client: общий клиент Slack с пулом соединений и кэшем тредов
+        :param response_cache: кэш ответов для повторных и почти одинаковых
+            задач, без него каждая задача оценивается заново
+        :param model_version: версия модели, под которой кэшируются ответы
+        :param single_flight: объединение одновременных запросов одной и той же
+            задачи в одно вычисление
+        :param hedged: параллельно с моделью оценивать задачу LLM с похожими
+            задачами в контексте (см. ``_aestimate_hedged``), по умолчанию
+            из ``ESTIMATION_MODE``
+        """
+        super().__init__(task_creator, task_estimator, ranker, model)
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=config.inference_workers, thread_name_prefix="inference"
+        )
+        self.slack_client = slack_client or get_slack_client()
+        self.response_cache = response_cache
+        self.model_version = model_version
+        self.single_flight = single_flight or SingleFlight()
+        self.hedged = config.estimation_mode == "hedged" if hedged is None else hedged
+        self._background_tasks: set[asyncio.Task] = set()
+        # id задач, чья оценка LLM опоздала и еще ждется в фоне
+        self._llm_pending: set[str] = set()
+
+    async def __call__(self, task: TaskInputSchema) -> TaskOutputSchema:
+        """
+        Оценка задачи. Одновременные запросы одной и той же задачи (например,
+        несколько клиентов открыли доску спринта) ждут одно вычисление.
+
+        :param task:
+        :return:
+        """
+        output, shared = await self.single_flight.run(
+            task_key(task), partial(self._aestimate_time_cached, task)
+        )
+        if shared:
+            logger.info("Estimate shared with a concurrent request")
+            return answer_for(output, task)
+
+        return output
+
+    def stats(self) -> dict:
+        """
+        Счетчики объединения запросов и кэша ответов.
+
+        :return:
+        """
+        return {
+            "single_flight": self.single_flight.stats(),
+            "response_cache": (
+                self.response_cache.stats() if self.response_cache is not None else None
+            ),
+        }
+
+    async def _aestimate_time_cached(self, task: TaskInputSchema) -> TaskOutputSchema:
+        """
+        Оценка с кэшем ответов: точные повторы и почти одинаковые задачи
+        отдаются без запросов в Slack и Anthropic. Неудачные ответы LLM
+        не кэшируются.
+
+        :param task:
+        :return:
+        """
+        if self.response_cache is None:
+            return await self._aestimate_time(task)
+
+        lookup = await self._run_in_executor(
+            self.response_cache.lookup, task, self._embed_texts
+        )
+        if lookup.response is not None:
+            logger.info(f"Response cache hit, similarity={lookup.similarity}")
+            return lookup.response
+
+        output = await self._aestimate_time(task)
+        self._store_response(lookup, output)
+        return output
+
+    def _store_response(self, lookup: CacheLookup, output: TaskOutputSchema) -> None:
+        """
+        Положить ответ в кэш после промаха. Ответ, чья оценка LLM еще ждется
+        в фоне, не кэшируется: он попадет в кэш, когда она придет.
+
+        :param lookup: промах
+        :param output:
+        :return:
+        """
+        if output.task_text and output.id not in self._llm_pending:
+            self.response_cache.store(lookup, output, self.model_version)
+
+    def _embed_texts(self, texts: list[str]):
+        """
+        Эмбеддинги текстов би-энкодером ранкера.
+
+        :param texts:
+        :return:
+        """
+        with span("embed"):
+            return encode(self.ranker.bi_encoder, texts)
+
+    async def _aestimate_time(self, task: TaskInputSchema) -> TaskOutputSchema:
+        """
+        Оценка времени выполнения задачи.
+
+        :param task:
+        :return:
+        """
+        logger.info("Start task estimation")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + config.llm_estimate_deadline_seconds
+        input_task = task
+        task = await self._aenrich_with_slack_thread(task)
+        logger.info("Enriched with Slack thread")
+        task_created = await self._acreate_task(task)
+        logger.info("Task created")
+
+        if self.hedged:
+            return await self._aestimate_hedged(input_task, task_created, deadline)
+
+        eta = await self._run_in_executor(self._estimate_task_time, task_created)
+        logger.info("Task estimated")
+
+        return self._build_output(input_task, task_created, eta)
+
+    async def _aestimate_hedged(
+        self, task: TaskInputSchema, task_created: TaskCreatedSchema, deadline: float
+    ) -> TaskOutputSchema:
+        """
+        Оценка моделью и LLM одновременно. Если LLM успевает до дедлайна
+        запроса, оценки объединяются, иначе сразу возвращается оценка модели,
+        а оценка LLM дописывается в кэш ответов в фоне, когда придет.
+
+        :param task: исходная задача из запроса
+        :param task_created:
+        :param deadline: время event loop, к которому нужен ответ
+        :return:
+        """
+        llm_estimate = asyncio.ensure_future(self._allm_estimate(task, task_created))
+        eta = await self._run_in_executor(self._estimate_task_time, task_created)
+        output = self._build_output(task, task_created, eta)
+        output.model_predicted_hours = output.predicted_hours
+
+        timeout = max(deadline - asyncio.get_running_loop().time(), 0)
+        try:
+            related_tasks, result = await asyncio.wait_for(
+                asyncio.shield(llm_estimate), timeout
+            )
+        except TimeoutError:
+            logger.warning("LLM estimate missed the deadline, answering with the model")
+            LLM_DEADLINE_MISSES.inc()
+            self._llm_pending.add(output.id)
+            self._spawn(self._acache_late_estimate(output, llm_estimate))
+            return output
+        except Exception as e:
+            logger.error(f"LLM estimate failed, answering with the model: {e}")
+            return output
+
+        logger.info("Task estimated")
+        return self._combine_estimates(output, related_tasks, result)
+
+    async def _allm_estimate(
+        self, task: TaskInputSchema, task_created: TaskCreatedSchema
+    ) -> tuple[list[dict] | None, LLMEvaluationResultSchema | None]:
+        """
+        Оценка LLM с похожими задачами из истории в контексте. Если исполнитель
+        не указан в запросе, берется типичный исполнитель похожих задач.
+
+        :param task: исходная задача из запроса
+        :param task_created:
+        :return: похожие задачи и ответ LLM
+        """
+        if not task_created.flg_ok_quality:
+            return None, None
+
+        [related_tasks] = await self._run_in_executor(
+            self._get_relevant_tasks_batch, [task_created]
+        )
+
+        def or_typical(value: int | None, column: str) -> int:
+            if value is not None:
+                return value
+            values = [related[column] for related in related_tasks]
+            return round(statistics.median(values)) if values else 0
+
+        query = QuerySchema(
+            current_task=task_created.result,
+            related_tasks=related_tasks,
+            weeks_since_member_join=or_typical(
+                task.weeks_since_member_join, "weeks_since_member_join"
+            ),
+            assignee_level_order=or_typical(
+                task.assignee_level_order, "assignee_level_order"
+            ),
+        )
+        with span("task_estimator"):
+            result = await self.task_estimator.aestimate_task_time(query)
+        if result.estimated_time is None:
+            STAGE_ERRORS.inc(stage="task_estimator")
+
+        return related_tasks, result
+
+    @staticmethod
+    def _combine_estimates(
+        output: TaskOutputSchema,
+        related_tasks: list[dict] | None,
+        result: LLMEvaluationResultSchema | None,
+    ) -> TaskOutputSchema:
+        """
+        Взвешенное среднее оценок модели и LLM (вес LLM из
+        ``LLM_ESTIMATE_WEIGHT``). Без ответа LLM остается оценка модели.
+
+        :param output: ответ с оценкой модели
+        :param related_tasks:
+        :param result:
+        :return: тот же ответ
+        """
+        output.related_tasks = related_tasks
+        if result is None or result.estimated_time is None:
+            return output
+
+        weight = config.llm_estimate_weight
+        output.llm_predicted_hours = result.estimated_time
+        output.llm_explanation = result.explanation
+        output.predicted_hours = round(
+            weight * result.estimated_time + (1 - weight) * output.model_predicted_hours
+        )
+        return output
+
+    async def _acache_late_estimate(
+        self, output: TaskOutputSchema, llm_estimate: asyncio.Future
+    ) -> None:
+        """
+        Дождаться опоздавшей оценки LLM и положить объединенный ответ в кэш,
+        чтобы следующий запрос этой задачи получил его сразу. Если LLM
+        не дала оценку, кэшируется оценка модели.
+
+        :param output: ответ с оценкой модели, уже отданный клиенту
+        :param llm_estimate:
+        :return:
+        """
+        try:
+            related_tasks, result = await llm_estimate
+        except Exception as e:
+            logger.error(f"Late LLM estimate failed, caching the model estimate: {e}")
+            related_tasks, result = None, None
+        finally:
+            self._llm_pending.discard(output.id)
+
+        output = self._combine_estimates(
+            output.model_copy(deep=True), related_tasks, result
+        )
+        if self.response_cache is None or not output.task_text:
+            return
+
+        await self._run_in_executor(
+            self.response_cache.put, output, self._embed_texts, self.model_version
+        )
+        logger.info("Late estimate cached")
+
+    def _spawn(self, coroutine) -> None:
+        """
+        Фоновая задача, которая не держит запрос. Ошибки только логируются.
+
+        :param coroutine:
+        :return:
+        """
+        task = asyncio.ensure_future(coroutine)
+        self._background_tasks.add(task)
+
+        def done(task: asyncio.Task) -> None:
+            self._background_tasks.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                logger.error(f"Background task failed: {task.exception()}")
+
+        task.add_done_callback(done)
+
+    async def astream_estimate(
+        self, task: TaskInputSchema
+    ) -> AsyncIterator[tuple[str, dict]]:
+        """
+        Оценка задачи с промежуточными результатами по мере готовности этапов:
+
+        - ``slack``: тред из Slack получен;
+        - ``draft``: черновая оценка модели по сырому тексту задачи;
+        - ``task_text``: фрагменты текста задачи, пока его пишет LLM;
+        - ``final``: итоговый ответ с оценкой и похожими задачами.
+
+        Вычисление идет отдельной задачей через ``single_flight`` с тем же
+        ключом, что и ``__call__``: отключившийся клиент его не отменяет, а
+        одновременные запросы той же задачи его ждут. При попадании в кэш
+        ответов или в чужое вычисление сразу приходит ``final``.
+
+        :param task:
+        :return: пары (событие, данные)
+        """
+        events: asyncio.Queue[tuple[str, dict]] = asyncio.Queue()
+        flight = asyncio.ensure_future(
+            self.single_flight.run(
+                task_key(task),
+                partial(self._astream_estimate_cached, task, events.put_nowait),
+            )
+        )
+        next_event = None
+        try:
+            while not flight.done():
+                next_event = asyncio.ensure_future(events.get())
+                await asyncio.wait(
+                    {next_event, flight}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if next_event.done():
+                    yield next_event.result()
+                else:
+                    next_event.cancel()
+            while not events.empty():
+                yield events.get_nowait()
+        finally:
+            # the estimate itself goes on for the other callers and the cache
+            if next_event is not None:
+                next_event.cancel()
+            flight.cancel()
+
+        output, shared = flight.result()
+        if shared:
+            logger.info("Estimate shared with a concurrent request")
+            output = answer_for(output, task)
+        yield "final", output.model_dump()
+
+    async def _astream_estimate_cached(
+        self, task: TaskInputSchema, emit: Callable[[tuple[str, dict]], None]
+    ) -> TaskOutputSchema:
+        """
+        То же, что ``_aestimate_time_cached``, с промежуточными событиями для
+        ``astream_estimate``.
+
+        :param task:
+        :param emit: принимает пару (событие, данные), не блокирует
+        :return: итоговый ответ
+        """
+        lookup = None
+        if self.response_cache is not None:
+            lookup = await self._run_in_executor(
+                self.response_cache.lookup, task, self._embed_texts
+            )
+            if lookup.response is not None:
+                logger.info(f"Response cache hit, similarity={lookup.similarity}")
+                return lookup.response
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + config.llm_estimate_deadline_seconds
+        enriched = await self._aenrich_with_slack_thread(task)
+        emit(("slack", {"slack_thread_found": enriched.slack_messages is not None}))
+
+        draft_text = "\n\n".join(
+            text
+            for text in (
+                enriched.jira_title,
+                enriched.jira_description,
+                enriched.slack_messages,
+            )
+            if text
+        )
+        [draft] = await self._run_in_executor(self._predict_hours, [draft_text])
+        emit(("draft", {"predicted_hours": int(draft)}))
+
+        task_created = None
+        text = self.task_creator.combine_json_to_task(enriched)
+        # emit does not wait for the client, the span times the LLM only
+        with span("task_creator"):
+            async for fragment in self.task_creator.astream_task(text):
+                if isinstance(fragment, TaskCreatedSchema):
+                    task_created = fragment
+                else:
+                    emit(("task_text", {"delta": fragment}))
+        if not task_created.flg_llm_work_done:
+            STAGE_ERRORS.inc(stage="task_creator")
+
+        if self.hedged:
+            output = await self._aestimate_hedged(task, task_created, deadline)
+        else:
+            eta = await self._run_in_executor(self._estimate_task_time, task_created)
+            output = self._build_output(task, task_created, eta)
+        if lookup is not None:
+            self._store_response(lookup, output.model_copy())
+
+        if output.related_tasks is None and task_created.flg_ok_quality:
+            [output.related_tasks] = await self._run_in_executor(
+                self._get_relevant_tasks_batch, [task_created]
+            )
+
+        return output
+
+    async def aestimate_batch(
+        self, tasks: list[TaskInputSchema], include_related_tasks: bool = False
+    ) -> list[TaskOutputSchema]:
+        """
+        Оценка пачки задач. Запросы в Slack и Anthropic идут параллельно
+        с ограничением конкурентности, модель и ранкер вызываются один раз
+        на всю пачку.
+
+        :param tasks:
+        :param include_related_tasks: добавить в ответ похожие задачи из истории
+        :return: результаты в порядке входных задач
+        """
+        logger.info(f"Start batch estimation of {len(tasks)} tasks")
+        slack_semaphore = asyncio.Semaphore(config.batch_slack_concurrency)
+        llm_semaphore = asyncio.Semaphore(config.batch_llm_concurrency)
+
+        async def prepare(task: TaskInputSchema) -> TaskCreatedSchema:
+            async with slack_semaphore:
+                enriched = await self._aenrich_with_slack_thread(task)
+            async with llm_semaphore:
+                return await self._acreate_task(enriched)
+
+        tasks_created = await asyncio.gather(*(prepare(task) for task in tasks))
+        logger.info("Tasks created")
+
+        etas = await self._run_in_executor(self._estimate_tasks_time, tasks_created)
+        logger.info("Tasks estimated")
+
+        outputs = [
+            self._build_output(task, task_created, eta)
+            for task, task_created, eta in zip(tasks, tasks_created, etas)
+        ]
+
+        if include_related_tasks:
+            ok_ids = [i for i, t in enumerate(tasks_created) if t.flg_ok_quality]
+            related = await self._run_in_executor(
+                self._get_relevant_tasks_batch, [tasks_created[i] for i in ok_ids]
+            )
+            for i, related_tasks in zip(ok_ids, related):
+                outputs[i].related_tasks = related_tasks
+            logger.info("Related tasks ranked")
+
+        return outputs
+
+    def _get_relevant_tasks_batch(
+        self, tasks: list[TaskCreatedSchema]
+    ) -> list[list[dict]]:
+        """
+        Получение релевантных задач для пачки одним проходом ранкера.
+
+        :param tasks:
+        :return:
+        """
+        with span("ranker"):
+            results = self.ranker.rank_batch([task.result for task in tasks])
+        return [self.ranker.related_tasks(result) for result in results]
+
+    async def _aget_relevant_tasks(self, task: TaskCreatedSchema) -> RankerOutput:
+        """
+        Получение релевантных задач в пуле инференса.
+
+        :param task:
+        :return:
+        """
+        return await self._run_in_executor(self._get_relevant_tasks, task)
+
+    async def _acreate_task(self, task: TaskSchema) -> TaskCreatedSchema:
+        """
+        Создание задачи.
+
+        :param task:
+        :return:
+        """
+        text = self.task_creator.combine_json_to_task(task)
+        with span("task_creator"):
+            result = await self.task_creator.acreate_task(text)
+        if not result.flg_llm_work_done:
+            STAGE_ERRORS.inc(stage="task_creator")
+        return result
+
+    async def _aenrich_with_slack_thread(self, task: TaskInputSchema) -> TaskSchema:
         """
         Обогащение данных задачи данными из Slack.
 
         :param task:
         :return:
         """
-        result = enrich_with_slack_thread({"slack_link": task.slack_link})
+        with span("slack"):
+            result = await aenrich_with_slack_thread(
+                {"slack_link": task.slack_link}, self.slack_client
+            )
 
         return TaskSchema(
             jira_title=task.jira_title,
             jira_description=task.jira_description,
-            slack_messages=result["slack_thread_messages"],
+            slack_messages=result.get("slack_thread_messages"),
         )
+
+    async def _run_in_executor(self, func, *args):
+        """
+        Выполнение CPU-bound функции в пуле инференса. Контекст запроса
+        (trace id в логах) переносится в поток пула.
+
+        :param func:
+        :param args:
+        :return:
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self.executor, partial(context.run, func, *args)
+        )
+
+    async def aclose(self) -> None:
+        """
+        Освобождение общих ресурсов: клиента Slack, пула потоков и фоновых
+        задач.
+
+        :return:
+        """
+        for task in self._background_tasks:
+            task.cancel()
+        await aclose_slack_client(self.slack_client)
+        self.executor.shutdown(wait=False)
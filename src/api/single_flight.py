@@ -0,0 +1,65 @@
+import asyncio
+from functools import partial
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Coalescing of concurrent identical calls: while a call with a key is in
+    flight, the next callers with the same key wait for its result instead of
+    starting their own.
+
+    The call runs as a separate task, so a cancelled caller, e.g. a client that
+    disconnected, does not cancel it for the others. Errors are raised to all
+    callers, nothing is remembered after the call finishes.
+    """
+
+    def __init__(self):
+        self._in_flight: dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.executions = 0
+
+    @property
+    def coalesced(self) -> int:
+        return self.calls - self.executions
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalescing_ratio": self.coalesced / self.calls if self.calls else 0,
+            "in_flight": self.in_flight,
+        }
+
+    async def run(
+        self, key: Hashable, func: Callable[[], Awaitable[Any]]
+    ) -> tuple[Any, bool]:
+        """
+        Result of ``func`` or of the in-flight call with the same key.
+
+        :param key:
+        :param func: coroutine function without arguments
+        :return: the result and whether it came from another caller's call
+        """
+        self.calls += 1
+        task = self._in_flight.get(key)
+        shared = task is not None
+        if not shared:
+            self.executions += 1
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(partial(self._forget, key))
+
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # the error was raised to the callers, or nobody is waiting any more
+        if not task.cancelled():
+            task.exception()
@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic import Field, model_validator
 from pydantic_settings import BaseSettings
@@ -36,6 +36,7 @@ class BaseConfig(BaseSettings):
     reports_dir: Optional[Path] = None
     figures_dir: Optional[Path] = None
     src_dir: Optional[Path] = None
+    cache_dir: Optional[Path] = None
 
     random_state: int = Field(default=42, alias="RANDOM_STATE")
     anthropic_api_key: Optional[str] = Field(alias="ANTHROPIC_API_KEY")
@@ -47,6 +48,34 @@ class BaseConfig(BaseSettings):
     slack_bot_token: Optional[str] = Field(alias="SLACK_BOT_TOKEN")
     slack_app_token: Optional[str] = Field(alias="SLACK_APP_TOKEN")
 
+    inference_workers: int = Field(default=4, alias="INFERENCE_WORKERS")
+    batch_slack_concurrency: int = Field(default=8, alias="BATCH_SLACK_CONCURRENCY")
+    batch_llm_concurrency: int = Field(default=8, alias="BATCH_LLM_CONCURRENCY")
+    slack_requests_per_minute: float = Field(
+        default=50, alias="SLACK_REQUESTS_PER_MINUTE"
+    )
+    slack_max_concurrency: int = Field(default=4, alias="SLACK_MAX_CONCURRENCY")
+    llm_cache_max_entries: int = Field(default=100_000, alias="LLM_CACHE_MAX_ENTRIES")
+    response_cache_max_entries: int = Field(
+        default=10_000, alias="RESPONSE_CACHE_MAX_ENTRIES"
+    )
+    response_cache_ttl_seconds: float = Field(
+        default=3600, alias="RESPONSE_CACHE_TTL_SECONDS"
+    )
+    response_cache_similarity_threshold: float = Field(
+        default=0.95, alias="RESPONSE_CACHE_SIMILARITY_THRESHOLD"
+    )
+    estimation_mode: Literal["model", "hedged"] = Field(
+        default="model", alias="ESTIMATION_MODE"
+    )
+    llm_estimate_deadline_seconds: float = Field(
+        default=15, alias="LLM_ESTIMATE_DEADLINE_SECONDS"
+    )
+    llm_estimate_weight: float = Field(default=0.5, alias="LLM_ESTIMATE_WEIGHT")
+    model_reload_interval_seconds: float = Field(
+        default=30, alias="MODEL_RELOAD_INTERVAL_SECONDS"
+    )
+
     @model_validator(mode="after")
     def set_default_paths(self) -> "BaseConfig":
         """
@@ -83,3 +112,5 @@ class BaseConfig(BaseSettings):
             self.figures_dir = self.reports_dir / "figures"
         if self.src_dir is None:
             self.src_dir = self.proj_root / "src"
+        if self.cache_dir is None:
+            self.cache_dir = self.proj_root / ".cache"
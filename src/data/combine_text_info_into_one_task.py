@@ -1,11 +1,21 @@
-from tqdm import tqdm
+from functools import partial
+
 from typer import Typer
 from src.config import BaseConfig
-import json
+from src.data.datasets import COMBINED_SCHEMA
+from src.data.incremental import IncrementalUpdate
+from src.data.storage import read_dataset, write_dataset
 from pathlib import Path
 from loguru import logger
 
-from src.tools.task_creator import TaskCreator, TaskSchema
+from src.tools.llm_executor import LLMBatchExecutor
+from src.tools.message_batch import MessageBatchRunner
+from src.tools.task_creator import (
+    TaskCreatedSchema,
+    TaskCreator,
+    TaskSchema,
+    get_llm_cache,
+)
 
 app = Typer(pretty_exceptions_enable=False)
 
@@ -15,40 +25,171 @@ HEADERS = {"Authorization": f"Bearer {config.slack_bot_token}"}
 
 @app.command()
 def main(
-    input_path: Path = config.interim_data_dir / "cleaned_enriched_jira_tasks.json",
-    output_path: Path = config.interim_data_dir / "combined_jira_tasks.json",
+    input_path: Path = config.interim_data_dir / "cleaned_enriched_jira_tasks.parquet",
+    output_path: Path = config.interim_data_dir / "combined_jira_tasks.parquet",
+    use_cache: bool = True,
+    checkpoint_path: Path = config.interim_data_dir
+    / "combined_jira_tasks.checkpoint.jsonl",
+    max_workers: int = 8,
+    requests_per_minute: float = 50,
+    batch_mode: bool = False,
+    incremental: bool = True,
 ):
     """
     Combine text information into one task.
 
     :param input_path:
     :param output_path:
+    :param use_cache: reuse LLM results for unchanged tickets
+    :param checkpoint_path: progress of the current run, an interrupted run
+        resumes from it; removed after the output is written
+    :param max_workers: concurrent LLM requests
+    :param requests_per_minute: rate limit of the LLM requests
+    :param batch_mode: submit all prompts as Anthropic message batches instead of
+        interactive calls; cheaper, but results arrive within hours
+    :param incremental: prepare only new and changed tasks and retry the failed
+        ones, carry over the rest from the previous output
     :return:
     """
 
-    data = json.loads(input_path.read_text())
-    result = handle_task_creation(data)
+    task_creator = TaskCreator(cache=get_llm_cache() if use_cache else None)
+    update = IncrementalUpdate(
+        output_path,
+        stage_version=f"{task_creator.model}:{task_creator.prompt_digest}",
+        enabled=incremental,
+        reusable=lambda item: (item.get("prepared_task") or {}).get(
+            "flg_llm_work_done"
+        ),
+    )
+    data = update.split(read_dataset(input_path))
+
+    if batch_mode:
+        result = handle_task_creation_batch(data, task_creator)
+        write_dataset(output_path, update.merge(result), COMBINED_SCHEMA)
+        update.write_manifest()
+        logger.info(f"Prepared tasks saved to {output_path}")
+        return
+
+    executor = LLMBatchExecutor(
+        partial(create_task, task_creator),
+        checkpoint_path=checkpoint_path,
+        max_workers=max_workers,
+        requests_per_minute=requests_per_minute,
+        usage=task_creator.usage,
+        lookup=partial(cached_task, task_creator),
+    )
+    result = handle_task_creation(data, task_creator, executor)
 
-    output_path.write_text(json.dumps(result, indent=4, ensure_ascii=False))
+    write_dataset(output_path, update.merge(result), COMBINED_SCHEMA)
+    update.write_manifest()
     logger.info(f"Prepared tasks saved to {output_path}")
+    checkpoint_path.unlink(missing_ok=True)
+
+
+def create_task(task_creator: TaskCreator, text: str) -> dict:
+    """
+    LLM call of the executor, errors are raised to be retried.
+
+    :param task_creator:
+    :param text:
+    :return:
+    """
+    return task_creator.create_task(text, raise_on_error=True).model_dump()
+
+
+def cached_task(task_creator: TaskCreator, text: str) -> dict | None:
+    """
+    Cached result of the text, the executor does not submit it.
+
+    :param task_creator:
+    :param text:
+    :return:
+    """
+    cached = task_creator.cached_task(text)
+    return cached.model_dump() if cached is not None else None
+
+
+def task_description_from_item(task_creator: TaskCreator, item: dict) -> str:
+    """
+    Text sent to the TaskCreator for one enriched item.
 
+    :param task_creator:
+    :param item:
+    :return:
+    """
+    task = TaskSchema(
+        jira_title=item.get("jira_title"),
+        jira_description=item.get("jira_description"),
+        slack_messages=item.get("slack_thread_messages"),
+    )
+    return task_creator.combine_json_to_task(task)
 
-def handle_task_creation(data: list[dict]) -> list[dict]:
+
+def handle_task_creation_batch(
+    data: list[dict],
+    task_creator: TaskCreator | None = None,
+    runner: MessageBatchRunner | None = None,
+) -> list[dict]:
+    """
+    Handle the creation of tasks with the Message Batches API.
+
+    :param data:
+    :param task_creator: creator to use, a new one without cache if None
+    :param runner: batch runner, a default one if None
+    :return:
+    """
+    task_creator = task_creator or TaskCreator()
+    task_descriptions = {
+        item.get("jira_key", i): task_description_from_item(task_creator, item)
+        for i, item in enumerate(data)
+    }
+
+    results = task_creator.create_tasks_batch(task_descriptions, runner)
+
+    for i, item in enumerate(data):
+        item["prepared_task"] = results[item.get("jira_key", i)].model_dump()
+
+    return data
+
+
+def handle_task_creation(
+    data: list[dict],
+    task_creator: TaskCreator | None = None,
+    executor: LLMBatchExecutor | None = None,
+) -> list[dict]:
     """
     Handle the creation of tasks from the given data.
+
+    :param data:
+    :param task_creator: creator to use, a new one without cache if None
+    :param executor: executor of the LLM calls, a default one if None
+    :return:
     """
-    task_creator = TaskCreator()
-    for item in tqdm(data):
-        task = TaskSchema(
-            jira_title=item.get("jira_title"),
-            jira_description=item.get("jira_description"),
-            slack_messages=item.get("slack_thread_messages"),
-        )
+    task_creator = task_creator or TaskCreator()
+    executor = executor or LLMBatchExecutor(
+        partial(create_task, task_creator),
+        usage=task_creator.usage,
+        lookup=partial(cached_task, task_creator),
+    )
+
+    task_descriptions = {
+        item.get("jira_key", i): task_description_from_item(task_creator, item)
+        for i, item in enumerate(data)
+    }
 
-        task_description = task_creator.combine_json_to_task(task)
-        result = task_creator.create_task(task_description)
+    results = executor.run(task_descriptions)
 
-        item["prepared_task"] = result.model_dump()
+    for i, item in enumerate(data):
+        key = item.get("jira_key", i)
+        if key in results:
+            item["prepared_task"] = results[key]
+        else:
+            item["prepared_task"] = TaskCreatedSchema(
+                result="",
+                flg_ok_quality=False,
+                flg_llm_work_done=False,
+                error=executor.errors.get(key),
+            ).model_dump()
 
     return data
 
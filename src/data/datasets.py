@@ -0,0 +1,93 @@
+from pathlib import Path
+
+import pyarrow as pa
+from loguru import logger
+from typer import Typer
+
+from src.config import BaseConfig
+from src.data.incremental import SOURCE_HASH_FIELD
+from src.data.storage import iter_dataset, write_dataset
+
+app = Typer(pretty_exceptions_enable=False)
+
+config = BaseConfig()
+
+FILTERED_SCHEMA = pa.schema(
+    [
+        ("jira_key", pa.string()),
+        ("jira_title", pa.string()),
+        ("jira_description", pa.string()),
+        ("jira_created", pa.string()),
+        ("assignee_email", pa.string()),
+        ("assignee_level_order", pa.int64()),
+        ("slack_link", pa.string()),
+        ("weeks_since_member_join", pa.int64()),
+        ("time_to_complete_hours", pa.int64()),
+    ]
+)
+
+# enriched data and the same data with PII removed; the incremental stages
+# store the hash of the input record every output was made from
+ENRICHED_SCHEMA = FILTERED_SCHEMA.append(
+    pa.field("slack_thread_messages", pa.string())
+).append(pa.field(SOURCE_HASH_FIELD, pa.string()))
+
+PREPARED_TASK_TYPE = pa.struct(
+    [
+        ("result", pa.string()),
+        ("flg_ok_quality", pa.bool_()),
+        ("flg_llm_work_done", pa.bool_()),
+        ("error", pa.string()),
+    ]
+)
+COMBINED_SCHEMA = ENRICHED_SCHEMA.append(pa.field("prepared_task", PREPARED_TASK_TYPE))
+
+FINAL_SCHEMA = pa.schema(
+    [
+        ("assignee_level_order", pa.int64()),
+        ("jira_key", pa.string()),
+        ("jira_created", pa.string()),
+        ("weeks_since_member_join", pa.int64()),
+        ("time_to_complete_hours", pa.int64()),
+        ("task_text", pa.string()),
+    ]
+)
+
+
+def previous_tasks_schema(top_k: int) -> pa.Schema:
+    """
+    Schema of the features from the ``top_k`` most similar earlier tasks.
+
+    :param top_k:
+    :return:
+    """
+    return pa.schema(
+        [
+            ("jira_key", pa.string()),
+            ("prev_task_keys", pa.list_(pa.string())),
+            ("prev_task_scores", pa.list_(pa.float32())),
+            ("prev_task_hours", pa.list_(pa.int64())),
+        ]
+        + [(f"prev_task_eta_{j}", pa.int64()) for j in range(top_k)]
+    )
+
+
+@app.command()
+def main(
+    input_path: Path = config.processed_data_dir / "final_data_to_train.parquet",
+    output_path: Path = config.processed_data_dir / "final_data_to_train.json",
+):
+    """
+    Convert a dataset between formats, e.g. export a Parquet file to a JSON
+    array for debugging. Formats are chosen by the file suffixes.
+
+    :param input_path:
+    :param output_path:
+    :return:
+    """
+    count = write_dataset(output_path, iter_dataset(input_path))
+    logger.info(f"Exported {count} records from {input_path} to {output_path}")
+
+
+if __name__ == "__main__":
+    app()
@@ -2,50 +2,66 @@ from loguru import logger
 from typer import Typer
 from pathlib import Path
 from src.config import BaseConfig
-import json
+from src.data.datasets import ENRICHED_SCHEMA
+from src.data.incremental import IncrementalUpdate
+from src.data.storage import read_dataset, write_dataset
+from src.data.slack_client import SlackClient, get_slack_client
+from concurrent.futures import ThreadPoolExecutor
 
 from datetime import datetime
 
 import re
-import requests
 
 app = Typer(pretty_exceptions_enable=False)
 
 config = BaseConfig()
-HEADERS = {"Authorization": f"Bearer {config.slack_bot_token}"}
+# bump to fetch all threads again on the next incremental run
+ENRICH_STAGE_VERSION = "slack-thread-v1"
 
 
 @app.command()
 def main(
-    input_path: Path = config.interim_data_dir / "filtered_jira_tasks.json",
-    output_path: Path = config.interim_data_dir / "enriched_jira_tasks.json",
+    input_path: Path = config.interim_data_dir / "filtered_jira_tasks.parquet",
+    output_path: Path = config.interim_data_dir / "enriched_jira_tasks.parquet",
+    max_workers: int = config.slack_max_concurrency,
+    incremental: bool = True,
 ):
     """
     Main function to enrich the JIRA tasks with Slack thread messages
 
+    Threads are fetched concurrently through the shared Slack client, which
+    limits the request rate and caches the threads on disk between runs.
+
     :param input_path:
     :param output_path:
+    :param max_workers: concurrent Slack requests
+    :param incremental: fetch threads only for new and changed tasks, carry over
+        the rest from the previous output
     :return:
     """
 
-    data = json.loads(input_path.read_text())
+    update = IncrementalUpdate(output_path, ENRICH_STAGE_VERSION, enabled=incremental)
+    data = update.split(read_dataset(input_path))
 
-    enriched_data = []
-    for item in data:
-        enriched_item = enrich_with_slack_thread(item)
-        enriched_data.append(enriched_item)
+    slack_client = get_slack_client()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        enriched_data = list(
+            pool.map(lambda item: enrich_with_slack_thread(item, slack_client), data)
+        )
 
-    output_path.write_text(
-        json.dumps(enriched_data, indent=4, ensure_ascii=False, sort_keys=True)
-    )
+    write_dataset(output_path, update.merge(enriched_data), ENRICHED_SCHEMA)
+    update.write_manifest()
 
     logger.info(f"Enriched data saved to: {output_path}")
 
 
-def enrich_with_slack_thread(data: dict) -> dict:
+def enrich_with_slack_thread(
+    data: dict, slack_client: SlackClient | None = None
+) -> dict:
     """
     Enrich the data with the Slack thread messages
     :param data:
+    :param slack_client: the shared cached client is used if None
     :return:
     """
     slack_thread_link = data.get("slack_link")
@@ -56,14 +72,47 @@ def enrich_with_slack_thread(data: dict) -> dict:
         return data
 
     channel_id, parent_ts = parse_slack_link(slack_thread_link)
-    messages = fetch_thread_messages(channel_id, parent_ts)
-    messages = filter_message_at_the_same_day(messages, parent_ts)
-    messages = get_only_text_messages(messages)
+    messages = fetch_thread_messages(channel_id, parent_ts, slack_client)
+    data["slack_thread_messages"] = thread_messages_to_text(messages, parent_ts)
+    return data
+
 
-    data["slack_thread_messages"] = "\n".join(messages)
+async def aenrich_with_slack_thread(
+    data: dict, slack_client: SlackClient | None = None
+) -> dict:
+    """
+    Async version of ``enrich_with_slack_thread``
+
+    :param data:
+    :param slack_client: the shared cached client is used if None
+    :return:
+    """
+    slack_thread_link = data.get("slack_link")
+    if not slack_thread_link:
+        return data
+
+    if "/archives/" not in slack_thread_link:
+        return data
+
+    channel_id, parent_ts = parse_slack_link(slack_thread_link)
+    messages = await afetch_thread_messages(channel_id, parent_ts, slack_client)
+    data["slack_thread_messages"] = thread_messages_to_text(messages, parent_ts)
     return data
 
 
+def thread_messages_to_text(messages: list[dict], parent_ts: str) -> str:
+    """
+    Keep the text messages of the first day of the thread and join them
+
+    :param messages:
+    :param parent_ts:
+    :return:
+    """
+    messages = filter_message_at_the_same_day(messages, parent_ts)
+    messages = get_only_text_messages(messages)
+    return "\n".join(messages)
+
+
 def parse_slack_link(link: str):
     """
     Function to parse the link and extract channel ID and timestamp
@@ -82,32 +131,34 @@ def parse_slack_link(link: str):
     return channel_id, timestamp
 
 
-def fetch_thread_messages(channel_id: str, parent_ts: str):
+def fetch_thread_messages(
+    channel_id: str, parent_ts: str, slack_client: SlackClient | None = None
+):
     """
     Fetch Thread Messages
 
     :param channel_id:
     :param parent_ts:
+    :param slack_client: the shared cached client is used if None
+    :return:
+    """
+    slack_client = slack_client or get_slack_client()
+    return slack_client.fetch_thread_messages(channel_id, parent_ts)
+
+
+async def afetch_thread_messages(
+    channel_id: str, parent_ts: str, slack_client: SlackClient | None = None
+):
+    """
+    Fetch Thread Messages without blocking the event loop
+
+    :param channel_id:
+    :param parent_ts:
+    :param slack_client: the shared cached client is used if None
     :return:
     """
-    url = "https://slack.com/api/conversations.replies"
-    params = {"channel": channel_id, "ts": parent_ts}
-
-    response = requests.get(url, headers=HEADERS, params=params, timeout=600)
-    if response.status_code == 200:
-        data = response.json()
-        if data.get("ok"):
-            return data.get("messages", [])
-        else:
-            logger.warning(f"Error: {data.get('error')}")
-    else:
-        logger.warning(f"HTTP Error: {response.status_code}")
-
-    logger.warning(
-        f"Failed to fetch thread messages for channel: "
-        f"{channel_id} and ts: {parent_ts}"
-    )
-    return []
+    slack_client = slack_client or get_slack_client()
+    return await slack_client.afetch_thread_messages(channel_id, parent_ts)
 
 
 def filter_message_at_the_same_day(messages, parent_ts):
@@ -1,10 +1,14 @@
 import string
-from typing import Iterable
+from functools import partial
+from typing import Container, Iterable, Iterator
 
 from loguru import logger
 from typer import Typer
 from pathlib import Path
 from src.config import BaseConfig
+from src.data.datasets import FILTERED_SCHEMA
+from src.data.parallel import parallel_map_chunks
+from src.data.storage import iter_latest_by_key, write_dataset
 import json
 
 from urllib.parse import urlparse
@@ -14,59 +18,90 @@ app = Typer(pretty_exceptions_enable=False)
 
 config = BaseConfig()
 
+FIELDS_RENAMING = {
+    "key": "jira_key",
+    "fields.summary": "jira_title",
+    "fields.description": "jira_description",
+    "fields.created": "jira_created",
+    "fields.assignee.emailAddress": "assignee_email",
+    "assignee_level_order": "assignee_level_order",
+    "slack_link": "slack_link",
+    "experience_weeks": "weeks_since_member_join",
+    "time_to_complete_hours": "time_to_complete_hours",
+}
+
 
 @app.command()
 def main(
-    input_path: Path = config.raw_data_dir / "jira_tasks_from_api.json",
-    output_path: Path = config.interim_data_dir / "jira_tasks_filtered.json",
+    input_path: Path = config.raw_data_dir / "raw_jira_tasks_from_api.jsonl",
+    output_path: Path = config.interim_data_dir / "filtered_jira_tasks.parquet",
+    workers: int = 1,
+    chunk_size: int = 1000,
 ):
     """
     Filter Jira JSON data by assignees, done issues, issue types,
     and necessary fields.
 
+    The export is streamed through a generator pipeline and written
+    item by item, so memory does not grow with the export size. With
+    ``workers > 1`` shards of the export are filtered in a process pool.
+
     :param input_path:
     :param output_path:
+    :param workers: processes for the filtering
+    :param chunk_size: issues per shard
     :return:
     """
 
-    data = json.loads(input_path.read_text())
-    logger.info(f"Loaded Jira data from {input_path}")
-
-    employees_information = read_employees_information()
-    assignees_email = [employee["email"] for employee in employees_information]
-    logger.info(f"Got {len(assignees_email)=} assignees email addresses")
+    employees_by_email = index_employees_by_email(read_employees_information())
+    logger.info(f"Got {len(employees_by_email)=} assignees email addresses")
 
     issues_information = read_issues_information()
-    issue_types = [issue["id"] for issue in issues_information["types"]]
+    issue_types = {issue["id"] for issue in issues_information["types"]}
     logger.info(f"Got {len(issue_types)=} issue types")
 
-    data = filter_by_assignees(data, assignees_email)
+    # the raw export is an append-only log, keep the last version of every issue
+    data = iter_latest_by_key(input_path)
+    data = parallel_map_chunks(
+        partial(
+            filter_jira_tasks,
+            employees_by_email=employees_by_email,
+            issue_types=issue_types,
+        ),
+        data,
+        workers=workers,
+        chunk_size=chunk_size,
+    )
+
+    count = write_dataset(output_path, data, FILTERED_SCHEMA)
+    logger.info(f"Saved {count} filtered Jira tasks to {output_path}")
+
+
+def filter_jira_tasks(
+    data: Iterable[dict],
+    employees_by_email: dict[str, dict],
+    issue_types: set[str],
+) -> Iterator[dict]:
+    """
+    Lazy pipeline from raw Jira issues to the filtered tasks.
+
+    :param data: raw Jira issues
+    :param employees_by_email: see ``index_employees_by_email``
+    :param issue_types: issue type IDs to keep
+    :return:
+    """
+    data = filter_by_assignees(data, employees_by_email)
     data = filter_done_issues(data)
     data = filter_by_issue_types(data, issue_types)
     data = handle_custom_12039_12040_12041_fields(data)
     data = filter_necessary_fields(data)
-    data = add_employee_information(data, employees_information)
+    data = add_employee_information(data, employees_by_email)
     data = extract_slack_link_from_description(data)
     data = calculate_experience_weeks(data)
     data = filter_null_timeestimates(data)
     data = calculate_time_to_complete(data)
 
-    data = rename_fields(
-        data,
-        {
-            "key": "jira_key",
-            "fields.summary": "jira_title",
-            "fields.description": "jira_description",
-            "fields.created": "jira_created",
-            "fields.assignee.emailAddress": "assignee_email",
-            "assignee_level_order": "assignee_level_order",
-            "slack_link": "slack_link",
-            "experience_weeks": "weeks_since_member_join",
-            "time_to_complete_hours": "time_to_complete_hours",
-        },
-    )
-
-    output_path.write_text(json.dumps(data, indent=4, ensure_ascii=False))
+    return rename_fields(data, FIELDS_RENAMING)
 
 
 def read_issues_information(
@@ -86,7 +121,7 @@ def read_issues_information(
 
 def read_employees_information(
     input_path: Path = config.raw_data_dir / ".private.employees.json",
-) -> dict:
+) -> list[dict]:
     """
     Read employees information from JSON file.
 
@@ -99,60 +134,61 @@ def read_employees_information(
     return employees_information
 
 
+def index_employees_by_email(employees_information: Iterable[dict]) -> dict:
+    """
+    Index employees by email for O(1) lookups.
+
+    :param employees_information:
+    :return: email -> employee
+    """
+    return {employee["email"]: employee for employee in employees_information}
+
+
 def filter_by_assignees(
     data: Iterable[dict],
-    assignees_email: Iterable[str],
-) -> Iterable[dict]:
+    assignees_email: Container[str],
+) -> Iterator[dict]:
     """
     Filter Jira JSON data by assignee email addresses.
 
     :param data:
-    :param assignees_email:
+    :param assignees_email: set or dict of emails
     :return:
     """
-    logger.info("Filtering Jira data by assignee email. Len = {len(data)}")
-    res = []
     for item in data:
         try:
             if item["fields"]["assignee"]["emailAddress"] in assignees_email:
-                res.append(item)
+                yield item
         except (KeyError, TypeError):
             pass
-    logger.info("Filtered Jira data. Len = {len(res)}")
-
-    return res
 
 
-def filter_done_issues(data: Iterable[dict]) -> Iterable[dict]:
+def filter_done_issues(data: Iterable[dict]) -> Iterator[dict]:
     """
     Filter Jira JSON data by done issues.
 
     :param data:
     :return:
     """
-    logger.info("Filtering Jira data by done issues. Len = {len(data)}")
-    res = [item for item in data if item["fields"]["status"]["name"] == "Done"]
-    logger.info("Filtered Jira data. Len = {len(res)}")
-
-    return res
+    for item in data:
+        if item["fields"]["status"]["name"] == "Done":
+            yield item
 
 
 def filter_by_issue_types(
     data: Iterable[dict],
-    issue_types: Iterable[str],
-) -> Iterable[dict]:
+    issue_types: Container[str],
+) -> Iterator[dict]:
     """
     Filter Jira JSON data by issue types.
 
     :param data:
-    :param issue_types: List of issue types IDs to filter by.
+    :param issue_types: set of issue types IDs to filter by.
     :return:
     """
-    logger.info("Filtering Jira data by issue types. Len = {len(data)}")
-    res = [item for item in data if item["fields"]["issuetype"]["id"] in issue_types]
-    logger.info(f"Filtered Jira data. {len(res)=}")
-
-    return res
+    for item in data:
+        if item["fields"]["issuetype"]["id"] in issue_types:
+            yield item
 
 
 def filter_necessary_fields(
@@ -168,7 +204,7 @@ def filter_necessary_fields(
         "fields.assignee.emailAddress",
         "fields.status.name",
     ),
-) -> Iterable[dict]:
+) -> Iterator[dict]:
     """
     Filter Jira JSON data by necessary fields.
 
@@ -176,33 +212,29 @@ def filter_necessary_fields(
     :param fields: json path to fields to keep
     :return:
     """
-    logger.info("Removing unnecessary fields from Jira data")
-    res = []
+    paths = [(field, field.split(".")) for field in fields]
     for item in data:
         res_item = {}
-        for field in fields:
+        for field, keys in paths:
             value = item
-            for key in field.split("."):
+            for key in keys:
                 value = value.get(key, {})
             res_item[field] = value if value else None
-        res.append(res_item)
-    logger.info(f"Removed unnecessary fields from Jira data. Len = {len(res)}")
-
-    return res
+        yield res_item
 
 
 def handle_custom_12039_12040_12041_fields(
     data: Iterable[dict],
-) -> Iterable[dict]:
+) -> Iterator[dict]:
     """
     Handle custom fields 12039, 12040, 12041.
 
     :param data:
     :return:
     """
-    logger.info("Handling custom fields 12039, 12040, 12041")
     for item in data:
         if not item.get("fields", {}).get("customfield_12039"):
+            yield item
             continue
 
         what_to_do = item.get("fields", {}).get("customfield_12039", "")
@@ -213,60 +245,42 @@ def handle_custom_12039_12040_12041_fields(
             f"BECAUSE: [{why_to_do}] \n"
             f"SLACK LINK: {slack}"
         )
-
-    logger.info("Handled custom fields 12039, 12040, 12041")
-
-    return data
+        yield item
 
 
 def add_employee_information(
     data: Iterable[dict],
-    employees_information: Iterable[dict],
-) -> Iterable[dict]:
+    employees_by_email: dict[str, dict],
+) -> Iterator[dict]:
     """
     Add employee information to Jira JSON filtered data
 
     :param data:
-    :param employees_information: level, join_date, level_order
+    :param employees_by_email: email -> level, join_date, level_order
     :return:
     """
-    logger.info("Adding employee information to Jira data")
     for item in data:
-        assignee_email = item.get("fields.assignee.emailAddress")
-        if not assignee_email:
-            continue
-
-        employee = next(
-            (
-                employee
-                for employee in employees_information
-                if employee["email"] == assignee_email
-            ),
-            None,
-        )
-        if not employee:
-            continue
-
-        item["assignee_level"] = employee["level"]
-        item["assignee_join_date"] = employee["join_date"]
-        item["assignee_level_order"] = employee["level_order"]
-
-    return data
+        employee = employees_by_email.get(item.get("fields.assignee.emailAddress"))
+        if employee:
+            item["assignee_level"] = employee["level"]
+            item["assignee_join_date"] = employee["join_date"]
+            item["assignee_level_order"] = employee["level_order"]
+        yield item
 
 
 def extract_slack_link_from_description(
     data: Iterable[dict],
-) -> Iterable[dict]:
+) -> Iterator[dict]:
     """
     Extract Slack link from description and add it to the data.
 
     :param data:
     :return:
     """
-    logger.info("Extracting Slack link from description")
     for item in data:
         description = item.get("fields.description", "")
         if not description:
+            yield item
             continue
 
         all_valid_links = []
@@ -282,50 +296,44 @@ def extract_slack_link_from_description(
             None,
         )
 
-        if not slack_link:
-            continue
-        # remove certain message path
-        slack_link = slack_link.split("?")[0]
-
-        item["slack_link"] = slack_link
-
-    return data
+        if slack_link:
+            # remove certain message path
+            item["slack_link"] = slack_link.split("?")[0]
+        yield item
 
 
 def calculate_experience_weeks(
     data: Iterable[dict],
-) -> Iterable[dict]:
+) -> Iterator[dict]:
     """
     Calculate experience weeks and add it to the data.
 
     :param data:
     :return:
     """
-    logger.info("Calculating experience weeks")
     for item in data:
         assignee_join_date = item.get("assignee_join_date")
         task_created = item.get("fields.created")
         if not assignee_join_date:
+            yield item
             continue
 
         assignee_join_date = datetime.strptime(assignee_join_date[:10], "%Y-%m-%d")
         task_created = datetime.strptime(task_created[:10], "%Y-%m-%d")
         experience_weeks = (task_created - assignee_join_date).days // 7
         item["experience_weeks"] = experience_weeks
-
-    return data
+        yield item
 
 
 def calculate_time_to_complete(
     data: Iterable[dict],
-) -> Iterable[dict]:
+) -> Iterator[dict]:
     """
     Calculate time to complete and add it to the data.
 
     :param data:
     :return:
     """
-    logger.info("Calculating time to complete")
     for item in data:
         time_estimate = item.get("fields.timeestimate")
         time_original_estimate = item.get("fields.timeoriginalestimate")
@@ -338,34 +346,27 @@ def calculate_time_to_complete(
         except TypeError:
             item["time_to_complete_hours"] = None
             logger.warning(f"Error calculating time to complete for {item['key']}")
-
-    return data
+        yield item
 
 
 def filter_null_timeestimates(
     data: Iterable[dict],
-) -> Iterable[dict]:
+) -> Iterator[dict]:
     """
     Filter out tasks with null timeoriginalestimate or timeestimate.
 
     :param data:
     :return:
     """
-    logger.info("Filtering out tasks with null timeestimates")
-    res = [
-        item
-        for item in data
-        if item.get("fields.timeestimate") or item.get("fields.timeoriginalestimate")
-    ]
-    logger.info(f"Filtered out tasks with null timeestimates. Len = {len(res)}")
-
-    return res
+    for item in data:
+        if item.get("fields.timeestimate") or item.get("fields.timeoriginalestimate"):
+            yield item
 
 
 def rename_fields(
     data: Iterable[dict],
     fields: dict,
-) -> Iterable[dict]:
+) -> Iterator[dict]:
     """
     Rename fields in Jira JSON data.
 
@@ -373,15 +374,10 @@ def rename_fields(
     :param fields: dict with old and new field names
     :return:
     """
-    logger.info("Renaming fields in Jira data")
-    new_data = []
     for item in data:
-        new_item = {}
-        for old_field, new_field in fields.items():
-            new_item[new_field] = item.get(old_field)
-        new_data.append(new_item)
-
-    return new_data
+        yield {
+            new_field: item.get(old_field) for old_field, new_field in fields.items()
+        }
 
 
 if __name__ == "__main__":
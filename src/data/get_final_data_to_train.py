@@ -1,7 +1,11 @@
+from typing import Iterable, Iterator
+
 from tqdm import tqdm
 from typer import Typer
 from src.config import BaseConfig
-import json
+from src.data.datasets import FINAL_SCHEMA
+from src.data.parallel import parallel_map_chunks
+from src.data.storage import iter_dataset, write_dataset
 from pathlib import Path
 from loguru import logger
 
@@ -12,26 +16,38 @@ config = BaseConfig()
 
 @app.command()
 def main(
-    input_path: Path = config.interim_data_dir / "combined_jira_tasks.json",
-    output_path: Path = config.processed_data_dir / "processed_tasks.json",
+    input_path: Path = config.interim_data_dir / "combined_jira_tasks.parquet",
+    output_path: Path = config.processed_data_dir / "final_data_to_train.parquet",
+    workers: int = 1,
+    chunk_size: int = 1000,
 ):
     """
     Combine text information into one task.
 
     :param input_path:
     :param output_path:
+    :param workers: processes for the preparation
+    :param chunk_size: tasks per shard
     :return:
     """
 
-    data = json.loads(input_path.read_text())
-    new_data = []
-    for item in tqdm(data):
-        if not check_data_ok(item):
-            continue
+    data = iter_dataset(input_path)
+    new_data = parallel_map_chunks(
+        prepare_final_data, tqdm(data), workers=workers, chunk_size=chunk_size
+    )
+
+    write_dataset(output_path, new_data, FINAL_SCHEMA)
 
-        new_data.append(select_columns(item))
 
-    output_path.write_text(json.dumps(new_data, indent=4, ensure_ascii=False))
+def prepare_final_data(data: Iterable[dict]) -> Iterator[dict]:
+    """
+    Keep the tasks the LLM prepared well and select the columns.
+    :param data:
+    :return:
+    """
+    for item in data:
+        if check_data_ok(item):
+            yield select_columns(item)
 
 
 def check_data_ok(data: dict):
@@ -63,6 +79,7 @@ def select_columns(data: dict):
     return {
         "assignee_level_order": data["assignee_level_order"],
         "jira_key": data["jira_key"],
+        "jira_created": data.get("jira_created"),
         "weeks_since_member_join": data["weeks_since_member_join"],
         "time_to_complete_hours": max(data["time_to_complete_hours"], 1),
         "task_text": data["prepared_task"]["result"],
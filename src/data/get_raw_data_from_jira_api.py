@@ -1,9 +1,15 @@
-from typing import Iterable
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Iterable, Iterator
 
 from loguru import logger
+from requests.adapters import HTTPAdapter
 from typer import Typer
 from pathlib import Path
+from urllib3.util.retry import Retry
 from src.config import BaseConfig
+from src.data.storage import append_jsonl
 import json
 import requests
 
@@ -11,111 +17,246 @@ app = Typer(pretty_exceptions_enable=False)
 
 config = BaseConfig()
 
+JIRA_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f%z"
+FIELDS_LIST = (
+    "description",
+    "assignee",
+    "summary",
+    "issuetype",
+    "status",
+    "created",
+    "updated",
+    "timeestimate",
+    "timeoriginalestimate",
+    # custom fields for my project
+    "customfield_12039",
+    "customfield_12040",
+    "customfield_12041",
+)
+
 
 @app.command()
 def main(
-    output_path: Path = config.raw_data_dir / "jira_tasks_from_api.json",
+    output_path: Path = config.raw_data_dir / "raw_jira_tasks_from_api.jsonl",
+    incremental: bool = False,
+    watermark_path: Path = config.raw_data_dir / "jira_watermark.json",
+    watermark_overlap_hours: float = 24,
+    max_workers: int = 4,
+    page_size: int = 100,
 ):
     """
     Request data from Jira API
 
+    Issues are streamed into an append-only JSONL file as they arrive. In the
+    incremental mode only issues updated since the stored watermark are fetched
+    and appended; readers keep the last version of every issue key.
+
     :param output_path:
+    :param incremental: fetch only issues updated since the last run
+    :param watermark_path: file with the latest ``updated`` seen so far
+    :param watermark_overlap_hours: re-fetch this window before the watermark,
+        JQL compares dates in the user's time zone and at minute precision
+    :param max_workers: concurrent bulkfetch requests
+    :param page_size: issue keys per search page and per bulkfetch request
     :return:
     """
+    watermark = read_watermark(watermark_path) if incremental else None
+    if not incremental:
+        output_path.unlink(missing_ok=True)
+
+    jql = f"project = {config.jira_project_key}"
+    if watermark:
+        since = watermark - timedelta(hours=watermark_overlap_hours)
+        jql += f' AND updated >= "{since:%Y-%m-%d %H:%M}"'
+    jql += " ORDER BY updated ASC"
+    logger.info(f"Fetching Jira issues: {jql}")
 
-    issues = get_my_project_issues()
-    issue_ids = [issue["key"] for issue in issues["issues"]]
-    logger.info(f"Got {len(issue_ids)=} issues ids")
+    session = make_session(pool_size=max_workers)
+    issue_keys = iter_issue_keys(session, jql, page_size=page_size)
+    issues = iter_bulk_data_from_jira_api(
+        session, issue_keys, chunk_size=page_size, max_workers=max_workers
+    )
 
-    issues = get_bulk_data_from_jira_api(issue_ids)
-    logger.info(f"Got {len(issues)=} issues jsons")
+    latest_updated = watermark
+    count = 0
+    for chunk in issues:
+        count += append_jsonl(output_path, chunk)
+        for issue in chunk:
+            updated = issue_updated_at(issue)
+            if updated and (latest_updated is None or updated > latest_updated):
+                latest_updated = updated
 
-    output_path.write_text(json.dumps(issues, indent=4, ensure_ascii=False))
-    logger.info(f"Saved issues to {output_path}")
+    logger.info(f"Saved {count} issues to {output_path}")
+    if latest_updated:
+        write_watermark(watermark_path, latest_updated)
 
 
-def get_my_project_issues(key: str = config.jira_project_key) -> dict:
+def make_session(pool_size: int = 4) -> requests.Session:
     """
-    Get my project issues from Jira API
+    Session with pooled connections and retries on 429/5xx (honouring
+    ``Retry-After``).
 
-    :param key:
+    :param pool_size:
     :return:
     """
+    session = requests.Session()
+    # мне немножко не дали доступов, поэтому реверс-инжиниринг
+    # TODO: Make it correct
+    session.cookies.set("tenant.session.token", config.jira_api_key)
+
+    retry = Retry(
+        total=5,
+        backoff_factor=1,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=None,
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    return session
 
-    cookies = {
-        # мне немножко не дали доступов, поэтому реверс-инжиниринг
-        "tenant.session.token": config.jira_api_key,
-    }
 
-    headers = {}
-    json_data = {"jql": f"project = {key}", "fields": ["key"], "maxResults": 5000}
+def iter_issue_keys(
+    session: requests.Session, jql: str, page_size: int = 100
+) -> Iterator[str]:
+    """
+    Page through the JQL search with ``nextPageToken``
+
+    :param session:
+    :param jql:
+    :param page_size:
+    :return: issue keys in search order
+    """
+    next_page_token = None
+    while True:
+        json_data = {"jql": jql, "fields": ["key"], "maxResults": page_size}
+        if next_page_token:
+            json_data["nextPageToken"] = next_page_token
 
-    try:
-        response = requests.post(
+        response = session.post(
             f"{config.jira_domain}/rest/api/3/search/jql",
-            cookies=cookies,
-            headers=headers,
             json=json_data,
-            timeout=600,
+            timeout=60,
         )
+        response.raise_for_status()
+        page = response.json()
 
-        return response.json()
-    except Exception as e:
-        logger.error(f"Error: {e}")
-        return {}
+        for issue in page.get("issues", []):
+            yield issue["key"]
+
+        next_page_token = page.get("nextPageToken")
+        if page.get("isLast") or not next_page_token:
+            return
 
 
 def get_bulk_data_from_jira_api(
+    session: requests.Session,
     issue_ids: list,
-    fields_list: Iterable[str] | None = (
-        "description",
-        "assignee",
-        "summary",
-        "issuetype",
-        "status",
-        "created",
-        "timeestimate",
-        "timeoriginalestimate",
-        # custom fields for my project
-        "customfield_12039",
-        "customfield_12040",
-        "customfield_12041",
-    ),
+    fields_list: Iterable[str] = FIELDS_LIST,
 ) -> list:
     """
-    Get bulk data from Jira API
+    Get one chunk of issues (up to 100) with the bulkfetch API
 
+    :param session:
     :param issue_ids:
     :param fields_list:
     :return:
     """
-    cookies = {
-        # мне немножко не дали доступов, поэтому реверс-инжиниринг
-        # TODO: Make it correct
-        "tenant.session.token": config.jira_api_key,
-    }
-
-    headers = {}
-    try:
-        issues = []
-        for i in range(0, len(issue_ids), 100):
-            json_data = {
-                "fields": fields_list,
-                "issueIdsOrKeys": issue_ids[i : i + 100],
-            }
-            response = requests.post(
-                f"{config.jira_domain}/rest/api/2/issue/bulkfetch",
-                cookies=cookies,
-                headers=headers,
-                json=json_data,
-                timeout=600,
-            )
-            issues.extend(response.json()["issues"])
-
-        return issues
-    except Exception as e:
-        logger.error(f"Error: {e}")
-        return []
+    json_data = {"fields": list(fields_list), "issueIdsOrKeys": issue_ids}
+    response = session.post(
+        f"{config.jira_domain}/rest/api/2/issue/bulkfetch",
+        json=json_data,
+        timeout=60,
+    )
+    response.raise_for_status()
+    return response.json()["issues"]
+
+
+def iter_bulk_data_from_jira_api(
+    session: requests.Session,
+    issue_keys: Iterable[str],
+    chunk_size: int = 100,
+    max_workers: int = 4,
+    fields_list: Iterable[str] = FIELDS_LIST,
+) -> Iterator[list]:
+    """
+    Fetch issues concurrently while the search is still paging.
+
+    At most ``2 * max_workers`` chunks are in flight, so memory does not grow
+    with the project size.
+
+    :param session:
+    :param issue_keys:
+    :param chunk_size:
+    :param max_workers:
+    :param fields_list:
+    :return: chunks of issues in completion order
+    """
+    issue_keys = iter(issue_keys)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        in_flight = set()
+        while True:
+            while len(in_flight) < 2 * max_workers:
+                chunk = list(islice(issue_keys, chunk_size))
+                if not chunk:
+                    break
+                in_flight.add(
+                    pool.submit(
+                        get_bulk_data_from_jira_api, session, chunk, fields_list
+                    )
+                )
+
+            if not in_flight:
+                return
+
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def issue_updated_at(issue: dict) -> datetime | None:
+    """
+    Parse ``fields.updated`` of a raw issue
+
+    :param issue:
+    :return:
+    """
+    updated = (issue.get("fields") or {}).get("updated")
+    if not updated:
+        return None
+
+    return datetime.strptime(updated, JIRA_DATETIME_FORMAT)
+
+
+def read_watermark(path: Path) -> datetime | None:
+    """
+    Read the latest ``updated`` timestamp of the previous run
+
+    :param path:
+    :return:
+    """
+    if not path.exists():
+        logger.info(f"No watermark at {path}, fetching everything")
+        return None
+
+    return datetime.fromisoformat(json.loads(path.read_text())["updated"])
+
+
+def write_watermark(path: Path, updated: datetime) -> None:
+    """
+    Store the latest ``updated`` timestamp for the next incremental run
+
+    :param path:
+    :param updated:
+    :return:
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"updated": updated.isoformat()}, indent=4))
+    logger.info(f"Saved watermark {updated.isoformat()} to {path}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,195 @@
+import hashlib
+import json
+from collections import Counter
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Iterable
+
+from loguru import logger
+
+from src.data.storage import read_dataset
+
+SOURCE_HASH_FIELD = "source_hash"
+
+
+def record_hash(record: dict, stage_version: str = "") -> str:
+    """
+    Content hash of an input record together with the version of the stage
+    that processes it (prompt, model, code). The hash of the previous stage is
+    not part of the content.
+
+    :param record:
+    :param stage_version:
+    :return:
+    """
+    content = {k: v for k, v in record.items() if k != SOURCE_HASH_FIELD}
+    payload = json.dumps(
+        [stage_version, content], sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def manifest_path(output_path: Path) -> Path:
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.stem + ".manifest.json")
+
+
+@dataclass
+class IncrementalManifest:
+    total: int = 0
+    new: int = 0
+    changed: int = 0
+    retried: int = 0
+    processed: int = 0
+    carried_over: int = 0
+    removed: int = 0
+
+    def summary(self) -> str:
+        return " ".join(f"{name}={value}" for name, value in asdict(self).items())
+
+
+class IncrementalUpdate:
+    """
+    Per-record incremental run of a stage.
+
+    Every output record stores the hash of the input record it was made from
+    (``source_hash``). On the next run only new and changed input records are
+    processed; for the unchanged ones the previous output is carried over, so
+    Slack and LLM calls are not repeated. Records that disappeared from the input
+    are dropped from the output.
+
+        update = IncrementalUpdate(output_path, stage_version)
+        processed = process(update.split(data))
+        data = update.merge(processed)
+        update.write_manifest()
+    """
+
+    def __init__(
+        self,
+        output_path: Path,
+        stage_version: str = "",
+        key: str = "jira_key",
+        enabled: bool = True,
+        reusable: Callable[[dict], bool] | None = None,
+    ):
+        """
+        :param output_path: output of the stage, previous results are read from it
+        :param stage_version: part of the hash, change it to reprocess everything
+        :param key: field that identifies a record across runs
+        :param enabled: if False every record is processed
+        :param reusable: previous outputs rejected by it are processed again,
+            e.g. failed LLM calls
+        """
+        self.output_path = Path(output_path)
+        self.stage_version = stage_version
+        self.key = key
+        self.enabled = enabled
+        self.reusable = reusable
+        self.manifest = IncrementalManifest()
+        self._inputs = []
+        self._hashes = []
+        self._carried_over = {}
+
+    def split(self, data: Iterable[dict]) -> list[dict]:
+        """
+        Remember the inputs and return the ones that have to be processed.
+
+        :param data: input records of the stage
+        :return: new, changed and retried records in input order
+        :raises ValueError: if several records have the same key, their outputs
+            could not be told apart
+        """
+        self._inputs = list(data)
+        keys = Counter(r.get(self.key) for r in self._inputs)
+        duplicates = sorted(k for k, n in keys.items() if k is not None and n > 1)
+        if duplicates:
+            raise ValueError(
+                f"Duplicate {self.key} values in the input of "
+                f"{self.output_path.name}: {', '.join(map(str, duplicates[:10]))}"
+            )
+
+        self._hashes = [record_hash(r, self.stage_version) for r in self._inputs]
+        previous = self._read_previous()
+
+        to_process = []
+        for record, source_hash in zip(self._inputs, self._hashes):
+            key = record.get(self.key)
+            output = previous.pop(key, None) if key is not None else None
+
+            if output is None:
+                self.manifest.new += 1
+            elif output.get(SOURCE_HASH_FIELD) != source_hash:
+                self.manifest.changed += 1
+            elif self.reusable is not None and not self.reusable(output):
+                self.manifest.retried += 1
+            else:
+                self._carried_over[key] = output
+                continue
+
+            to_process.append(record)
+
+        self.manifest.total = len(self._inputs)
+        self.manifest.processed = len(to_process)
+        self.manifest.carried_over = len(self._carried_over)
+        self.manifest.removed = len(previous)
+        logger.info(f"Incremental run of {self.output_path.name}: {self.summary()}")
+
+        return to_process
+
+    def merge(self, processed: Iterable[dict]) -> list[dict]:
+        """
+        Combine the processed records with the carried over ones.
+
+        :param processed: outputs for the records returned by ``split``, in the
+            same order
+        :return: outputs for all inputs in input order, with ``source_hash``
+        :raises ValueError: if the number of outputs does not match ``split``
+        """
+        processed = list(processed)
+        if len(processed) != self.manifest.processed:
+            raise ValueError(
+                f"Expected {self.manifest.processed} processed records for "
+                f"{self.output_path.name}, got {len(processed)}"
+            )
+
+        processed = iter(processed)
+        result = []
+        for record, source_hash in zip(self._inputs, self._hashes):
+            output = self._carried_over.get(record.get(self.key))
+            if output is None:
+                output = next(processed)
+                output[SOURCE_HASH_FIELD] = source_hash
+            result.append(output)
+
+        return result
+
+    def write_manifest(self, path: Path | None = None) -> Path:
+        """
+        Save the counts of the run, DVC tracks them as metrics.
+
+        :param path: ``<output>.manifest.json`` if None
+        :return:
+        """
+        path = Path(path or manifest_path(self.output_path))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(asdict(self.manifest), indent=4))
+        return path
+
+    def summary(self) -> str:
+        return self.manifest.summary()
+
+    def _read_previous(self) -> dict:
+        if not self.enabled or not self.output_path.exists():
+            return {}
+
+        try:
+            previous = read_dataset(self.output_path)
+        except Exception as e:
+            logger.warning(f"Cannot read previous {self.output_path}, ignoring: {e}")
+            return {}
+
+        return {
+            record[self.key]: record
+            for record in previous
+            if record.get(self.key) is not None
+        }
@@ -0,0 +1,67 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Callable, Iterable, Iterator, TypeVar
+
+from loguru import logger
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def iter_chunks(items: Iterable[T], chunk_size: int) -> Iterator[list[T]]:
+    """
+    Split an iterable into lists of ``chunk_size`` items, lazily.
+
+    :param items:
+    :param chunk_size:
+    :return:
+    """
+    items = iter(items)
+    while chunk := list(islice(items, chunk_size)):
+        yield chunk
+
+
+def parallel_map_chunks(
+    func: Callable[[list[T]], Iterable[R]],
+    items: Iterable[T],
+    workers: int = 1,
+    chunk_size: int = 1000,
+) -> Iterator[R]:
+    """
+    Apply ``func`` to shards of ``items`` in a process pool and yield the
+    results in input order.
+
+    The input is read lazily and at most ``2 * workers`` shards are in flight,
+    so a large dataset is never held in memory twice. ``func`` must be picklable:
+    a module-level function or a ``functools.partial`` of one. With
+    ``workers <= 1`` everything runs in the current process.
+
+    :param func: shard -> results, may be a generator and may yield fewer items
+        than the shard (e.g. a filter)
+    :param items:
+    :param workers: processes in the pool
+    :param chunk_size: items per shard
+    :return:
+    """
+    chunks = iter_chunks(items, chunk_size)
+    if workers <= 1:
+        for chunk in chunks:
+            yield from func(chunk)
+        return
+
+    logger.info(f"Processing shards of {chunk_size} items in {workers} processes")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append(pool.submit(_apply, func, chunk))
+            if len(in_flight) >= 2 * workers:
+                yield from in_flight.popleft().result()
+
+        for future in in_flight:
+            yield from future.result()
+
+
+def _apply(func: Callable[[list[T]], Iterable[R]], chunk: list[T]) -> list[R]:
+    # generators cannot be sent back from a worker
+    return list(func(chunk))
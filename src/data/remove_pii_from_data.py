@@ -1,56 +1,238 @@
-from typing import Iterable
+from functools import partial
+from typing import Container, Iterable
 
 from loguru import logger
 from tqdm import tqdm
 from typer import Typer
 from pathlib import Path
 from src.config import BaseConfig
-import json
+from src.data.datasets import ENRICHED_SCHEMA
+from src.data.incremental import IncrementalUpdate
+from src.data.parallel import parallel_map_chunks
+from src.data.storage import read_dataset, write_dataset
 
+from src.tools.llm_executor import LLMBatchExecutor
+from src.tools.message_batch import MessageBatchRunner
 from src.tools.pii_purifier import PIIPurifier
+from src.tools.pii_redactor import PIIRedactor
 
 app = Typer(pretty_exceptions_enable=False)
 
 config = BaseConfig()
+# bump when the redaction changes to clean all records again, a change of the
+# employees dictionary is picked up by its fingerprint
+PII_STAGE_VERSION = "pii-v3"
 
 
 @app.command()
 def main(
-    input_path: Path = config.interim_data_dir / "enriched_jira_tasks.json",
-    output_path: Path = config.interim_data_dir / "enriched_jira_tasks_no_pii.json",
+    input_path: Path = config.interim_data_dir / "enriched_jira_tasks.parquet",
+    output_path: Path = config.interim_data_dir / "cleaned_enriched_jira_tasks.parquet",
     pii_fields_to_remove: str = "jira_description",
+    workers: int = 1,
+    llm_fallback: bool = False,
+    checkpoint_path: Path = config.interim_data_dir
+    / "cleaned_enriched_jira_tasks.checkpoint.jsonl",
+    max_workers: int = 8,
+    requests_per_minute: float = 50,
+    batch_mode: bool = False,
+    incremental: bool = True,
 ):
     """
     Remove PII from the given data
     :param input_path:
     :param output_path:
     :param pii_fields_to_remove:
+    :param workers: processes of the local redaction engine
+    :param llm_fallback: send the texts flagged by the engine to the LLM
+    :param checkpoint_path: progress of the LLM fallback, an interrupted run
+        resumes from it; removed after the output is written
+    :param max_workers: concurrent LLM requests
+    :param requests_per_minute: rate limit of the LLM requests
+    :param batch_mode: send the flagged texts through Anthropic message batches
+    :param incremental: clean only new and changed records, carry over the rest
+        from the previous output
     :return:
     """
 
-    data = json.loads(input_path.read_text())
     pii_fields = pii_fields_to_remove.split(",")
+    purifier = PIIPurifier(llm_fallback=llm_fallback)
+    update = IncrementalUpdate(
+        output_path,
+        stage_version=(
+            f"{PII_STAGE_VERSION}:{purifier.redactor.fingerprint}:"
+            f"{pii_fields_to_remove}"
+        ),
+        enabled=incremental,
+    )
+    data = update.split(read_dataset(input_path))
 
-    data = remove_pii_from_data(data, pii_fields)
+    executor = LLMBatchExecutor(
+        purifier.todo_purify,
+        checkpoint_path=checkpoint_path,
+        max_workers=max_workers,
+        requests_per_minute=requests_per_minute,
+        usage=purifier.usage,
+    )
+    data = remove_pii_from_data(
+        data, pii_fields, purifier, workers, batch_mode, executor=executor
+    )
 
-    output_path.write_text(json.dumps(data, indent=4, ensure_ascii=False))
+    write_dataset(output_path, update.merge(data), ENRICHED_SCHEMA)
+    update.write_manifest()
     logger.info(f"Saved issues to {output_path}")
+    checkpoint_path.unlink(missing_ok=True)
 
 
 def remove_pii_from_data(
-    data: Iterable[dict],
+    data: list[dict],
     pii_fields: Iterable[str],
-) -> Iterable[dict]:
+    purifier: PIIPurifier | None = None,
+    workers: int = 1,
+    batch_mode: bool = False,
+    runner: MessageBatchRunner | None = None,
+    executor: LLMBatchExecutor | None = None,
+) -> list[dict]:
     """
-    Remove PII from the given data
+    Remove PII from the given data with the local engine of the purifier. The
+    fields it flags go to the LLM if ``purifier.llm_fallback`` is set
     :param data:
     :param pii_fields:
+    :param purifier: purifier to use, a new one if None
+    :param workers: processes of the local redaction engine
+    :param batch_mode: send the flagged fields through message batches
+    :param runner: batch runner, a default one if None
+    :param executor: executor of the interactive LLM calls, a default one if
+        None
     :return:
     """
-    for record in tqdm(data):
-        for pii_field in pii_fields:
-            if pii_field in record and record[pii_field]:
-                record[pii_field] = PIIPurifier().purify(record[pii_field])
+    purifier = purifier or PIIPurifier()
+    pii_fields = list(pii_fields)
+
+    flagged = redact_records(data, pii_fields, purifier.redactor, workers)
+    logger.info(f"Redacted {len(data)} records locally, {len(flagged)} fields flagged")
+
+    if not flagged or not purifier.llm_fallback:
+        return data
+
+    if batch_mode:
+        return remove_pii_from_data_batch(data, pii_fields, purifier, runner, flagged)
+
+    executor = executor or LLMBatchExecutor(purifier.todo_purify, usage=purifier.usage)
+    fields = {
+        (data[i].get("jira_key", i), pii_field): (i, pii_field)
+        for i, pii_field in sorted(flagged)
+    }
+    purified = executor.run(
+        {key: data[i][pii_field] for key, (i, pii_field) in fields.items()}
+    )
+    # texts whose request failed keep the local redaction
+    for key, text in purified.items():
+        i, pii_field = fields[key]
+        data[i][pii_field] = text
+
+    return data
+
+
+def redact_records(
+    data: list[dict],
+    pii_fields: list[str],
+    redactor: PIIRedactor,
+    workers: int = 1,
+    chunk_size: int = 1000,
+) -> set[tuple[int, str]]:
+    """
+    Redact the fields of the records in place, shards of records are redacted
+    in a process pool if ``workers > 1``
+
+    :param data:
+    :param pii_fields:
+    :param redactor:
+    :param workers:
+    :param chunk_size: records per shard
+    :return: (record index, field) pairs the engine is not sure about
+    """
+    results = parallel_map_chunks(
+        partial(redact_chunk, pii_fields=pii_fields, redactor=redactor),
+        tqdm(data),
+        workers=workers,
+        chunk_size=chunk_size,
+    )
+
+    flagged = set()
+    for i, (record, flagged_fields) in enumerate(results):
+        data[i] = record
+        flagged.update((i, pii_field) for pii_field in flagged_fields)
+
+    return flagged
+
+
+def redact_record(
+    record: dict, pii_fields: list[str], redactor: PIIRedactor
+) -> tuple[dict, list[str]]:
+    """
+    Redact the PII fields of one record
+
+    :param record:
+    :param pii_fields:
+    :param redactor:
+    :return: the record and its flagged fields
+    """
+    flagged_fields = []
+    for pii_field in pii_fields:
+        if pii_field in record and record[pii_field]:
+            result = redactor.redact(record[pii_field])
+            record[pii_field] = result.text
+            if result.flagged:
+                flagged_fields.append(pii_field)
+
+    return record, flagged_fields
+
+
+def redact_chunk(
+    records: list[dict], pii_fields: list[str], redactor: PIIRedactor
+) -> list[tuple[dict, list[str]]]:
+    """
+    Redact a shard of records, see ``redact_record``
+
+    :param records:
+    :param pii_fields:
+    :param redactor:
+    :return:
+    """
+    return [redact_record(record, pii_fields, redactor) for record in records]
+
+
+def remove_pii_from_data_batch(
+    data: list[dict],
+    pii_fields: Iterable[str],
+    purifier: PIIPurifier | None = None,
+    runner: MessageBatchRunner | None = None,
+    only: Container[tuple[int, str]] | None = None,
+) -> list[dict]:
+    """
+    Remove PII from the given data with the LLM, all fields of all records in
+    one batch job
+    :param data:
+    :param pii_fields:
+    :param purifier: purifier to use, a new one if None
+    :param runner: batch runner, a default one if None
+    :param only: (record index, field) pairs to send, all if None
+    :return:
+    """
+    purifier = purifier or PIIPurifier()
+    texts = {
+        (i, pii_field): record[pii_field]
+        for i, record in enumerate(data)
+        for pii_field in pii_fields
+        if pii_field in record
+        and record[pii_field]
+        and (only is None or (i, pii_field) in only)
+    }
+
+    purified = purifier.todo_purify_batch(texts, runner)
+    for (i, pii_field), text in purified.items():
+        data[i][pii_field] = text
 
     return data
 
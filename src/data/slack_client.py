@@ -0,0 +1,229 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import requests
+from loguru import logger
+from requests.adapters import HTTPAdapter
+
+from src.config import BaseConfig
+from src.tools.kv_cache import SQLiteCache
+from src.tools.rate_limit import TokenBucket
+
+config = BaseConfig()
+
+REPLIES_URL = "https://slack.com/api/conversations.replies"
+SLACK_THREADS_CACHE_PATH = config.cache_dir / "slack_threads.sqlite"
+# only the first day of a thread is used, later replies do not change the result
+THREAD_WINDOW_SECONDS = 86400
+
+
+class SlackClient:
+    """
+    Slack Web API client for thread replies, shared by the DVC stage and the API.
+
+    - pooled connections (``requests.Session`` for threads, ``httpx.AsyncClient``
+      for coroutines);
+    - at most ``max_concurrency`` requests in flight and a token bucket sized for
+      the method's rate limit tier (``conversations.replies`` is Tier 3, ~50/min);
+    - 429 responses are retried after ``Retry-After``;
+    - threads are cached by ``(channel_id, parent_ts)``. A thread older than the
+      first-day window cannot change and is cached without TTL, a thread that is
+      still active expires after ``active_thread_ttl_seconds``.
+    """
+
+    def __init__(
+        self,
+        token: str = config.slack_bot_token,
+        cache: SQLiteCache | None = None,
+        requests_per_minute: float = 50,
+        max_concurrency: int = 4,
+        active_thread_ttl_seconds: float = 300,
+        max_retries: int = 5,
+        timeout_seconds: float = 30,
+    ):
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.cache = cache
+        self.rate_limiter = TokenBucket.per_minute(requests_per_minute)
+        self.active_thread_ttl_seconds = active_thread_ttl_seconds
+        self.max_retries = max_retries
+        self.timeout_seconds = timeout_seconds
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.async_client = httpx.AsyncClient(
+            timeout=timeout_seconds,
+            limits=httpx.Limits(max_connections=max_concurrency),
+        )
+
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._async_semaphore = asyncio.Semaphore(max_concurrency)
+
+    def fetch_thread_messages(self, channel_id: str, parent_ts: str) -> list[dict]:
+        """
+        Fetch the messages of a thread
+
+        :param channel_id:
+        :param parent_ts:
+        :return: messages, empty list if the thread is not available
+        """
+        cached = self._get_cached(channel_id, parent_ts)
+        if cached is not None:
+            return cached
+
+        params = {"channel": channel_id, "ts": parent_ts}
+        with self._semaphore:
+            for _ in range(self.max_retries + 1):
+                self.rate_limiter.acquire()
+                response = self.session.get(
+                    REPLIES_URL,
+                    headers=self.headers,
+                    params=params,
+                    timeout=self.timeout_seconds,
+                )
+                if response.status_code != 429:
+                    break
+                time.sleep(retry_after_seconds(response))
+
+        return self._handle_response(response, channel_id, parent_ts)
+
+    async def afetch_thread_messages(
+        self, channel_id: str, parent_ts: str
+    ) -> list[dict]:
+        """
+        Fetch the messages of a thread without blocking the event loop
+
+        :param channel_id:
+        :param parent_ts:
+        :return: messages, empty list if the thread is not available
+        """
+        # SQLite calls run in a worker thread, not on the event loop
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self._get_cached, channel_id, parent_ts)
+            if cached is not None:
+                return cached
+
+        params = {"channel": channel_id, "ts": parent_ts}
+        async with self._async_semaphore:
+            for _ in range(self.max_retries + 1):
+                await self.rate_limiter.aacquire()
+                response = await self.async_client.get(
+                    REPLIES_URL, headers=self.headers, params=params
+                )
+                if response.status_code != 429:
+                    break
+                await asyncio.sleep(retry_after_seconds(response))
+
+        if self.cache is None:
+            return self._handle_response(response, channel_id, parent_ts)
+        return await asyncio.to_thread(
+            self._handle_response, response, channel_id, parent_ts
+        )
+
+    def _handle_response(self, response, channel_id: str, parent_ts: str) -> list[dict]:
+        messages = parse_replies_response(response)
+        if messages is None:
+            logger.warning(
+                f"Failed to fetch thread messages for channel: "
+                f"{channel_id} and ts: {parent_ts}"
+            )
+            return []
+
+        self._save_cached(channel_id, parent_ts, messages)
+        return messages
+
+    def _get_cached(self, channel_id: str, parent_ts: str) -> list[dict] | None:
+        if self.cache is None:
+            return None
+        return self.cache.get(SQLiteCache.make_key(channel_id, parent_ts))
+
+    def _save_cached(self, channel_id: str, parent_ts: str, messages: list[dict]):
+        if self.cache is None:
+            return
+
+        thread_closed = float(parent_ts) + THREAD_WINDOW_SECONDS < time.time()
+        self.cache.set(
+            SQLiteCache.make_key(channel_id, parent_ts),
+            messages,
+            ttl_seconds=None if thread_closed else self.active_thread_ttl_seconds,
+        )
+
+    async def aclose(self) -> None:
+        await self.async_client.aclose()
+        self.session.close()
+
+
+def parse_replies_response(response) -> list[dict] | None:
+    """
+    Extract messages from the conversations.replies response
+
+    :param response: requests or httpx response
+    :return: messages, None if Slack returned an error
+    """
+    if response.status_code == 200:
+        data = response.json()
+        if data.get("ok"):
+            return data.get("messages", [])
+        else:
+            logger.warning(f"Error: {data.get('error')}")
+    else:
+        logger.warning(f"HTTP Error: {response.status_code}")
+
+    return None
+
+
+def retry_after_seconds(response, default: float = 1.0) -> float:
+    """
+    Delay requested by a 429 response
+
+    :param response:
+    :param default:
+    :return:
+    """
+    try:
+        return float(response.headers.get("Retry-After", default))
+    except (TypeError, ValueError):
+        return default
+
+
+_default_client: SlackClient | None = None
+_default_client_lock = threading.Lock()
+
+
+def get_slack_client() -> SlackClient:
+    """
+    Process-wide Slack client with the shared on-disk thread cache.
+
+    :return:
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = SlackClient(
+                cache=SQLiteCache(SLACK_THREADS_CACHE_PATH),
+                requests_per_minute=config.slack_requests_per_minute,
+                max_concurrency=config.slack_max_concurrency,
+            )
+    return _default_client
+
+
+async def aclose_slack_client(client: SlackClient) -> None:
+    """
+    Close a Slack client. The process-wide one is forgotten together with its
+    thread cache, so the next ``get_slack_client`` call creates a new client
+    instead of returning the closed one.
+
+    :param client:
+    :return:
+    """
+    global _default_client
+    with _default_client_lock:
+        owned = client is _default_client
+        if owned:
+            _default_client = None
+
+    await client.aclose()
+    if owned:
+        client.cache.close()
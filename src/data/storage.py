@@ -0,0 +1,297 @@
+import json
+import os
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+PARQUET_COMPRESSION = "zstd"
+
+_decoder = json.JSONDecoder()
+
+
+def iter_jsonl(path: Path) -> Iterator[dict]:
+    """
+    Stream records from a JSON Lines file. A cut last line (killed writer) is
+    skipped.
+
+    :param path:
+    :return:
+    """
+    with Path(path).open(encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def iter_json_array(path: Path, chunk_size: int = 1 << 20) -> Iterator[dict]:
+    """
+    Stream the items of a top-level JSON array without loading the whole file.
+
+    The file is read in chunks and every item is parsed with ``raw_decode`` as
+    soon as it is complete, so memory is bounded by the largest item plus one
+    chunk.
+
+    :param path:
+    :param chunk_size: characters read at once
+    :return:
+    """
+    with Path(path).open(encoding="utf-8") as file:
+        buffer = ""
+        position = 0
+        started = False
+        exhausted = False
+
+        while True:
+            # skip whitespace and separators between items
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+
+            if position == len(buffer) and not exhausted:
+                chunk = file.read(chunk_size)
+                exhausted = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+
+            if not started:
+                if buffer[position : position + 1] != "[":
+                    raise ValueError(f"{path} is not a JSON array")
+                started = True
+                position += 1
+                continue
+
+            if position == len(buffer) or buffer[position] == "]":
+                return
+
+            try:
+                item, end = _decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if exhausted:
+                    raise
+                chunk = file.read(chunk_size)
+                exhausted = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+
+            yield item
+            position = end
+
+
+def read_records(path: Path) -> Iterator[dict]:
+    """
+    Stream records from a ``.jsonl`` file or a ``.json`` array.
+
+    :param path:
+    :return:
+    """
+    path = Path(path)
+    if path.suffix == ".jsonl":
+        return iter_jsonl(path)
+
+    return iter_json_array(path)
+
+
+def write_json_array(path: Path, records: Iterable[dict], indent: int = 4) -> int:
+    """
+    Write records as a JSON array one item at a time. The file is written next
+    to the target and renamed at the end, so readers never see a partial array.
+
+    :param path:
+    :param records:
+    :param indent:
+    :return: number of records written
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+
+    count = 0
+    with tmp_path.open("w", encoding="utf-8") as file:
+        file.write("[")
+        for record in records:
+            item = json.dumps(record, indent=indent, ensure_ascii=False)
+            file.write(("," if count else "") + "\n" + item)
+            count += 1
+        file.write("\n]" if count else "]")
+
+    os.replace(tmp_path, path)
+    return count
+
+
+def append_jsonl(path: Path, records: Iterable[dict]) -> int:
+    """
+    Append records to a JSON Lines file, flushing after every record.
+
+    :param path:
+    :param records:
+    :return: number of records written
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    count = 0
+    with path.open("a", encoding="utf-8") as file:
+        for record in records:
+            file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            file.flush()
+            count += 1
+
+    return count
+
+
+def latest_by_key(records: Iterable[dict], key: str = "key") -> list[dict]:
+    """
+    Keep the last version of every record of an append-only log, in order of
+    first appearance.
+
+    :param records:
+    :param key:
+    :return:
+    """
+    latest = {}
+    for record in records:
+        latest[record[key]] = record
+
+    return list(latest.values())
+
+
+def iter_latest_by_key(path: Path, key: str = "key") -> Iterator[dict]:
+    """
+    Streaming version of ``latest_by_key`` for a file.
+
+    The first pass remembers only the position of the last version of every key,
+    the second pass yields those records in the order of their last version.
+    Memory grows with the number of keys, not with the size of the records.
+
+    :param path:
+    :param key:
+    :return:
+    """
+    last_position = {}
+    for position, record in enumerate(read_records(path)):
+        last_position[record[key]] = position
+
+    for position, record in enumerate(read_records(path)):
+        if last_position.get(record[key]) == position:
+            yield record
+
+
+def iter_dataset(
+    path: Path, columns: list[str] | None = None, batch_size: int = 10_000
+) -> Iterator[dict]:
+    """
+    Stream the rows of a dataset. The format is chosen by the suffix:
+    ``.parquet`` (only the requested columns are read from disk), ``.jsonl`` or
+    a ``.json`` array.
+
+    :param path:
+    :param columns: keep only these fields, all if None
+    :param batch_size: rows decoded at once from a Parquet file
+    :return:
+    """
+    path = Path(path)
+    if path.suffix == ".parquet":
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size, columns=columns):
+            yield from batch.to_pylist()
+        return
+
+    for record in read_records(path):
+        yield record if columns is None else {c: record.get(c) for c in columns}
+
+
+def read_dataset(path: Path, columns: list[str] | None = None) -> list[dict]:
+    """
+    Read a whole dataset, see ``iter_dataset``.
+
+    :param path:
+    :param columns:
+    :return:
+    """
+    path = Path(path)
+    if path.suffix == ".parquet":
+        return pq.read_table(path, columns=columns).to_pylist()
+
+    return list(iter_dataset(path, columns))
+
+
+def read_dataframe(path: Path, columns: list[str] | None = None) -> pd.DataFrame:
+    """
+    Read a dataset into a DataFrame, see ``iter_dataset``.
+
+    :param path:
+    :param columns:
+    :return:
+    """
+    path = Path(path)
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path, columns=columns)
+
+    return pd.DataFrame(read_dataset(path, columns), columns=columns)
+
+
+def write_dataset(
+    path: Path,
+    records: Iterable[dict],
+    schema: pa.Schema | None = None,
+    batch_size: int = 10_000,
+) -> int:
+    """
+    Write a dataset. The format is chosen by the suffix: ``.parquet`` (typed by
+    ``schema``, zstd-compressed, written in row groups of ``batch_size``),
+    ``.jsonl`` or a ``.json`` array for debugging.
+
+    Fields that are not in the schema are dropped, missing ones are null.
+
+    :param path:
+    :param records:
+    :param schema: Arrow schema of the Parquet file, inferred if None
+    :param batch_size:
+    :return: number of records written
+    """
+    path = Path(path)
+    if path.suffix == ".jsonl":
+        path.unlink(missing_ok=True)
+        return append_jsonl(path, records)
+    if path.suffix != ".parquet":
+        return write_json_array(path, records)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    records = iter(records)
+
+    count = 0
+    writer = None
+    try:
+        while batch := list(islice(records, batch_size)):
+            table = pa.Table.from_pylist(batch, schema=schema)
+            if writer is None:
+                writer = pq.ParquetWriter(
+                    tmp_path, table.schema, compression=PARQUET_COMPRESSION
+                )
+            writer.write_table(table)
+            count += len(batch)
+
+        if writer is None:
+            # no records, still write the file with the schema
+            pq.write_table(
+                (schema or pa.schema([])).empty_table(),
+                tmp_path,
+                compression=PARQUET_COMPRESSION,
+            )
+    finally:
+        if writer is not None:
+            writer.close()
+
+    os.replace(tmp_path, path)
+    return count
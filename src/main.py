@@ -1,10 +1,57 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from src.api.api import router as api_router
+from loguru import logger
+from src.api.api import router as api_router, health_router, metrics_router
+from src.api.metrics import configure_logging, trace_requests
+from src.api.registry import ModelRegistry
+from src.config import BaseConfig
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
+config = BaseConfig()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Load models once per worker and keep watching for a new model file.
+    Loading runs in the background, so /health/live answers right away and
+    /health/ready reports when the worker can serve estimates.
+    """
+    configure_logging()
+    registry = ModelRegistry()
+    app.state.registry = registry
+
+    loader = asyncio.create_task(asyncio.to_thread(registry.load))
+    loader.add_done_callback(log_load_failure)
+    watcher = asyncio.create_task(registry.watch(config.model_reload_interval_seconds))
+    yield
+
+    watcher.cancel()
+    loader.cancel()
+    await registry.aclose()
+
+
+def log_load_failure(loader: asyncio.Task) -> None:
+    """
+    Log why the first load failed, the registry watcher retries it.
+
+    :param loader:
+    :return:
+    """
+    if not loader.cancelled() and loader.exception() is not None:
+        logger.opt(exception=loader.exception()).error(
+            "Failed to load models, the worker is not ready"
+        )
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(api_router)
+app.include_router(health_router)
+app.include_router(metrics_router)
+app.middleware("http")(trace_requests)
 
 origins = [
     "http://localhost",  # Allow requests from localhost
@@ -0,0 +1,222 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+from loguru import logger
+from typer import Typer
+
+from src.config import BaseConfig
+from src.data.storage import read_dataframe
+
+try:  # optional approximate nearest neighbour backend
+    import faiss
+except ImportError:  # pragma: no cover - depends on environment
+    faiss = None
+
+app = Typer(pretty_exceptions_enable=False)
+
+config = BaseConfig()
+
+INDEX_FORMAT_VERSION = 1
+DEFAULT_BI_ENCODER = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+class TaskEmbeddingIndex:
+    """
+    Matrix of L2-normalized task embeddings with a vectorized top-N search.
+
+    The matrix is stored as a plain ``.npy`` file next to a ``.meta.json`` file,
+    so it can be memory-mapped and shared between worker processes.
+    The cosine similarity of normalized vectors is a single matrix product.
+    """
+
+    def __init__(self, embeddings: np.ndarray, meta: dict, use_ann: bool = False):
+        self.embeddings = embeddings
+        self.meta = meta
+        self.ann_index = None
+
+        if use_ann:
+            if faiss is None:
+                logger.warning("faiss is not installed, falling back to exact search")
+            else:
+                self.ann_index = faiss.IndexHNSWFlat(
+                    embeddings.shape[1], 32, faiss.METRIC_INNER_PRODUCT
+                )
+                self.ann_index.add(np.ascontiguousarray(embeddings, dtype=np.float32))
+
+    def __len__(self) -> int:
+        return self.embeddings.shape[0]
+
+    @property
+    def fingerprint(self) -> str | None:
+        return self.meta.get("fingerprint")
+
+    @property
+    def model_name(self) -> str | None:
+        return self.meta.get("model_name")
+
+    def search(
+        self, query_embeddings: np.ndarray, top_n: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find the most similar tasks for every query.
+
+        :param query_embeddings: (n_queries, dim) normalized embeddings
+        :param top_n: number of candidates per query
+        :return: indices and scores, both (n_queries, top_n), best first
+        """
+        query_embeddings = np.atleast_2d(query_embeddings).astype(np.float32)
+        top_n = min(top_n, len(self))
+        if top_n == 0:
+            empty = np.empty((query_embeddings.shape[0], 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+
+        if self.ann_index is not None:
+            scores, indices = self.ann_index.search(query_embeddings, top_n)
+            return indices.astype(np.int64), scores
+
+        scores = query_embeddings @ self.embeddings.T
+        if top_n < len(self):
+            candidates = np.argpartition(-scores, top_n - 1, axis=1)[:, :top_n]
+        else:
+            candidates = np.broadcast_to(np.arange(len(self)), scores.shape)
+        candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+
+        order = np.argsort(-candidate_scores, axis=1)
+        indices = np.take_along_axis(candidates, order, axis=1)
+        return indices.astype(np.int64), np.take_along_axis(
+            candidate_scores, order, axis=1
+        )
+
+    def save(self, path: Path) -> None:
+        """
+        Save the embeddings matrix and its metadata.
+
+        :param path: path to the ``.npy`` file
+        :return:
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.save(path, np.asarray(self.embeddings, dtype=np.float32))
+        meta_path(path).write_text(json.dumps(self.meta, indent=4))
+        logger.info(f"Saved embedding index of {len(self)} tasks to {path}")
+
+    @classmethod
+    def load(
+        cls, path: Path, mmap: bool = True, use_ann: bool = False
+    ) -> "TaskEmbeddingIndex":
+        """
+        Load an index saved with ``save``.
+
+        :param path: path to the ``.npy`` file
+        :param mmap: memory-map the matrix instead of reading it into memory
+        :param use_ann: build an approximate (HNSW) index on top of the matrix
+        :return:
+        """
+        path = Path(path)
+        meta = json.loads(meta_path(path).read_text())
+        if meta.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported index version {meta.get('version')} in {path}"
+            )
+
+        embeddings = np.load(path, mmap_mode="r" if mmap else None)
+        return cls(embeddings, meta, use_ann=use_ann)
+
+    @classmethod
+    def build(
+        cls,
+        texts: list[str],
+        encoder,
+        model_name: str,
+        batch_size: int = 64,
+    ) -> "TaskEmbeddingIndex":
+        """
+        Encode the texts with a sentence-transformers bi-encoder.
+
+        :param texts:
+        :param encoder: ``SentenceTransformer`` instance
+        :param model_name: name of the encoder, stored in the metadata
+        :param batch_size:
+        :return:
+        """
+        embeddings = encode(encoder, texts, batch_size=batch_size)
+        meta = {
+            "version": INDEX_FORMAT_VERSION,
+            "model_name": model_name,
+            "n_rows": len(texts),
+            "dim": int(embeddings.shape[1]),
+            "fingerprint": texts_fingerprint(texts),
+        }
+        return cls(embeddings, meta)
+
+
+def encode(encoder, texts: list[str], batch_size: int = 64) -> np.ndarray:
+    """
+    Encode texts into L2-normalized float32 embeddings.
+
+    :param encoder: ``SentenceTransformer`` instance
+    :param texts:
+    :param batch_size:
+    :return: (len(texts), dim) array
+    """
+    embeddings = encoder.encode(
+        texts,
+        batch_size=batch_size,
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+        show_progress_bar=False,
+    )
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def texts_fingerprint(texts: Iterable[str]) -> str:
+    """
+    Hash of the corpus in its row order. The index is valid only for the data
+    it was built from.
+
+    :param texts:
+    :return:
+    """
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update((text or "").encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+def meta_path(path: Path) -> Path:
+    return Path(path).with_suffix(".meta.json")
+
+
+@app.command()
+def main(
+    input_path: Path = config.processed_data_dir / "final_data_to_train.parquet",
+    output_path: Path = config.processed_data_dir / "task_embeddings.npy",
+    model_name: str = DEFAULT_BI_ENCODER,
+    batch_size: int = 64,
+):
+    """
+    Build the bi-encoder embedding index for the Ranker.
+
+    :param input_path:
+    :param output_path:
+    :param model_name:
+    :param batch_size:
+    :return:
+    """
+    from sentence_transformers import SentenceTransformer
+
+    data = read_dataframe(input_path, columns=["task_text"])
+    texts = data["task_text"].fillna("").tolist()
+    logger.info(f"Encoding {len(texts)} tasks with {model_name}")
+
+    encoder = SentenceTransformer(model_name)
+    index = TaskEmbeddingIndex.build(texts, encoder, model_name, batch_size)
+    index.save(output_path)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,360 @@
+from dataclasses import asdict, dataclass
+
+import numpy as np
+
+# buckets of the actual duration in hours: <2, 2-4, 4-8, 8-16, >=16
+DEFAULT_BUCKET_EDGES = (2, 4, 8, 16)
+
+
+@dataclass
+class MetricEstimate:
+    value: float
+    lower: float | None = None
+    upper: float | None = None
+    count: int = 0
+
+
+def weighted_errors(y_true, y_pred, alpha: float = 2) -> np.ndarray:
+    """
+    Absolute errors with underestimation weighted by ``alpha``, the numerator
+    of ``weighted_accuracy``.
+
+    :param y_true:
+    :param y_pred:
+    :param alpha:
+    :return:
+    """
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    return np.where(y_pred < y_true, alpha, 1) * np.abs(y_pred - y_true)
+
+
+def ratio_accuracy(errors_sum, true_sum):
+    """
+    ``1 - sum(weighted errors) / sum(actual)``, NaN where nothing was done.
+
+    :param errors_sum: scalar or array
+    :param true_sum: scalar or array of the same shape
+    :return:
+    """
+    errors_sum = np.asarray(errors_sum, dtype=np.float64)
+    true_sum = np.asarray(true_sum, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(true_sum > 0, 1 - errors_sum / true_sum, np.nan)
+
+
+def hour_buckets(y_true, edges=DEFAULT_BUCKET_EDGES) -> np.ndarray:
+    """
+    Label of the duration bucket of every task, e.g. ``"2-4"``.
+
+    :param y_true: actual durations in hours
+    :param edges: increasing bucket edges
+    :return:
+    """
+    labels = np.array(bucket_labels(edges))
+    return labels[np.digitize(np.asarray(y_true, dtype=np.float64), edges)]
+
+
+def bucket_labels(edges=DEFAULT_BUCKET_EDGES) -> list[str]:
+    return (
+        [f"<{edges[0]}"]
+        + [f"{lo}-{hi}" for lo, hi in zip(edges[:-1], edges[1:])]
+        + [f">={edges[-1]}"]
+    )
+
+
+def grouped_weighted_accuracy(y_true, y_pred, groups, alpha: float = 2) -> dict:
+    """
+    Weighted accuracy of every group with two ``bincount`` calls.
+
+    :param y_true:
+    :param y_pred:
+    :param groups: group label of every task
+    :param alpha:
+    :return: group -> ``MetricEstimate`` without a confidence interval
+    """
+    labels, inverse = np.unique(np.asarray(groups), return_inverse=True)
+    errors_sum = np.bincount(inverse, weights=weighted_errors(y_true, y_pred, alpha))
+    true_sum = np.bincount(inverse, weights=np.asarray(y_true, dtype=np.float64))
+    counts = np.bincount(inverse)
+    accuracy = ratio_accuracy(errors_sum, true_sum)
+
+    return {
+        label.item(): MetricEstimate(value=float(value), count=int(count))
+        for label, value, count in zip(labels, accuracy, counts)
+    }
+
+
+def bootstrap_weighted_accuracy(
+    y_true,
+    y_pred,
+    alpha: float = 2,
+    n_resamples: int = 1000,
+    confidence: float = 0.95,
+    max_batch_elements: int = 10_000_000,
+    random_state: int | None = 42,
+) -> MetricEstimate:
+    """
+    Weighted accuracy with a percentile bootstrap confidence interval.
+
+    The resamples are drawn as index matrices, so a batch of them is one
+    gather and one ``sum`` over the rows. Batches are limited to
+    ``max_batch_elements`` indices to bound the memory.
+
+    :param y_true:
+    :param y_pred:
+    :param alpha:
+    :param n_resamples:
+    :param confidence:
+    :param max_batch_elements:
+    :param random_state:
+    :return:
+    """
+    y_true = np.asarray(y_true, dtype=np.float64)
+    errors = weighted_errors(y_true, y_pred, alpha)
+    n = len(y_true)
+    value = float(ratio_accuracy(errors.sum(), y_true.sum()))
+    if n == 0:
+        return MetricEstimate(value=value, count=0)
+
+    rng = np.random.default_rng(random_state)
+    batch_size = max(1, max_batch_elements // n)
+    replicates = []
+    for start in range(0, n_resamples, batch_size):
+        size = min(batch_size, n_resamples - start)
+        indices = rng.integers(0, n, size=(size, n))
+        replicates.append(
+            ratio_accuracy(errors[indices].sum(axis=1), y_true[indices].sum(axis=1))
+        )
+
+    lower, upper = confidence_interval(np.concatenate(replicates), confidence)
+    return MetricEstimate(value=value, lower=lower, upper=upper, count=n)
+
+
+def confidence_interval(replicates: np.ndarray, confidence: float = 0.95):
+    replicates = replicates[np.isfinite(replicates)]
+    if not len(replicates):
+        return None, None
+
+    tail = (1 - confidence) / 2 * 100
+    lower, upper = np.percentile(replicates, [tail, 100 - tail])
+    return float(lower), float(upper)
+
+
+def evaluate(
+    y_true,
+    y_pred,
+    levels=None,
+    alpha: float = 2,
+    bucket_edges=DEFAULT_BUCKET_EDGES,
+    n_resamples: int = 1000,
+    confidence: float = 0.95,
+    random_state: int | None = 42,
+) -> dict:
+    """
+    Weighted accuracy overall with a bootstrap interval and broken down by
+    the duration bucket and by the assignee level.
+
+    :param y_true: actual durations in hours
+    :param y_pred:
+    :param levels: ``assignee_level_order`` of every task, optional
+    :param alpha:
+    :param bucket_edges:
+    :param n_resamples:
+    :param confidence:
+    :param random_state:
+    :return: JSON-serializable report
+    """
+    overall = bootstrap_weighted_accuracy(
+        y_true,
+        y_pred,
+        alpha=alpha,
+        n_resamples=n_resamples,
+        confidence=confidence,
+        random_state=random_state,
+    )
+    report = {
+        "weighted_accuracy": asdict(overall),
+        "by_bucket": grouped_report(
+            y_true, y_pred, hour_buckets(y_true, bucket_edges), alpha
+        ),
+    }
+    if levels is not None:
+        report["by_level"] = grouped_report(y_true, y_pred, level_groups(levels), alpha)
+
+    return report
+
+
+def level_groups(levels) -> np.ndarray:
+    """
+    Assignee levels as strings, ``"-1"`` for unknown ones.
+
+    :param levels: ``assignee_level_order`` values, may contain None or NaN
+    :return:
+    """
+    levels = np.atleast_1d(np.asarray(levels, dtype=np.float64))
+    return np.where(np.isnan(levels), -1, levels).astype(np.int64).astype(str)
+
+
+def grouped_report(y_true, y_pred, groups, alpha: float = 2) -> dict:
+    return {
+        str(group): asdict(estimate)
+        for group, estimate in grouped_weighted_accuracy(
+            y_true, y_pred, groups, alpha
+        ).items()
+    }
+
+
+class OnlineWeightedAccuracy:
+    """
+    Weighted accuracy of production predictions, updated as the actual
+    durations arrive.
+
+    Only the sums of the weighted errors and of the actual durations are kept,
+    overall, per duration bucket and per assignee level, so an update costs
+    the same however long the history is. The confidence interval comes from
+    a Poisson bootstrap: every observation enters each of the
+    ``n_replicates`` replicate sums with a ``Poisson(1)`` weight, which
+    approximates resampling without storing the observations.
+
+        accumulator = OnlineWeightedAccuracy()
+        accumulator.update(actual_hours, predicted_hours, levels)
+        accumulator.report()
+    """
+
+    def __init__(
+        self,
+        alpha: float = 2,
+        bucket_edges=DEFAULT_BUCKET_EDGES,
+        n_replicates: int = 200,
+        confidence: float = 0.95,
+        random_state: int | None = None,
+    ):
+        self.alpha = alpha
+        self.bucket_edges = tuple(bucket_edges)
+        self.n_replicates = n_replicates
+        self.confidence = confidence
+        self.rng = np.random.default_rng(random_state)
+
+        self.count = 0
+        self.errors_sum = 0.0
+        self.true_sum = 0.0
+        self.replicate_errors = np.zeros(n_replicates)
+        self.replicate_true = np.zeros(n_replicates)
+        # group -> [count, errors_sum, true_sum]
+        self.by_bucket: dict[str, list] = {}
+        self.by_level: dict[str, list] = {}
+
+    def update(self, y_true, y_pred, levels=None) -> None:
+        """
+        Add a batch of finished tasks.
+
+        :param y_true: actual durations in hours
+        :param y_pred: predictions made for these tasks
+        :param levels: ``assignee_level_order`` of the tasks, optional
+        :return:
+        """
+        y_true = np.atleast_1d(np.asarray(y_true, dtype=np.float64))
+        errors = weighted_errors(y_true, np.atleast_1d(y_pred), self.alpha)
+        if not len(y_true):
+            return
+
+        self.count += len(y_true)
+        self.errors_sum += float(errors.sum())
+        self.true_sum += float(y_true.sum())
+
+        weights = self.rng.poisson(1.0, size=(self.n_replicates, len(y_true)))
+        self.replicate_errors += weights @ errors
+        self.replicate_true += weights @ y_true
+
+        self._update_groups(
+            self.by_bucket, hour_buckets(y_true, self.bucket_edges), errors, y_true
+        )
+        if levels is not None:
+            self._update_groups(self.by_level, level_groups(levels), errors, y_true)
+
+    @staticmethod
+    def _update_groups(
+        sums: dict, groups: np.ndarray, errors: np.ndarray, y_true: np.ndarray
+    ) -> None:
+        labels, inverse = np.unique(groups, return_inverse=True)
+        counts = np.bincount(inverse)
+        errors_sum = np.bincount(inverse, weights=errors)
+        true_sum = np.bincount(inverse, weights=y_true)
+        for i, label in enumerate(labels.tolist()):
+            group = sums.setdefault(label, [0, 0.0, 0.0])
+            group[0] += int(counts[i])
+            group[1] += float(errors_sum[i])
+            group[2] += float(true_sum[i])
+
+    def report(self) -> dict:
+        """
+        Current metrics in the format of ``evaluate``.
+
+        :return:
+        """
+        lower, upper = confidence_interval(
+            ratio_accuracy(self.replicate_errors, self.replicate_true),
+            self.confidence,
+        )
+        overall = MetricEstimate(
+            value=float(ratio_accuracy(self.errors_sum, self.true_sum)),
+            lower=lower,
+            upper=upper,
+            count=self.count,
+        )
+        return {
+            "weighted_accuracy": asdict(overall),
+            "by_bucket": self._groups_report(self.by_bucket),
+            "by_level": self._groups_report(self.by_level),
+        }
+
+    @staticmethod
+    def _groups_report(sums: dict) -> dict:
+        return {
+            group: asdict(
+                MetricEstimate(
+                    value=float(ratio_accuracy(errors_sum, true_sum)), count=count
+                )
+            )
+            for group, (count, errors_sum, true_sum) in sorted(sums.items())
+        }
+
+    def to_dict(self) -> dict:
+        """
+        State of the accumulator, to be saved between runs.
+
+        :return:
+        """
+        return {
+            "alpha": self.alpha,
+            "bucket_edges": list(self.bucket_edges),
+            "confidence": self.confidence,
+            "count": self.count,
+            "errors_sum": self.errors_sum,
+            "true_sum": self.true_sum,
+            "replicate_errors": self.replicate_errors.tolist(),
+            "replicate_true": self.replicate_true.tolist(),
+            "by_bucket": self.by_bucket,
+            "by_level": self.by_level,
+        }
+
+    @classmethod
+    def from_dict(
+        cls, state: dict, random_state: int | None = None
+    ) -> "OnlineWeightedAccuracy":
+        accumulator = cls(
+            alpha=state["alpha"],
+            bucket_edges=state["bucket_edges"],
+            n_replicates=len(state["replicate_errors"]),
+            confidence=state["confidence"],
+            random_state=random_state,
+        )
+        accumulator.count = state["count"]
+        accumulator.errors_sum = state["errors_sum"]
+        accumulator.true_sum = state["true_sum"]
+        accumulator.replicate_errors = np.asarray(state["replicate_errors"])
+        accumulator.replicate_true = np.asarray(state["replicate_true"])
+        accumulator.by_bucket = {k: list(v) for k, v in state["by_bucket"].items()}
+        accumulator.by_level = {k: list(v) for k, v in state["by_level"].items()}
+        return accumulator
@@ -0,0 +1,238 @@
+from functools import partial
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+from tqdm import tqdm
+from typer import Typer
+
+from src.config import BaseConfig
+from src.data.datasets import previous_tasks_schema
+from src.data.storage import read_dataframe, write_dataset
+from src.modeling.embedding_index import (
+    DEFAULT_BI_ENCODER,
+    TaskEmbeddingIndex,
+    encode,
+    texts_fingerprint,
+)
+
+app = Typer(pretty_exceptions_enable=False)
+
+config = BaseConfig()
+
+
+@app.command()
+def main(
+    input_path: Path = config.processed_data_dir / "final_data_to_train.parquet",
+    output_path: Path = config.processed_data_dir
+    / "final_data_to_train_w_relevant_previous_tasks.parquet",
+    index_path: Path = config.processed_data_dir / "task_embeddings.npy",
+    bi_encoder_name: str = DEFAULT_BI_ENCODER,
+    cross_encoder_name: str = "",
+    top_k: int = 5,
+    window: int = 100,
+    n_candidates: int = 20,
+    min_history: int = 15,
+    batch_size: int = 256,
+):
+    """
+    Features from the most similar earlier tasks: their keys, scores and hours.
+
+    :param input_path:
+    :param output_path:
+    :param index_path: prebuilt embeddings of the final data, reused if fresh
+    :param bi_encoder_name:
+    :param cross_encoder_name: re-score the candidates with this cross-encoder,
+        bi-encoder scores only if empty
+    :param top_k: similar tasks per task
+    :param window: only the last ``window`` earlier tasks are searched
+    :param n_candidates: candidates re-scored by the cross-encoder
+    :param min_history: tasks with fewer earlier tasks get no features
+    :param batch_size: tasks scored at once
+    :return:
+    """
+    data = read_dataframe(input_path)
+    texts = data["task_text"].fillna("").tolist()
+    embeddings = load_embeddings(texts, index_path, bi_encoder_name)
+
+    scorer = None
+    if cross_encoder_name:
+        from sentence_transformers.cross_encoder import CrossEncoder
+
+        model = CrossEncoder(cross_encoder_name)
+        scorer = partial(model.predict, show_progress_bar=False)
+
+    features = build_previous_task_features(
+        data,
+        embeddings,
+        top_k=top_k,
+        window=window,
+        n_candidates=n_candidates,
+        min_history=min_history,
+        batch_size=batch_size,
+        scorer=scorer,
+    )
+
+    count = write_dataset(
+        output_path, features.to_dict(orient="records"), previous_tasks_schema(top_k)
+    )
+    logger.info(f"Saved previous tasks features of {count} tasks to {output_path}")
+
+
+def load_embeddings(texts: list[str], index_path: Path, model_name: str) -> np.ndarray:
+    """
+    Embeddings of the texts from the prebuilt index if it was built from the
+    same texts with the same model, encoded otherwise.
+
+    :param texts:
+    :param index_path:
+    :param model_name:
+    :return:
+    """
+    if Path(index_path).exists():
+        index = TaskEmbeddingIndex.load(index_path, mmap=False)
+        if (
+            index.fingerprint == texts_fingerprint(texts)
+            and index.model_name == model_name
+        ):
+            return index.embeddings
+        logger.warning(f"Embedding index {index_path} is stale, encoding")
+
+    from sentence_transformers import SentenceTransformer
+
+    return encode(SentenceTransformer(model_name), texts)
+
+
+def time_order(data: pd.DataFrame) -> np.ndarray:
+    """
+    Row positions from the earliest task to the latest: by ``jira_created`` if
+    known, then by the number of the Jira key.
+
+    :param data:
+    :return:
+    """
+    key_number = pd.to_numeric(
+        data["jira_key"].str.rsplit("-", n=1).str[-1], errors="coerce"
+    )
+    columns = {"key_number": key_number.to_numpy()}
+    if "jira_created" in data:
+        columns = {
+            "created": pd.to_datetime(data["jira_created"], utc=True).to_numpy(),
+            **columns,
+        }
+
+    return pd.DataFrame(columns).sort_values(list(columns), kind="stable").index.values
+
+
+def build_previous_task_features(
+    data: pd.DataFrame,
+    embeddings: np.ndarray,
+    top_k: int = 5,
+    window: int = 100,
+    n_candidates: int = 20,
+    min_history: int = 15,
+    batch_size: int = 256,
+    scorer: Callable[[list[list[str]]], np.ndarray] | None = None,
+) -> pd.DataFrame:
+    """
+    For every task find the ``top_k`` most similar tasks among the ``window``
+    tasks created right before it. Only earlier tasks are searched, so the
+    features do not leak the future.
+
+    Tasks are processed in batches: the similarities of a batch to its sliding
+    window are one matrix product, the ``n_candidates`` best are selected with
+    ``argpartition`` and, if ``scorer`` is given, re-scored with one call for
+    the whole batch.
+
+    :param data: final data with ``jira_key``, ``task_text`` and
+        ``time_to_complete_hours``
+    :param embeddings: L2-normalized embeddings of ``data`` rows
+    :param top_k:
+    :param window:
+    :param n_candidates: candidates per task, at least ``top_k``
+    :param min_history: tasks with fewer earlier tasks get no features
+    :param batch_size:
+    :param scorer: (query, candidate) text pairs -> scores, e.g.
+        ``CrossEncoder.predict``
+    :return: one row per task in ``data`` order
+    """
+    order = time_order(data)
+    vectors = np.asarray(embeddings, dtype=np.float32)[order]
+    keys = data["jira_key"].to_numpy()[order]
+    texts = data["task_text"].fillna("").to_numpy()[order]
+    hours = data["time_to_complete_hours"].to_numpy()[order]
+    n_candidates = max(n_candidates, top_k)
+
+    n = len(order)
+    result_keys = [None] * n
+    result_scores = [None] * n
+    result_hours = [None] * n
+
+    for start in tqdm(range(min_history, n, batch_size)):
+        end = min(start + batch_size, n)
+        lo = max(0, start - window)
+        rows = np.arange(start, end)
+
+        # (batch, start - lo + batch) similarities to the sliding window
+        scores = vectors[start:end] @ vectors[lo:end].T
+        columns = np.arange(lo, end)
+        visible = (columns[None, :] < rows[:, None]) & (
+            columns[None, :] >= rows[:, None] - window
+        )
+        scores = np.where(visible, scores, -np.inf)
+
+        k = min(n_candidates, scores.shape[1])
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+        candidates = candidates + lo
+
+        if scorer is not None:
+            valid = np.isfinite(candidate_scores)
+            pairs = [
+                [texts[row], texts[candidate]]
+                for row, row_candidates, row_valid in zip(rows, candidates, valid)
+                for candidate, ok in zip(row_candidates, row_valid)
+                if ok
+            ]
+            rescored = np.full(candidate_scores.shape, -np.inf, dtype=np.float32)
+            if pairs:
+                rescored[valid] = np.asarray(scorer(pairs), dtype=np.float32)
+            candidate_scores = rescored
+
+        best = np.argsort(-candidate_scores, axis=1)[:, :top_k]
+        best_candidates = np.take_along_axis(candidates, best, axis=1)
+        best_scores = np.take_along_axis(candidate_scores, best, axis=1)
+
+        for i, row in enumerate(rows):
+            ok = np.isfinite(best_scores[i])
+            result_keys[row] = keys[best_candidates[i][ok]].tolist()
+            result_scores[row] = best_scores[i][ok].astype(float).tolist()
+            result_hours[row] = hours[best_candidates[i][ok]].tolist()
+
+    features = pd.DataFrame(
+        {
+            "jira_key": keys,
+            "prev_task_keys": result_keys,
+            "prev_task_scores": result_scores,
+            "prev_task_hours": result_hours,
+        }
+    )
+    for j in range(top_k):
+        # nullable integers, plain int columns with None become float NaN
+        features[f"prev_task_eta_{j}"] = pd.array(
+            [
+                task_hours[j] if task_hours and j < len(task_hours) else None
+                for task_hours in result_hours
+            ],
+            dtype="Int64",
+        )
+
+    # back to the input order
+    features.index = order
+    return features.sort_index().reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    app()
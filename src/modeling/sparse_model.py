@@ -0,0 +1,220 @@
+import hashlib
+import json
+import re
+from pathlib import Path
+
+import joblib
+import numpy as np
+from loguru import logger
+from typer import Typer
+
+from src.config import BaseConfig
+from src.modeling.embedding_index import meta_path
+
+app = Typer(pretty_exceptions_enable=False)
+
+config = BaseConfig()
+
+SPARSE_FORMAT_VERSION = 1
+SPARSE_MODEL_FILE = "regression_model.npy"
+# 12 bytes per feature: sorted term hashes next to their coefficients
+FEATURE_DTYPE = np.dtype([("hash", "<u8"), ("coef", "<f4")])
+
+
+def hash_terms(terms: list[str]) -> np.ndarray:
+    """
+    64-bit blake2b hashes of the terms. Unlike ``hash()`` they are stable
+    across processes and Python versions.
+
+    :param terms:
+    :return: uint64 array
+    """
+    digests = b"".join(
+        hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest() for term in terms
+    )
+    return np.frombuffer(digests, dtype="<u8")
+
+
+class SparseTextRegression:
+    """
+    Serve-time replacement of the ``CountVectorizer`` + ``LinearRegression``
+    pipeline that does not need sklearn.
+
+    The vocabulary is stored as sorted term hashes next to float32
+    coefficients in one ``.npy`` file and the intercept and tokenizer settings
+    in a ``.meta.json`` file. The array is memory-mapped, so loading is
+    instant and all uvicorn workers share its pages. Terms with a zero
+    coefficient are pruned. A prediction is a regex tokenization, a
+    ``searchsorted`` of the bigram hashes and a sum of the found coefficients.
+    """
+
+    def __init__(self, features: np.ndarray, meta: dict):
+        self.features = features
+        self.meta = meta
+        self.intercept = float(meta["intercept"])
+        self.lowercase = bool(meta["lowercase"])
+        self.ngram_range = tuple(meta["ngram_range"])
+        self.token_pattern = re.compile(meta["token_pattern"])
+
+    def __len__(self) -> int:
+        return self.features.shape[0]
+
+    @classmethod
+    def from_pipeline(cls, pipeline, prune_below: float = 0.0):
+        """
+        Convert a fitted ``Pipeline([CountVectorizer, LinearRegression])``.
+
+        :param pipeline:
+        :param prune_below: drop terms with ``|coef| <= prune_below``, the
+            predictions match the pipeline only with the default
+        :return:
+        """
+        vectorizer, regression = pipeline[0], pipeline[-1]
+        unsupported = {
+            "analyzer": vectorizer.analyzer != "word",
+            "tokenizer": vectorizer.tokenizer is not None,
+            "preprocessor": vectorizer.preprocessor is not None,
+            "strip_accents": vectorizer.strip_accents is not None,
+            "stop_words": vectorizer.stop_words is not None,
+            "binary": vectorizer.binary,
+        }
+        if any(unsupported.values()):
+            names = [name for name, value in unsupported.items() if value]
+            raise ValueError(f"Unsupported CountVectorizer settings: {names}")
+
+        terms = vectorizer.get_feature_names_out()
+        coef = np.asarray(regression.coef_, dtype=np.float64).ravel()
+        keep = np.abs(coef) > prune_below
+
+        features = np.empty(int(keep.sum()), dtype=FEATURE_DTYPE)
+        features["hash"] = hash_terms(terms[keep].tolist())
+        features["coef"] = coef[keep]
+        features.sort(order="hash")
+        if np.any(features["hash"][1:] == features["hash"][:-1]):
+            raise ValueError("Term hash collision, the vocabulary cannot be hashed")
+
+        meta = {
+            "version": SPARSE_FORMAT_VERSION,
+            "intercept": float(regression.intercept_),
+            "lowercase": bool(vectorizer.lowercase),
+            "token_pattern": vectorizer.token_pattern,
+            "ngram_range": list(vectorizer.ngram_range),
+            "n_features": len(features),
+            "n_pruned": int((~keep).sum()),
+        }
+        return cls(features, meta)
+
+    def save(self, path: Path) -> None:
+        """
+        Save the features and their metadata. The metadata goes first, so a
+        watcher of the ``.npy`` file never sees a new array with an old intercept.
+
+        :param path: path to the ``.npy`` file
+        :return:
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta_path(path).write_text(json.dumps(self.meta, indent=4))
+        np.save(path, self.features)
+        logger.info(f"Saved sparse model with {len(self)} features to {path}")
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "SparseTextRegression":
+        """
+        Load a model saved with ``save``.
+
+        :param path: path to the ``.npy`` file
+        :param mmap: memory-map the features instead of reading them
+        :return:
+        """
+        path = Path(path)
+        meta = json.loads(meta_path(path).read_text())
+        if meta.get("version") != SPARSE_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported sparse model version {meta.get('version')} in {path}"
+            )
+
+        features = np.load(path, mmap_mode="r" if mmap else None)
+        if features.dtype != FEATURE_DTYPE:
+            raise ValueError(
+                f"Unexpected sparse model dtype {features.dtype} in {path}"
+            )
+        return cls(features, meta)
+
+    def terms(self, text: str) -> list[str]:
+        """
+        Word n-grams of the text, the same as ``CountVectorizer`` produces.
+
+        :param text:
+        :return:
+        """
+        if self.lowercase:
+            text = text.lower()
+        tokens = self.token_pattern.findall(text)
+
+        min_n, max_n = self.ngram_range
+        return [
+            " ".join(tokens[i : i + n])
+            for n in range(min_n, max_n + 1)
+            for i in range(len(tokens) - n + 1)
+        ]
+
+    def predict(self, texts: list[str]) -> np.ndarray:
+        """
+        Predict all texts with one lookup of all their terms.
+
+        :param texts:
+        :return: float64 array, one prediction per text
+        """
+        terms = [self.terms(text) for text in texts]
+        rows = np.repeat(np.arange(len(texts)), [len(t) for t in terms])
+        hashes = hash_terms([term for text_terms in terms for term in text_terms])
+
+        known = self.features["hash"]
+        positions = np.searchsorted(known, hashes)
+        positions[positions == len(known)] = 0
+        if len(known):
+            found = known[positions] == hashes
+        else:
+            found = np.zeros(len(hashes), dtype=bool)
+
+        contributions = self.features["coef"][positions[found]].astype(np.float64)
+        result = np.bincount(rows[found], weights=contributions, minlength=len(texts))
+        return result + self.intercept
+
+
+def load_model(path: Path):
+    """
+    Load the regression model: the sparse artifact for ``.npy`` files and the
+    pickled sklearn pipeline otherwise.
+
+    :param path:
+    :return: model with ``predict(texts)``
+    """
+    if Path(path).suffix == ".npy":
+        return SparseTextRegression.load(path)
+    return joblib.load(path)
+
+
+@app.command()
+def main(
+    model_path: Path = config.models_dir / "regression_model.pkl",
+    output_path: Path = config.models_dir / SPARSE_MODEL_FILE,
+    prune_below: float = 0.0,
+):
+    """
+    Convert the pickled pipeline into the sparse serving artifact.
+
+    :param model_path:
+    :param output_path:
+    :param prune_below: drop terms with ``|coef| <= prune_below``
+    :return:
+    """
+    model = SparseTextRegression.from_pipeline(
+        joblib.load(model_path), prune_below=prune_below
+    )
+    model.save(output_path)
+
+
+if __name__ == "__main__":
+    app()
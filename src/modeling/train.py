@@ -0,0 +1,327 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from joblib import Parallel, delayed
+from loguru import logger
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.linear_model import LinearRegression
+from sklearn.model_selection import StratifiedKFold
+from sklearn.pipeline import Pipeline
+from typer import Typer
+
+from src.config import BaseConfig
+from src.data.storage import read_dataframe
+from src.modeling.embedding_index import meta_path
+from src.modeling.evaluation import evaluate
+from src.modeling.metrics import weighted_accuracy
+from src.modeling.sparse_model import SPARSE_MODEL_FILE, SparseTextRegression
+
+app = Typer(pretty_exceptions_enable=False)
+
+config = BaseConfig()
+
+MODEL_FILE = "regression_model.pkl"
+METRICS_FILE = "metrics.json"
+NGRAM_RANGE = (2, 2)
+DATA_COLUMNS = [
+    "jira_key",
+    "task_text",
+    "time_to_complete_hours",
+    "assignee_level_order",
+]
+
+
+@app.command()
+def main(
+    input_path: Path = config.processed_data_dir / "final_data_to_train.parquet",
+    test_keys_path: Path = config.processed_data_dir / "test_tasks.csv",
+    models_dir: Path = config.models_dir,
+    n_splits: int = 3,
+    workers: int = 3,
+    min_hours: int = 2,
+    max_hours: int = 12,
+    random_state: int = config.random_state,
+):
+    """
+    Cross-validate and train the bigram linear regression on the final data.
+
+    The model, its sparse serving artifact and its metrics are saved to
+    ``models/versions/<version>/`` and then published to ``models/``.
+
+    :param input_path:
+    :param test_keys_path: CSV with ``jira_key`` of the tasks held out for manual
+        evaluation, they are not used for training
+    :param models_dir:
+    :param n_splits: cross-validation folds
+    :param workers: folds fitted in parallel
+    :param min_hours: the target is clipped to [min_hours, max_hours]
+    :param max_hours:
+    :param random_state:
+    :return:
+    """
+    started = time.perf_counter()
+    data = read_dataframe(input_path, columns=DATA_COLUMNS)
+    if Path(test_keys_path).exists():
+        test_keys = pd.read_csv(test_keys_path)["jira_key"]
+        data = data[~data["jira_key"].isin(test_keys)].reset_index(drop=True)
+        logger.info(f"Held out {len(test_keys)} manual test tasks")
+
+    params = {
+        "n_splits": n_splits,
+        "min_hours": min_hours,
+        "max_hours": max_hours,
+        "random_state": random_state,
+        "ngram_range": list(NGRAM_RANGE),
+    }
+    texts = data["task_text"].fillna("").tolist()
+    y_raw = data["time_to_complete_hours"].to_numpy(dtype=np.float64)
+    y = transform_target(y_raw, min_hours, max_hours)
+
+    corpus = TokenizedCorpus.from_texts(texts)
+    logger.info(f"Tokenized {len(texts)} tasks into {len(corpus.terms)} bigrams")
+
+    metrics, predictions = cross_validate(
+        corpus, y, y_raw, n_splits, workers, random_state
+    )
+    metrics["out_of_fold"] = evaluate(
+        y_raw, predictions, levels=data["assignee_level_order"]
+    )
+    model = fit_model(corpus, y)
+
+    metrics["training_time_seconds"] = time.perf_counter() - started
+    metrics["n_train"] = len(texts)
+    version = model_version(data, params)
+    version_dir = save_version(models_dir, version, model, metrics, params)
+    publish_version(version_dir, models_dir)
+
+    logger.info(
+        f"Trained model {version}: weighted accuracy "
+        f"{metrics['w_acc_test']['mean']:.3f} ± {metrics['w_acc_test']['std']:.3f} "
+        f"in {metrics['training_time_seconds']:.1f}s"
+    )
+
+
+def transform_target(
+    hours: np.ndarray, min_hours: int = 2, max_hours: int = 12
+) -> np.ndarray:
+    """
+    Clip the hours and round them down to an even number, as in ``mvp.ipynb``.
+
+    :param hours:
+    :param min_hours:
+    :param max_hours:
+    :return:
+    """
+    return np.clip(hours, min_hours, max_hours) // 2 * 2
+
+
+@dataclass
+class TokenizedCorpus:
+    """
+    Bigram counts of all texts, tokenized once.
+
+    ``CountVectorizer`` keeps its vocabulary sorted, so a vectorizer fitted on a
+    subset of the rows is the columns of the full matrix that occur in the
+    subset. Every fold and the final model slice this matrix instead of
+    tokenizing the texts again.
+    """
+
+    matrix: sparse.csr_matrix
+    terms: np.ndarray
+
+    @classmethod
+    def from_texts(cls, texts: list[str]) -> "TokenizedCorpus":
+        vectorizer = CountVectorizer(ngram_range=NGRAM_RANGE)
+        matrix = vectorizer.fit_transform(texts).tocsr()
+        return cls(matrix=matrix, terms=vectorizer.get_feature_names_out())
+
+    def vocabulary(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Columns of the terms that occur in the rows, in vocabulary order.
+
+        :param rows:
+        :return:
+        """
+        return np.flatnonzero(self.matrix[rows].getnnz(axis=0))
+
+
+def fit_fold(
+    corpus: TokenizedCorpus,
+    y: np.ndarray,
+    y_raw: np.ndarray,
+    train: np.ndarray,
+    test: np.ndarray,
+) -> tuple[dict, np.ndarray]:
+    """
+    Fit the regression on one fold and score it on both parts.
+
+    :param corpus:
+    :param y: transformed target
+    :param y_raw: target in hours
+    :param train: row positions
+    :param test:
+    :return: weighted accuracies of the fold and the test predictions
+    """
+    columns = corpus.vocabulary(train)
+    x_train = corpus.matrix[train][:, columns]
+    x_test = corpus.matrix[test][:, columns]
+
+    regression = LinearRegression().fit(x_train, y[train])
+    pred_train = regression.predict(x_train)
+    pred_test = regression.predict(x_test)
+
+    metrics = {
+        "w_acc_test_transformed": weighted_accuracy(y[test], pred_test),
+        "w_acc_train_transformed": weighted_accuracy(y[train], pred_train),
+        "w_acc_test": weighted_accuracy(y_raw[test], pred_test),
+        "w_acc_train": weighted_accuracy(y_raw[train], pred_train),
+    }
+    return metrics, pred_test
+
+
+def cross_validate(
+    corpus: TokenizedCorpus,
+    y: np.ndarray,
+    y_raw: np.ndarray,
+    n_splits: int = 3,
+    workers: int = 3,
+    random_state: int = 42,
+) -> tuple[dict, np.ndarray]:
+    """
+    Stratified K-fold with the folds fitted in parallel processes.
+
+    :param corpus:
+    :param y: transformed target, also used for stratification
+    :param y_raw: target in hours
+    :param n_splits:
+    :param workers:
+    :param random_state:
+    :return: mean and std of every metric over the folds with the fold values,
+        and the out-of-fold prediction of every row
+    """
+    folds = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    splits = list(folds.split(np.zeros(len(y)), y))
+    started = time.perf_counter()
+    results = Parallel(n_jobs=min(workers, n_splits))(
+        delayed(fit_fold)(corpus, y, y_raw, train, test) for train, test in splits
+    )
+    logger.info(
+        f"Cross-validated {n_splits} folds in {time.perf_counter() - started:.1f}s"
+    )
+
+    metrics = {
+        name: {
+            "mean": float(np.mean(values)),
+            "std": float(np.std(values)),
+            "folds": [float(value) for value in values],
+        }
+        for name, values in pd.DataFrame([m for m, _ in results]).items()
+    }
+    metrics["cv_time_seconds"] = time.perf_counter() - started
+
+    predictions = np.empty(len(y))
+    for (_, test), (_, pred_test) in zip(splits, results):
+        predictions[test] = pred_test
+
+    return metrics, predictions
+
+
+def fit_model(corpus: TokenizedCorpus, y: np.ndarray) -> Pipeline:
+    """
+    Fit the regression on all rows and wrap it into the same pipeline as in
+    ``mvp.ipynb``, so the service keeps calling ``predict`` on raw texts.
+
+    :param corpus:
+    :param y: transformed target
+    :return:
+    """
+    columns = corpus.vocabulary(np.arange(corpus.matrix.shape[0]))
+    regression = LinearRegression().fit(corpus.matrix[:, columns], y)
+    vectorizer = CountVectorizer(
+        ngram_range=NGRAM_RANGE,
+        vocabulary={term: i for i, term in enumerate(corpus.terms[columns])},
+    )
+
+    return Pipeline([("tfidf", vectorizer), ("lr", regression)])
+
+
+def model_version(data: pd.DataFrame, params: dict) -> str:
+    """
+    ``<UTC time>-<hash of the training data and params>``: sortable and tells
+    whether two models were trained on the same data.
+
+    :param data:
+    :param params:
+    :return:
+    """
+    digest = hashlib.sha256(
+        pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes()
+    )
+    digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    return f"{timestamp}-{digest.hexdigest()[:12]}"
+
+
+def save_version(
+    models_dir: Path, version: str, model: Pipeline, metrics: dict, params: dict
+) -> Path:
+    """
+    Save the model and its metrics to ``models_dir/versions/<version>/``.
+
+    :param models_dir:
+    :param version:
+    :param model:
+    :param metrics:
+    :param params:
+    :return: directory of the version
+    """
+    version_dir = Path(models_dir) / "versions" / version
+    version_dir.mkdir(parents=True, exist_ok=True)
+    joblib.dump(model, version_dir / MODEL_FILE)
+    SparseTextRegression.from_pipeline(model).save(version_dir / SPARSE_MODEL_FILE)
+
+    metrics = {
+        "version": version,
+        "params": params,
+        "sklearn_version": sklearn.__version__,
+        **metrics,
+    }
+    (version_dir / METRICS_FILE).write_text(json.dumps(metrics, indent=4))
+
+    logger.info(f"Saved model version to {version_dir}")
+    return version_dir
+
+
+def publish_version(version_dir: Path, models_dir: Path) -> None:
+    """
+    Copy the version to ``models_dir``. Files are replaced atomically, so the
+    registry of a running service never reads a half-written model. The sparse
+    metadata goes before its array, which the registry watches.
+
+    :param version_dir:
+    :param models_dir:
+    :return:
+    """
+    sparse_meta = meta_path(Path(SPARSE_MODEL_FILE)).name
+    for name in (MODEL_FILE, sparse_meta, SPARSE_MODEL_FILE, METRICS_FILE):
+        target = Path(models_dir) / name
+        tmp_path = target.with_name(target.name + ".tmp")
+        shutil.copyfile(Path(version_dir) / name, tmp_path)
+        os.replace(tmp_path, target)
+
+    logger.info(f"Published {version_dir.name} to {models_dir}")
+
+
+if __name__ == "__main__":
+    app()
@@ -4,6 +4,8 @@ import anthropic
 from loguru import logger
 
 from src.config import BaseConfig
+from src.tools.llm_usage import LLMUsage
+from src.tools.prompting import cacheable_prompt_content
 from pathlib import Path
 import json
 from pydantic import BaseModel
@@ -35,72 +37,118 @@ class TaskEstimator:
         system_prompt_path: Path = PATH_JSON,
     ):
         self.client = anthropic.Anthropic(api_key=api_key)
+        self.async_client = anthropic.AsyncAnthropic(api_key=api_key)
+        self.usage = LLMUsage()
         self.system_prompt_json = json.loads(system_prompt_path.read_text())
         self.examples: str = self.system_prompt_json["examples"]
         self.system_prompt: str = self.system_prompt_json["prompt"]
 
-    def estimate_task_time(self, query: QuerySchema) -> LLMEvaluationResultSchema:
+    def estimate_task_time(
+        self, query: QuerySchema, raise_on_error: bool = False
+    ) -> LLMEvaluationResultSchema:
+        """
+
+        :param query:
+        :param raise_on_error: raise API errors instead of returning them in
+            the result, e.g. to let ``LLMBatchExecutor`` retry them
+        :return:
+        """
         try:
-            related_tasks_str = "\n".join(
-                [
-                    f"{{\"jira_key\": \"{task['jira_key']}\", "
-                    f"\"task_text\": \"{task['task_text']}\", "
-                    f"\"time_to_complete_hours\": {task['time_to_complete_hours']}, "
-                    f"\"assignee_level_order\": {task['assignee_level_order']}, "
-                    f"\"weeks_since_member_join\": {task['weeks_since_member_join']}}}"
-                    for task in query.related_tasks
-                ]
+            messages = self.client.messages.create(**self._request_params(query))
+            self.usage.record(messages)
+            return self._parse_result(messages.content[0].text)
+        except Exception as e:
+            if raise_on_error:
+                raise
+            logger.error(f"Error estimating task time: {e}")
+
+            return LLMEvaluationResultSchema(
+                error=str(e),
             )
 
-            messages = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=4096,
-                temperature=0,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": self.examples},
-                            {
-                                "type": "text",
-                                "text": self.system_prompt.replace(
-                                    "{{RELATED_TASKS}}", related_tasks_str
-                                )
-                                .replace("{{CURRENT_TASK}}", query.current_task)
-                                .replace(
-                                    "{{WEEKS_SINCE_MEMBER_JOIN}}",
-                                    str(query.weeks_since_member_join),
-                                )
-                                .replace(
-                                    "{{ASSIGNEE_LEVEL_ORDER}}",
-                                    str(query.assignee_level_order),
-                                ),
-                            },
-                        ],
-                    },
-                    {
-                        "role": "assistant",
-                        "content": [{"type": "text", "text": "```json"}],
-                    },
-                ],
+    async def aestimate_task_time(
+        self, query: QuerySchema
+    ) -> LLMEvaluationResultSchema:
+        """
+        Same as ``estimate_task_time``, but does not block the event loop.
+
+        :param query:
+        :return:
+        """
+        try:
+            messages = await self.async_client.messages.create(
+                **self._request_params(query)
             )
-            result = messages.content[0].text
-            result = result.strip()
-
-            valid = False
-            if result[0] == "{" and result[-3:] == "```":
-                result = result[:-3]
-                valid = True
-
-            if valid:
-                return LLMEvaluationResultSchema.model_validate_json(result)
-            else:
-                return LLMEvaluationResultSchema(
-                    error="Invalid result", raw_result=result
-                )
+            self.usage.record(messages)
+            return self._parse_result(messages.content[0].text)
         except Exception as e:
             logger.error(f"Error estimating task time: {e}")
 
             return LLMEvaluationResultSchema(
                 error=str(e),
             )
+
+    def _request_params(self, query: QuerySchema) -> dict:
+        """
+        Parameters of the Messages API request for the given query.
+
+        :param query:
+        :return:
+        """
+        related_tasks_str = "\n".join(
+            [
+                f"{{\"jira_key\": \"{task['jira_key']}\", "
+                f"\"task_text\": \"{task['task_text']}\", "
+                f"\"time_to_complete_hours\": {task['time_to_complete_hours']}, "
+                f"\"assignee_level_order\": {task['assignee_level_order']}, "
+                f"\"weeks_since_member_join\": {task['weeks_since_member_join']}}}"
+                for task in query.related_tasks
+            ]
+        )
+
+        return {
+            "model": "claude-3-5-sonnet-20241022",
+            "max_tokens": 4096,
+            "temperature": 0,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": cacheable_prompt_content(
+                        self.examples,
+                        self.system_prompt,
+                        {
+                            "{{RELATED_TASKS}}": related_tasks_str,
+                            "{{CURRENT_TASK}}": query.current_task,
+                            "{{WEEKS_SINCE_MEMBER_JOIN}}": str(
+                                query.weeks_since_member_join
+                            ),
+                            "{{ASSIGNEE_LEVEL_ORDER}}": str(query.assignee_level_order),
+                        },
+                    ),
+                },
+                {
+                    "role": "assistant",
+                    "content": [{"type": "text", "text": "```json"}],
+                },
+            ],
+        }
+
+    @staticmethod
+    def _parse_result(result: str) -> LLMEvaluationResultSchema:
+        """
+        Validate the JSON answer of the LLM.
+
+        :param result:
+        :return:
+        """
+        result = result.strip()
+
+        valid = False
+        if result[0] == "{" and result[-3:] == "```":
+            result = result[:-3]
+            valid = True
+
+        if valid:
+            return LLMEvaluationResultSchema.model_validate_json(result)
+        else:
+            return LLMEvaluationResultSchema(error="Invalid result", raw_result=result)
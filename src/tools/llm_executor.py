@@ -0,0 +1,262 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Hashable
+
+import anthropic
+from loguru import logger
+from tqdm import tqdm
+
+from src.tools.kv_cache import SQLiteCache
+from src.tools.llm_usage import LLMUsage
+from src.tools.rate_limit import TokenBucket
+
+RETRYABLE_ERRORS = (
+    anthropic.RateLimitError,
+    anthropic.InternalServerError,
+    anthropic.APIConnectionError,
+)
+
+
+@dataclass
+class ExecutorStats:
+    processed: int = 0
+    resumed: int = 0
+    cached: int = 0
+    failed: int = 0
+    retries: int = 0
+    elapsed_seconds: float = 0.0
+    usage: dict = field(default_factory=dict)
+
+    @property
+    def requests_per_second(self) -> float:
+        if not self.elapsed_seconds:
+            return 0.0
+        return self.usage.get("requests", self.processed) / self.elapsed_seconds
+
+    @property
+    def tokens_per_second(self) -> float:
+        if not self.elapsed_seconds:
+            return 0.0
+        tokens = sum(
+            value for name, value in self.usage.items() if name.endswith("tokens")
+        )
+        return tokens / self.elapsed_seconds
+
+    def summary(self) -> str:
+        return (
+            f"processed={self.processed} resumed={self.resumed} "
+            f"cached={self.cached} "
+            f"failed={self.failed} retries={self.retries} "
+            f"elapsed={self.elapsed_seconds:.1f}s "
+            f"requests/s={self.requests_per_second:.2f} "
+            f"tokens/s={self.tokens_per_second:.1f}"
+        )
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    429, 5xx and connection errors are worth retrying, other errors are not.
+
+    :param error:
+    :return:
+    """
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+
+    status_code = getattr(error, "status_code", None)
+    return status_code == 429 or (status_code is not None and status_code >= 500)
+
+
+def retry_after_seconds(error: Exception) -> float | None:
+    """
+    Value of the ``retry-after`` header of the failed response, if any.
+
+    :param error:
+    :return:
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMBatchExecutor:
+    """
+    Run an LLM call over many items with bounded concurrency.
+
+    - a token bucket keeps the request rate under the API limit;
+    - 429/5xx errors are retried with exponential backoff and jitter,
+      honouring ``retry-after``;
+    - every result is appended to a JSONL checkpoint, so an interrupted run
+      resumes where it stopped (an item is reused only if its input is unchanged);
+    - items answered by ``lookup`` (e.g. the LLM cache) are not submitted and
+      do not take rate limit tokens;
+    - ``stats`` reports requests/s and tokens/s.
+
+    ``func`` must raise on failure and return a JSON-serializable result.
+    """
+
+    def __init__(
+        self,
+        func: Callable[[Any], Any],
+        checkpoint_path: Path | None = None,
+        max_workers: int = 8,
+        requests_per_minute: float = 50,
+        max_retries: int = 5,
+        backoff_base_seconds: float = 1.0,
+        backoff_max_seconds: float = 60.0,
+        usage: LLMUsage | None = None,
+        lookup: Callable[[Any], Any | None] | None = None,
+    ):
+        """
+        :param func: the LLM call, item -> result
+        :param checkpoint_path:
+        :param max_workers: concurrent calls
+        :param requests_per_minute: rate limit of the calls
+        :param max_retries:
+        :param backoff_base_seconds:
+        :param backoff_max_seconds:
+        :param usage: token usage of ``func``, reported in ``stats``
+        :param lookup: item -> result known without an API call, None if there
+            is none
+        """
+        self.func = func
+        self.lookup = lookup
+        self.checkpoint_path = Path(checkpoint_path) if checkpoint_path else None
+        self.max_workers = max_workers
+        self.rate_limiter = TokenBucket.per_minute(requests_per_minute)
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.usage = usage
+
+        self.errors: dict[Hashable, str] = {}
+        self.stats = ExecutorStats()
+        self._checkpoint_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def run(self, items: dict[Hashable, Any]) -> dict[Hashable, Any]:
+        """
+        Process the items.
+
+        :param items: key -> input of ``func``; keys must be JSON-serializable
+        :return: key -> result for every item that succeeded, in input order
+        """
+        self.errors = {}
+        self.stats = ExecutorStats()
+        usage_before = self.usage.snapshot() if self.usage else {}
+        start = time.perf_counter()
+
+        hashes = {key: SQLiteCache.make_key(item) for key, item in items.items()}
+        results = self._load_checkpoint(hashes)
+        self.stats.resumed = len(results)
+        if results:
+            logger.info(f"Resumed {len(results)} results from {self.checkpoint_path}")
+
+        todo = {}
+        for key, item in items.items():
+            if key in results:
+                continue
+            cached = self.lookup(item) if self.lookup is not None else None
+            if cached is not None:
+                results[key] = cached
+                self.stats.cached += 1
+            else:
+                todo[key] = item
+        if self.stats.cached:
+            logger.info(f"Found {self.stats.cached} of {len(items)} results in cache")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {
+                pool.submit(self._call_with_retries, item): key
+                for key, item in todo.items()
+            }
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                key = futures[future]
+                try:
+                    results[key] = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to process {key}: {e}")
+                    self.errors[key] = str(e)
+                    self.stats.failed += 1
+                    continue
+
+                self.stats.processed += 1
+                self._save_checkpoint(key, hashes[key], results[key])
+
+        self.stats.elapsed_seconds = time.perf_counter() - start
+        if self.usage:
+            self.stats.usage = {
+                name: value - usage_before.get(name, 0)
+                for name, value in self.usage.snapshot().items()
+            }
+        logger.info(f"LLM batch finished: {self.stats.summary()}")
+
+        return {key: results[key] for key in items if key in results}
+
+    def _call_with_retries(self, item: Any) -> Any:
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                return self.func(item)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+
+                delay = retry_after_seconds(e) or self._backoff(attempt)
+                logger.warning(f"Retryable error, retry in {delay:.1f}s: {e}")
+                with self._stats_lock:
+                    self.stats.retries += 1
+                time.sleep(delay)
+                attempt += 1
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max_seconds, self.backoff_base_seconds * 2**attempt)
+        return delay * random.uniform(0.5, 1.0)  # noqa: S311 - jitter, not crypto
+
+    def _load_checkpoint(self, hashes: dict[Hashable, str]) -> dict[Hashable, Any]:
+        """
+        Results of a previous run for items whose input did not change.
+
+        :param hashes: key -> hash of the current input
+        :return:
+        """
+        if self.checkpoint_path is None or not self.checkpoint_path.exists():
+            return {}
+
+        by_json_key = {json.dumps(key): key for key in hashes}
+        results = {}
+        with self.checkpoint_path.open(encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # the last line of a killed run may be cut
+                    continue
+
+                key = by_json_key.get(json.dumps(record["key"]))
+                if key is not None and hashes[key] == record["input_hash"]:
+                    results[key] = record["result"]
+
+        return results
+
+    def _save_checkpoint(self, key: Hashable, input_hash: str, result: Any) -> None:
+        if self.checkpoint_path is None:
+            return
+
+        line = json.dumps(
+            {"key": key, "input_hash": input_hash, "result": result},
+            ensure_ascii=False,
+        )
+        with self._checkpoint_lock:
+            self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.checkpoint_path.open("a", encoding="utf-8") as file:
+                file.write(line + "\n")
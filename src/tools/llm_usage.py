@@ -0,0 +1,82 @@
+import threading
+
+from loguru import logger
+
+
+class LLMUsage:
+    """
+    Thread-safe counters of Anthropic API calls and tokens.
+
+    Every tool records the ``usage`` block of each response here, so executors
+    and the API can report throughput and token spend. Prompt caching shows up as
+    ``cache_creation_input_tokens`` (prefix written to the cache) and
+    ``cache_read_input_tokens`` (prefix served from the cache); ``input_tokens``
+    counts only the uncached part of the prompt.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_creation_input_tokens = 0
+        self.cache_read_input_tokens = 0
+
+    def record(self, message) -> None:
+        """
+        Add the usage of one Messages API response.
+
+        :param message: response of ``messages.create``
+        :return:
+        """
+        usage = getattr(message, "usage", None)
+        with self._lock:
+            self.requests += 1
+            if usage is None:
+                return
+
+            input_tokens = usage.input_tokens or 0
+            output_tokens = usage.output_tokens or 0
+            cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+            cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            self.cache_creation_input_tokens += cache_write
+            self.cache_read_input_tokens += cache_read
+
+        logger.debug(
+            f"LLM call usage: {input_tokens=} {output_tokens=} "
+            f"cache_write={cache_write} cache_read={cache_read}"
+        )
+
+    @property
+    def total_tokens(self) -> int:
+        return (
+            self.input_tokens
+            + self.output_tokens
+            + self.cache_creation_input_tokens
+            + self.cache_read_input_tokens
+        )
+
+    @property
+    def cache_hit_ratio(self) -> float:
+        """
+        Share of the prompt tokens served from the prompt cache.
+        """
+        prompt_tokens = (
+            self.input_tokens
+            + self.cache_creation_input_tokens
+            + self.cache_read_input_tokens
+        )
+        return self.cache_read_input_tokens / prompt_tokens if prompt_tokens else 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+                "cache_creation_input_tokens": self.cache_creation_input_tokens,
+                "cache_read_input_tokens": self.cache_read_input_tokens,
+            }
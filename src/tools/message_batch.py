@@ -0,0 +1,99 @@
+import time
+from typing import Hashable
+
+import anthropic
+from loguru import logger
+
+from src.tools.llm_usage import LLMUsage
+
+
+class MessageBatchRunner:
+    """
+    Run many Messages API requests as Anthropic message batches.
+
+    Batches are processed asynchronously by the API at a lower price, which fits
+    the offline DVC stages. Requests are submitted in chunks, the runner polls until
+    every batch has ended and maps the results back to the caller's keys.
+    """
+
+    def __init__(
+        self,
+        client: anthropic.Anthropic,
+        poll_interval_seconds: float = 30,
+        timeout_seconds: float = 24 * 60 * 60,
+        max_requests_per_batch: int = 10_000,
+        usage: LLMUsage | None = None,
+    ):
+        self.client = client
+        self.poll_interval_seconds = poll_interval_seconds
+        self.timeout_seconds = timeout_seconds
+        self.max_requests_per_batch = max_requests_per_batch
+        self.usage = usage
+
+        self.errors: dict[Hashable, str] = {}
+
+    def run(self, requests: dict[Hashable, dict]) -> dict[Hashable, object]:
+        """
+        Submit the requests, wait for the batches and collect the messages.
+
+        :param requests: key -> parameters of ``messages.create``
+        :return: key -> ``Message`` for the succeeded requests; the failed ones
+            are listed in ``self.errors``
+        """
+        self.errors = {}
+        # custom_id allows only [a-zA-Z0-9_-], so the keys are mapped to indices
+        keys = list(requests)
+        custom_ids = {f"request-{i}": key for i, key in enumerate(keys)}
+
+        batch_ids = []
+        for start in range(0, len(keys), self.max_requests_per_batch):
+            chunk = [
+                {"custom_id": f"request-{i}", "params": requests[keys[i]]}
+                for i in range(
+                    start, min(start + self.max_requests_per_batch, len(keys))
+                )
+            ]
+            batch = self.client.messages.batches.create(requests=chunk)
+            logger.info(
+                f"Submitted message batch {batch.id} with {len(chunk)} requests"
+            )
+            batch_ids.append(batch.id)
+
+        messages = {}
+        for batch_id in batch_ids:
+            self._wait(batch_id)
+            for entry in self.client.messages.batches.results(batch_id):
+                key = custom_ids[entry.custom_id]
+                if entry.result.type == "succeeded":
+                    messages[key] = entry.result.message
+                    if self.usage is not None:
+                        self.usage.record(entry.result.message)
+                else:
+                    error = getattr(entry.result, "error", None)
+                    self.errors[key] = str(error) if error else entry.result.type
+
+        if self.errors:
+            logger.warning(f"{len(self.errors)} batch requests did not succeed")
+
+        return {key: messages[key] for key in keys if key in messages}
+
+    def _wait(self, batch_id: str) -> None:
+        """
+        Poll the batch until it has ended.
+
+        :param batch_id:
+        :return:
+        """
+        deadline = time.monotonic() + self.timeout_seconds
+        while True:
+            batch = self.client.messages.batches.retrieve(batch_id)
+            if batch.processing_status == "ended":
+                logger.info(f"Message batch {batch_id} ended: {batch.request_counts}")
+                return
+
+            if time.monotonic() > deadline:
+                self.client.messages.batches.cancel(batch_id)
+                raise TimeoutError(f"Message batch {batch_id} did not end in time")
+
+            logger.info(f"Message batch {batch_id} is {batch.processing_status}")
+            time.sleep(self.poll_interval_seconds)
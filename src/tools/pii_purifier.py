@@ -1,5 +1,9 @@
 import anthropic
 from src.config import BaseConfig
+from src.tools.llm_usage import LLMUsage
+from src.tools.message_batch import MessageBatchRunner
+from src.tools.pii_redactor import PIIRedactor
+from src.tools.prompting import cacheable_prompt_content
 from pathlib import Path
 import json
 
@@ -12,21 +16,37 @@ class PIIPurifier:
         self,
         api_key: str = config.anthropic_api_key,
         system_prompt_path: Path = PATH_JSON,
+        redactor: PIIRedactor | None = None,
+        llm_fallback: bool = False,
     ):
+        """
+        :param api_key:
+        :param system_prompt_path:
+        :param redactor: local redaction engine, built from the employees file
+            if None
+        :param llm_fallback: send the texts the engine flags to the LLM
+        """
+        self.redactor = redactor or PIIRedactor.from_employees()
+        self.llm_fallback = llm_fallback
         self.client = anthropic.Anthropic(api_key=api_key)
+        self.usage = LLMUsage()
         self.system_prompt_json = json.loads(system_prompt_path.read_text())
         self.system_prompt: str = self.system_prompt_json["prompt"]
         self.examples: str = self.system_prompt_json["examples"]
 
     def purify(self, text) -> str:
         """
-        Template method to purify the given text
+        Purify the given text with the local engine, only the residual cases
+        flagged by it go to the LLM (if ``llm_fallback``)
 
         :param text:
         :return:
         """
+        result = self.redactor.redact(text)
+        if result.flagged and self.llm_fallback:
+            return self.todo_purify(result.text)
 
-        return text
+        return result.text
 
     def todo_purify(self, text) -> str:
         """
@@ -35,31 +55,70 @@ class PIIPurifier:
         :param text:
         :return:
         """
-        messages = self.client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=4096,
-            temperature=0,
-            messages=[
+        messages = self.client.messages.create(**self._request_params(text))
+        self.usage.record(messages)
+        return self._parse_result(messages.content[0].text)
+
+    def todo_purify_batch(
+        self, texts: dict, runner: MessageBatchRunner | None = None
+    ) -> dict:
+        """
+        Purify many texts with the Message Batches API
+
+        :param texts: key -> text
+        :param runner: batch runner, a default one on ``self.client`` if None
+        :return: key -> purified text; texts whose request failed are left as is
+            and listed in ``runner.errors``
+        """
+        runner = runner or MessageBatchRunner(self.client, usage=self.usage)
+        messages = runner.run(
+            {key: self._request_params(text) for key, text in texts.items()}
+        )
+
+        return {
+            key: (
+                self._parse_result(messages[key].content[0].text)
+                if key in messages
+                else text
+            )
+            for key, text in texts.items()
+        }
+
+    def _request_params(self, text: str) -> dict:
+        """
+        Parameters of the Messages API request for the given text
+
+        :param text:
+        :return:
+        """
+        return {
+            "model": "claude-3-5-sonnet-20241022",
+            "max_tokens": 4096,
+            "temperature": 0,
+            "messages": [
                 {
                     "role": "user",
-                    "content": [
-                        {"type": "text", "text": self.examples},
-                        {
-                            "type": "text",
-                            "text": self.system_prompt.replace(
-                                "{{text_to_redact}}", text
-                            ),
-                        },
-                    ],
+                    "content": cacheable_prompt_content(
+                        self.examples,
+                        self.system_prompt,
+                        {"{{text_to_redact}}": text},
+                    ),
                 },
                 {
                     "role": "assistant",
                     "content": [{"type": "text", "text": "<pii_analysis>"}],
                 },
             ],
-        )
-        result = messages.content[0].text
+        }
 
+    @staticmethod
+    def _parse_result(result: str) -> str:
+        """
+        Keep only the redacted text after the analysis block
+
+        :param result:
+        :return:
+        """
         result = result.split("</pii_analysis>")[-1]
         result = result.strip()
 
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable
+
+from loguru import logger
+
+from src.config import BaseConfig
+
+try:  # optional Aho-Corasick backend for large name dictionaries
+    import ahocorasick
+except ImportError:  # pragma: no cover - depends on the environment
+    ahocorasick = None
+
+config = BaseConfig()
+EMPLOYEES_PATH = config.raw_data_dir / ".private.employees.json"
+
+# applied in order: URLs first, so emails and numbers inside them are not split
+PATTERNS = (
+    ("URL", re.compile(r"\bhttps?://[^\s<>|\]\"']+", re.IGNORECASE)),
+    ("EMAIL", re.compile(r"\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b")),
+    ("SLACK_USER", re.compile(r"<@[UW][A-Z0-9]+(?:\|[^>]*)?>")),
+    ("JIRA_USER", re.compile(r"\[~(?:accountid:)?[^\]\s]+\]")),
+    ("PHONE", re.compile(r"(?<!\w)(?<!\d\.)\+?\d[\d ()-]{7,}\d(?!\w|\.\d)")),
+)
+PHONE_DIGITS = range(10, 16)
+ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+# two capitalized words in a row that are not in the dictionary may be a name
+NAME_LIKE = re.compile(r"\b[A-ZА-ЯЁ][a-zа-яё]+\s+[A-ZА-ЯЁ][a-zа-яё]+\b")
+WORD_CHARS = re.compile(r"\w")
+NAME_FIELDS = ("name", "full_name", "slack_name")
+# shorter dictionary entries and shared mailboxes match ordinary words
+MIN_NAME_LENGTH = 4
+NAME_STOP_WORDS = frozenset(
+    {
+        "admin",
+        "bot",
+        "dev",
+        "devops",
+        "help",
+        "info",
+        "jira",
+        "noreply",
+        "no-reply",
+        "office",
+        "sales",
+        "service",
+        "slack",
+        "support",
+        "team",
+        "test",
+        "user",
+    }
+)
+
+
+@dataclass
+class RedactionResult:
+    text: str
+    counts: dict = field(default_factory=dict)
+    # the engine is not sure the text is clean, the LLM should have a look
+    flagged: bool = False
+
+
+class PIIRedactor:
+    """
+    In-process PII redaction: compiled patterns for URLs, emails, Slack and Jira
+    mentions and phone numbers, plus whole-word matching of known names.
+
+    Names are matched with an Aho-Corasick automaton when ``pyahocorasick`` is
+    installed and with one compiled alternation otherwise; both are linear in
+    the text length. Texts with name-like words that are not in the dictionary
+    are flagged for the LLM purifier.
+    """
+
+    def __init__(self, names: Iterable[str] = (), flag_residual: bool = True):
+        """
+        :param names: known names, matched case-insensitively as whole words
+        :param flag_residual: flag texts with unknown name-like words
+        """
+        self.names = sorted(
+            {name.strip().lower() for name in names if len(name.strip()) > 1},
+            key=len,
+            reverse=True,
+        )
+        self.flag_residual = flag_residual
+        self._automaton = None
+        self._names_pattern = None
+
+        if not self.names:
+            return
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for name in self.names:
+                self._automaton.add_word(name, len(name))
+            self._automaton.make_automaton()
+        else:
+            self._names_regex()
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Hash of the names dictionary, changes when the redaction of names does.
+
+        :return:
+        """
+        return hashlib.sha256("\n".join(sorted(self.names)).encode()).hexdigest()[:16]
+
+    @classmethod
+    def from_employees(cls, path: Path = EMPLOYEES_PATH, **kwargs) -> "PIIRedactor":
+        """
+        Redactor with the names of the employees: full names, Slack names,
+        email addresses and their local parts (``john.doe``). Single first or
+        last names are not used, they are too often ordinary words, and so are
+        entries shorter than ``MIN_NAME_LENGTH`` or in ``NAME_STOP_WORDS``.
+
+        :param path: JSON list of employees
+        :param kwargs: see ``__init__``
+        :return:
+        """
+        if not Path(path).exists():
+            logger.warning(f"No employees file at {path}, redacting without names")
+            return cls(**kwargs)
+
+        names = set()
+        for employee in json.loads(Path(path).read_text()):
+            names.update(employee.get(name_field) for name_field in NAME_FIELDS)
+            if employee.get("first_name") and employee.get("last_name"):
+                names.add(f"{employee['first_name']} {employee['last_name']}")
+            if employee.get("email"):
+                names.add(employee["email"])
+                names.add(employee["email"].split("@")[0])
+
+        names = {
+            name.strip()
+            for name in names
+            if name
+            and len(name.strip()) >= MIN_NAME_LENGTH
+            and name.strip().lower() not in NAME_STOP_WORDS
+        }
+        logger.info(f"Loaded {len(names)} names to redact from {path}")
+        return cls(names, **kwargs)
+
+    def redact(self, text: str) -> RedactionResult:
+        """
+        Replace PII with ``[TYPE]`` placeholders.
+
+        :param text:
+        :return:
+        """
+        counts = {}
+
+        def replace(kind: str, match: re.Match) -> str:
+            if kind == "PHONE":
+                digits = sum(c.isdigit() for c in match.group())
+                if digits not in PHONE_DIGITS or ISO_DATE.search(match.group()):
+                    return match.group()
+            counts[kind] = counts.get(kind, 0) + 1
+            return f"[{kind}]"
+
+        for kind, pattern in PATTERNS:
+            text = pattern.sub(lambda match: replace(kind, match), text)
+
+        text = self._redact_names(text, counts)
+        flagged = self.flag_residual and bool(NAME_LIKE.search(text))
+
+        return RedactionResult(text=text, counts=counts, flagged=flagged)
+
+    def __call__(self, text: str) -> str:
+        return self.redact(text).text
+
+    def _names_regex(self) -> re.Pattern:
+        """
+        Compiled alternation of the names, built on first use.
+
+        :return:
+        """
+        if self._names_pattern is None:
+            alternation = "|".join(re.escape(name) for name in self.names)
+            self._names_pattern = re.compile(
+                rf"(?<!\w)(?:{alternation})(?!\w)", re.IGNORECASE
+            )
+        return self._names_pattern
+
+    def _redact_names(self, text: str, counts: dict) -> str:
+        if not self.names:
+            return text
+
+        # automaton offsets index the lowered text, they match the original
+        # only when lower() keeps the length (it does not for "İ")
+        lowered = text.lower()
+        if self._automaton is None or len(lowered) != len(text):
+            text, n = self._names_regex().subn("[NAME]", text)
+            if n:
+                counts["NAME"] = counts.get("NAME", 0) + n
+            return text
+
+        # longest whole-word matches, left to right
+        spans = []
+        for end, length in self._automaton.iter(lowered):
+            start = end - length + 1
+            if start > 0 and WORD_CHARS.match(lowered[start - 1]):
+                continue
+            if end + 1 < len(lowered) and WORD_CHARS.match(lowered[end + 1]):
+                continue
+            spans.append((start, end + 1))
+
+        result, position = [], 0
+        for start, end in sorted(spans, key=lambda s: (s[0], -s[1])):
+            if start < position:
+                continue
+            result.append(text[position:start] + "[NAME]")
+            position = end
+        result.append(text[position:])
+
+        if len(result) > 1:
+            counts["NAME"] = counts.get("NAME", 0) + len(result) - 1
+        return "".join(result)
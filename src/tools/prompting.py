@@ -0,0 +1,38 @@
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def cacheable_prompt_content(
+    examples: str, prompt: str, variables: dict[str, str]
+) -> list[dict]:
+    """
+    Content blocks of a user message with the static prefix marked for prompt
+    caching.
+
+    The examples block and the head of the prompt up to the first placeholder are
+    the same for every call, so they are sent as separate blocks with
+    ``cache_control`` breakpoints. The rest of the prompt gets the variables
+    substituted and is never cached.
+
+    :param examples: static examples text
+    :param prompt: prompt template with ``{{PLACEHOLDER}}`` variables
+    :param variables: placeholder -> value
+    :return:
+    """
+    positions = [prompt.find(placeholder) for placeholder in variables]
+    split_at = min((p for p in positions if p >= 0), default=len(prompt))
+    head, tail = prompt[:split_at], prompt[split_at:]
+
+    for placeholder, value in variables.items():
+        tail = tail.replace(placeholder, value)
+
+    content = []
+    if examples:
+        content.append(
+            {"type": "text", "text": examples, "cache_control": CACHE_CONTROL}
+        )
+    if head:
+        content.append({"type": "text", "text": head, "cache_control": CACHE_CONTROL})
+    if tail:
+        content.append({"type": "text", "text": tail})
+
+    return content
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter shared by threads (``acquire``) or coroutines
+    (``aacquire``).
+
+    The bucket holds at most ``capacity`` tokens and refills at ``rate`` tokens
+    per second, so bursts up to ``capacity`` are allowed while the long-run
+    throughput stays at ``rate``.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, requests_per_minute: float) -> "TokenBucket":
+        """
+        Bucket for APIs with per-minute limits, bursts of up to a second of quota.
+
+        :param requests_per_minute:
+        :return:
+        """
+        rate = requests_per_minute / 60
+        return cls(rate=rate, capacity=max(rate, 1.0))
+
+    def _reserve(self, tokens: float) -> float:
+        """
+        Take the tokens and return how long the caller has to wait for them.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+            self._tokens -= tokens
+
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens: float = 1) -> None:
+        """
+        Block the current thread until the tokens are available.
+
+        :param tokens:
+        :return:
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: float = 1) -> None:
+        """
+        Wait without blocking the event loop until the tokens are available.
+
+        :param tokens:
+        :return:
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
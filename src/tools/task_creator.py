@@ -1,15 +1,22 @@
-from typing import Optional
+import asyncio
+from typing import AsyncIterator, Optional
 
 import anthropic
 from loguru import logger
 
 from src.config import BaseConfig
+from src.tools.kv_cache import SQLiteCache
+from src.tools.llm_usage import LLMUsage
+from src.tools.message_batch import MessageBatchRunner
+from src.tools.prompting import cacheable_prompt_content
 from pathlib import Path
+import hashlib
 import json
 from pydantic import BaseModel, Field
 
 config = BaseConfig()
 PATH_JSON = Path(__file__).parent / "task_creator_prompt.json"
+LLM_CACHE_PATH = config.cache_dir / "llm_cache.sqlite"
 
 
 class TaskSchema(BaseModel):
@@ -26,13 +33,36 @@ class TaskCreatedSchema(BaseModel):
     error: Optional[str] = Field(None, title="Error message")
 
 
+def get_llm_cache() -> SQLiteCache:
+    """
+    LLM results cache shared by the API service and the data pipeline.
+
+    :return:
+    """
+    return SQLiteCache(LLM_CACHE_PATH, max_entries=config.llm_cache_max_entries)
+
+
 class TaskCreator:
     def __init__(
         self,
         api_key: str = config.anthropic_api_key,
         system_prompt_path: Path = PATH_JSON,
+        model: str = "claude-3-5-sonnet-20241022",
+        cache: SQLiteCache | None = None,
     ):
+        """
+        :param api_key:
+        :param system_prompt_path:
+        :param model:
+        :param cache: cache of successful results, keyed by the model name,
+            the prompt file contents and the input text
+        """
         self.client = anthropic.Anthropic(api_key=api_key)
+        self.async_client = anthropic.AsyncAnthropic(api_key=api_key)
+        self.model = model
+        self.cache = cache
+        self.usage = LLMUsage()
+        self.prompt_digest = hashlib.sha256(system_prompt_path.read_bytes()).hexdigest()
         self.system_prompt_json = json.loads(system_prompt_path.read_text())
         self.system_prompt: str = self.system_prompt_json["prompt"]
         self.examples: str = self.system_prompt_json["examples"]
@@ -54,49 +84,51 @@ class TaskCreator:
         )
         return text
 
-    def create_task(self, text: str) -> TaskCreatedSchema:
+    def create_task(self, text: str, raise_on_error: bool = False) -> TaskCreatedSchema:
         """
 
         :param text:
+        :param raise_on_error: raise API errors instead of returning them in
+            the result, e.g. to let ``LLMBatchExecutor`` retry them
         :return:
         """
 
+        cached = self._get_cached(text)
+        if cached is not None:
+            return cached
+
         try:
-            messages = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=4096,
-                temperature=0,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": self.examples},
-                            {
-                                "type": "text",
-                                "text": self.system_prompt.replace(
-                                    "{{UNSTRUCTURED_TEXT}}", text
-                                ),
-                            },
-                        ],
-                    },
-                    {
-                        "role": "assistant",
-                        "content": [
-                            {"type": "text", "text": self.assistant_prefilled_part}
-                        ],
-                    },
-                ],
+            messages = self.client.messages.create(**self._request_params(text))
+            self.usage.record(messages)
+            return self._save_cached(text, self._parse_result(messages.content[0].text))
+        except Exception as e:
+            if raise_on_error:
+                raise
+            logger.error(f"Error creating task: {e}")
+
+            return TaskCreatedSchema(
+                result="", flg_ok_quality=False, error=str(e), flg_llm_work_done=False
             )
-            result = messages.content[0].text
-            result = result.strip()
 
-            quality_check = False
-            if result.startswith("**Summary") and result.endswith("```"):
-                quality_check = True
+    async def acreate_task(self, text: str) -> TaskCreatedSchema:
+        """
+        Same as ``create_task``, but does not block the event loop.
+
+        :param text:
+        :return:
+        """
+
+        cached = await self._aget_cached(text)
+        if cached is not None:
+            return cached
 
-            result = result[:-3].strip()
-            return TaskCreatedSchema(
-                result=result, flg_ok_quality=quality_check, flg_llm_work_done=True
+        try:
+            messages = await self.async_client.messages.create(
+                **self._request_params(text)
+            )
+            self.usage.record(messages)
+            return await self._asave_cached(
+                text, self._parse_result(messages.content[0].text)
             )
         except Exception as e:
             logger.error(f"Error creating task: {e}")
@@ -104,3 +136,199 @@ class TaskCreator:
             return TaskCreatedSchema(
                 result="", flg_ok_quality=False, error=str(e), flg_llm_work_done=False
             )
+
+    async def astream_task(self, text: str) -> AsyncIterator[str | TaskCreatedSchema]:
+        """
+        Same as ``acreate_task``, but yields the answer while the LLM writes it.
+
+        The text fragments are raw, e.g. with the closing code fence, the last
+        item is the parsed result. A cached result is yielded in one fragment.
+
+        :param text:
+        :return: text fragments, then ``TaskCreatedSchema``
+        """
+
+        cached = await self._aget_cached(text)
+        if cached is not None:
+            yield cached.result
+            yield cached
+            return
+
+        try:
+            async with self.async_client.messages.stream(
+                **self._request_params(text)
+            ) as stream:
+                async for fragment in stream.text_stream:
+                    yield fragment
+                message = await stream.get_final_message()
+            self.usage.record(message)
+            result = await self._asave_cached(
+                text, self._parse_result(message.content[0].text)
+            )
+        except Exception as e:
+            logger.error(f"Error creating task: {e}")
+
+            result = TaskCreatedSchema(
+                result="", flg_ok_quality=False, error=str(e), flg_llm_work_done=False
+            )
+
+        yield result
+
+    def create_tasks_batch(
+        self, texts: dict, runner: MessageBatchRunner | None = None
+    ) -> dict:
+        """
+        Create tasks for many texts with the Message Batches API.
+        Cached texts are not submitted.
+
+        :param texts: key (e.g. jira_key) -> text
+        :param runner: batch runner, a default one on ``self.client`` if None
+        :return: key -> TaskCreatedSchema for every text
+        """
+        runner = runner or MessageBatchRunner(self.client, usage=self.usage)
+
+        results = {}
+        for key, text in texts.items():
+            cached = self._get_cached(text)
+            if cached is not None:
+                results[key] = cached
+        logger.info(f"Found {len(results)} of {len(texts)} tasks in cache")
+
+        requests = {
+            key: self._request_params(text)
+            for key, text in texts.items()
+            if key not in results
+        }
+        messages = runner.run(requests) if requests else {}
+
+        for key in requests:
+            if key in messages:
+                result = self._parse_result(messages[key].content[0].text)
+                results[key] = self._save_cached(texts[key], result)
+            else:
+                results[key] = TaskCreatedSchema(
+                    result="",
+                    flg_ok_quality=False,
+                    error=runner.errors.get(key),
+                    flg_llm_work_done=False,
+                )
+
+        return {key: results[key] for key in texts}
+
+    def _request_params(self, text: str) -> dict:
+        """
+        Parameters of the Messages API request for the given text.
+
+        :param text:
+        :return:
+        """
+        return {
+            "model": self.model,
+            "max_tokens": 4096,
+            "temperature": 0,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": cacheable_prompt_content(
+                        self.examples,
+                        self.system_prompt,
+                        {"{{UNSTRUCTURED_TEXT}}": text},
+                    ),
+                },
+                {
+                    "role": "assistant",
+                    "content": [
+                        {"type": "text", "text": self.assistant_prefilled_part}
+                    ],
+                },
+            ],
+        }
+
+    def _cache_key(self, text: str) -> str:
+        return SQLiteCache.make_key(self.model, self.prompt_digest, text)
+
+    def _get_cached(self, text: str) -> TaskCreatedSchema | None:
+        """
+        Result of a previous call with the same model, prompt and text.
+
+        :param text:
+        :return:
+        """
+        if self.cache is None:
+            return None
+
+        cached = self.cache.get(self._cache_key(text))
+        if cached is None:
+            return None
+
+        return TaskCreatedSchema.model_validate(cached)
+
+    def _save_cached(self, text: str, result: TaskCreatedSchema) -> TaskCreatedSchema:
+        """
+        Cache the result. Only answers the LLM actually produced are cached,
+        errors are retried on the next call.
+
+        :param text:
+        :param result:
+        :return: the same result
+        """
+        if self.cache is not None and result.flg_llm_work_done:
+            self.cache.set(self._cache_key(text), result.model_dump())
+
+        return result
+
+    def cached_task(self, text: str) -> TaskCreatedSchema | None:
+        """
+        Cached result for the text, None if the LLM has to be called.
+
+        :param text:
+        :return:
+        """
+        return self._get_cached(text)
+
+    async def _aget_cached(self, text: str) -> TaskCreatedSchema | None:
+        """
+        Same as ``_get_cached``, the SQLite read runs in a worker thread so it
+        does not block the event loop.
+
+        :param text:
+        :return:
+        """
+        if self.cache is None:
+            return None
+
+        return await asyncio.to_thread(self._get_cached, text)
+
+    async def _asave_cached(
+        self, text: str, result: TaskCreatedSchema
+    ) -> TaskCreatedSchema:
+        """
+        Same as ``_save_cached``, the SQLite write runs in a worker thread.
+
+        :param text:
+        :param result:
+        :return: the same result
+        """
+        if self.cache is None:
+            return result
+
+        return await asyncio.to_thread(self._save_cached, text, result)
+
+    @staticmethod
+    def _parse_result(result: str) -> TaskCreatedSchema:
+        """
+        Check the quality of the LLM answer and strip the closing code fence.
+
+        :param result:
+        :return:
+        """
+        result = result.strip()
+
+        quality_check = False
+        if result.startswith("**Summary") and result.endswith("```"):
+            quality_check = True
+
+        result = result[:-3].strip()
+        return TaskCreatedSchema(
+            result=result, flg_ok_quality=quality_check, flg_llm_work_done=True
+        )
@@ -0,0 +1,88 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from loguru import logger
+
+from src.api.metrics import (
+    HTTP_REQUESTS,
+    STAGE_ERRORS,
+    STAGE_SECONDS,
+    TRACE_HEADER,
+    Counter,
+    Histogram,
+    MetricsRegistry,
+    span,
+    trace_requests,
+)
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency.", ("stage",), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.7, 3):
+        histogram.observe(value, stage="slack")
+
+    lines = histogram.render().splitlines()
+
+    assert lines[:2] == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+    ]
+    assert lines[2:] == [
+        'latency_seconds_bucket{stage="slack",le="0.1"} 1.0',
+        'latency_seconds_bucket{stage="slack",le="1.0"} 3.0',
+        'latency_seconds_bucket{stage="slack",le="+Inf"} 4.0',
+        'latency_seconds_sum{stage="slack"} 4.25',
+        'latency_seconds_count{stage="slack"} 4.0',
+    ]
+
+
+def test_labels_are_checked_and_escaped():
+    counter = Counter("errors_total", "Errors.", ("detail",))
+    counter.inc(detail='say "hi"\n')
+
+    with pytest.raises(ValueError):
+        counter.inc(stage="slack")
+
+    registry = MetricsRegistry()
+    registry.register(counter)
+    assert 'errors_total{detail="say \\"hi\\"\\n"} 1.0' in registry.render()
+
+
+def test_span_times_stages_and_counts_errors():
+    count = STAGE_SECONDS.count(stage="test_stage")
+    errors = STAGE_ERRORS.value(stage="test_stage")
+
+    with span("test_stage"):
+        pass
+    with pytest.raises(RuntimeError), span("test_stage"):
+        raise RuntimeError("Slack is down")
+
+    assert STAGE_SECONDS.count(stage="test_stage") == count + 2
+    assert STAGE_ERRORS.value(stage="test_stage") == errors + 1
+
+
+def test_requests_are_traced():
+    app = FastAPI()
+    app.middleware("http")(trace_requests)
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int) -> dict:
+        with span("traced_stage"):
+            return {"item_id": item_id}
+
+    records = []
+    sink = logger.add(lambda message: records.append(message.record), level="INFO")
+    try:
+        with TestClient(app) as client:
+            first = client.get("/items/1", headers={TRACE_HEADER: "abc"})
+            second = client.get("/items/2")
+    finally:
+        logger.remove(sink)
+
+    spans = [r["extra"] for r in records if r["extra"].get("span") == "traced_stage"]
+    assert first.headers[TRACE_HEADER] == "abc"
+    assert [extra["trace_id"] for extra in spans] == [
+        "abc",
+        second.headers[TRACE_HEADER],
+    ]
+    assert HTTP_REQUESTS.value(method="GET", path="/items/{item_id}", status=200) == 2
@@ -0,0 +1,77 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.api import ranker as ranker_module
+from src.api.ranker import Ranker, RankerInput
+
+
+class CharEncoder:
+    """Bag of characters embedding, enough to make similar strings close."""
+
+    def encode(self, texts, **kwargs):
+        vectors = np.array(
+            [[text.count(c) for c in "abcdefghijklmnopqrstuvwxyz"] for text in texts],
+            dtype=np.float32,
+        )
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1)
+
+
+class OverlapCrossEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, pairs, **kwargs):
+        self.calls.append(len(pairs))
+        return np.array([len(set(q.split()) & set(d.split())) for q, d in pairs])
+
+
+@pytest.fixture
+def ranker(monkeypatch):
+    data = pd.DataFrame(
+        {
+            "jira_key": [f"PRT-{i}" for i in range(6)],
+            "task_text": [
+                "build sales dashboard",
+                "fix etl job nulls",
+                "sql retention query",
+                "make team coffee",
+                "refactor pipeline speed",
+                None,
+            ],
+        }
+    )
+    monkeypatch.setattr(
+        ranker_module, "SentenceTransformer", lambda name: CharEncoder()
+    )
+    monkeypatch.setattr(
+        ranker_module, "CrossEncoder", lambda name: OverlapCrossEncoder()
+    )
+    monkeypatch.setattr(ranker_module, "read_dataframe", lambda path, columns: data)
+
+    return Ranker(index_path=Path("/nonexistent/task_embeddings.npy"), n_candidates=4)
+
+
+def test_rank_batch_single_cross_encoder_pass(ranker):
+    results = ranker.rank_batch(["sql retention query", "make coffee"], top_k=2)
+
+    assert ranker.model.calls == [8]
+    assert results[0][0]["corpus_id"] == 2
+    assert results[1][0]["corpus_id"] == 3
+    assert all(len(result) == 2 for result in results)
+
+
+def test_rank_matches_rank_batch(ranker):
+    assert ranker.rank("fix etl job", 3) == ranker.rank_batch(["fix etl job"], 3)[0]
+
+
+def test_call_and_related_tasks(ranker):
+    output = ranker(RankerInput(query="build dashboard", top_k=1))
+    related = ranker.related_tasks(ranker.rank("build dashboard", 1))
+
+    assert output.results[0]["task_text"] == ["PRT-0", "build sales dashboard"]
+    assert related == [
+        {"jira_key": "PRT-0", "task_text": "build sales dashboard", "score": 2}
+    ]
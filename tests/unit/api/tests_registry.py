@@ -0,0 +1,144 @@
+import asyncio
+import json
+import os
+
+import joblib
+import pytest
+from sklearn.dummy import DummyRegressor
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import Pipeline
+
+from src.api import registry as registry_module
+from src.api import services as services_module
+from src.api.registry import ModelRegistry
+from src.modeling.embedding_index import meta_path
+from src.modeling.sparse_model import SPARSE_MODEL_FILE, SparseTextRegression
+
+
+def fitted_model(value: float) -> DummyRegressor:
+    return DummyRegressor(strategy="constant", constant=value).fit([[0]], [value])
+
+
+def sparse_model() -> SparseTextRegression:
+    pipeline = Pipeline(
+        [("tfidf", CountVectorizer(ngram_range=(2, 2))), ("lr", LinearRegression())]
+    ).fit(["fix the api", "add a button"], [2, 6])
+    return SparseTextRegression.from_pipeline(pipeline)
+
+
+def touch(path):
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(registry_module, "Ranker", lambda: "ranker")
+    monkeypatch.setattr(registry_module, "TaskCreator", lambda **kw: "task_creator")
+    monkeypatch.setattr(registry_module, "get_llm_cache", lambda: None)
+    monkeypatch.setattr(registry_module, "TaskEstimator", lambda: "task_estimator")
+    monkeypatch.setattr(services_module, "get_slack_client", lambda: "slack_client")
+
+    model_path = tmp_path / "regression_model.pkl"
+    joblib.dump(fitted_model(4), model_path)
+    return ModelRegistry(model_path=model_path)
+
+
+def test_not_ready_before_load(registry):
+    assert not registry.ready
+    assert not registry.reload_if_changed()
+    with pytest.raises(RuntimeError):
+        registry.service
+
+
+def test_load_shares_service(registry):
+    registry.load()
+
+    assert registry.ready
+    assert registry.service is registry.service
+    assert registry.service.model.predict([[0]])[0] == 4
+
+
+def test_reload_swaps_only_model(registry):
+    registry.load()
+    old_service = registry.service
+    old_version = registry.model_version
+
+    assert not registry.reload_if_changed()
+
+    joblib.dump(fitted_model(8), registry.model_path)
+    touch(registry.model_path)
+
+    assert registry.reload_if_changed()
+    assert registry.model_version != old_version
+    assert registry.service is not old_service
+    assert registry.service.ranker is old_service.ranker
+    assert registry.service.model.predict([[0]])[0] == 8
+
+
+def test_broken_model_file_keeps_current(registry):
+    registry.load()
+    version = registry.model_version
+
+    registry.model_path.write_bytes(b"partially copied")
+
+    assert not registry.reload_if_changed()
+    assert registry.model_version == version
+    assert registry.service.model.predict([[0]])[0] == 4
+
+
+def test_loads_sparse_model(registry, tmp_path):
+    sparse_model().save(tmp_path / "model.npy")
+
+    registry.model_path = tmp_path / "model.npy"
+    registry.load()
+
+    assert isinstance(registry.service.model, SparseTextRegression)
+    assert registry.service.model.predict(["add a button"])[0] == pytest.approx(6)
+
+
+def test_reload_picks_up_published_sparse_model(registry, tmp_path, monkeypatch):
+    monkeypatch.setattr(registry_module.config, "models_dir", tmp_path)
+    default_registry = ModelRegistry()
+    default_registry.load()
+    assert default_registry.model_path == registry.model_path
+
+    sparse_path = tmp_path / SPARSE_MODEL_FILE
+    sparse_model().save(sparse_path)
+
+    assert default_registry.reload_if_changed()
+    assert default_registry.model_path == sparse_path
+    assert isinstance(default_registry.service.model, SparseTextRegression)
+
+    # a new intercept alone is a new model
+    meta = json.loads(meta_path(sparse_path).read_text())
+    meta["intercept"] += 1
+    meta_path(sparse_path).write_text(json.dumps(meta))
+    touch(meta_path(sparse_path))
+
+    assert default_registry.reload_if_changed()
+    assert default_registry.service.model.intercept == meta["intercept"]
+
+
+def test_watch_retries_failed_load(registry):
+    joblib.dump(fitted_model(4), registry.model_path.with_suffix(".tmp"))
+    registry.model_path.unlink()
+
+    with pytest.raises(FileNotFoundError):
+        registry.load()
+    assert isinstance(registry.load_error, FileNotFoundError)
+
+    async def watch_until_ready():
+        watcher = asyncio.create_task(registry.watch(0.01))
+        await asyncio.sleep(0.05)
+        assert not registry.ready
+        registry.model_path.with_suffix(".tmp").rename(registry.model_path)
+        while not registry.ready:
+            await asyncio.sleep(0.01)
+        watcher.cancel()
+
+    asyncio.run(asyncio.wait_for(watch_until_ready(), 5))
+
+    assert registry.load_error is None
+    assert registry.service.model.predict([[0]])[0] == 4
@@ -0,0 +1,126 @@
+import re
+
+import numpy as np
+import pytest
+
+from src.api.response_cache import ResponseCache
+from src.api.schemas import TaskInputSchema, TaskOutputSchema
+
+VOCABULARY = ["build", "report", "sales", "fix", "login", "button", "weekly"]
+
+
+def embed(texts: list[str]) -> np.ndarray:
+    vectors = np.array(
+        [
+            [re.findall(r"\w+", text).count(word) for word in VOCABULARY]
+            for text in texts
+        ],
+        dtype=np.float32,
+    )
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def output(task: TaskInputSchema, hours: int = 5) -> TaskOutputSchema:
+    return TaskOutputSchema(
+        **task.model_dump(), id="first", task_text="**Summary**", predicted_hours=hours
+    )
+
+
+def cache_response(cache: ResponseCache, task: TaskInputSchema, hours: int = 5):
+    lookup = cache.lookup(task, embed)
+    assert lookup.response is None
+    cache.store(lookup, output(task, hours))
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def cache(clock):
+    return ResponseCache(max_entries=3, ttl_seconds=60, clock=clock)
+
+
+def test_exact_hit_ignores_case_and_whitespace(cache):
+    cache_response(cache, TaskInputSchema(jira_title="Build report", slack_link="l"))
+
+    task = TaskInputSchema(jira_title="  build   REPORT ", slack_link="l")
+    result = cache.lookup(task).response
+
+    assert result.predicted_hours == 5
+    assert result.jira_title == task.jira_title
+    assert result.id != "first"
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_near_hit_requires_similarity_and_same_slack_link(cache):
+    cache_response(
+        cache,
+        TaskInputSchema(jira_title="Build sales report", jira_description="weekly"),
+    )
+
+    near = cache.lookup(
+        TaskInputSchema(jira_title="Build sales report.", jira_description="weekly"),
+        embed,
+    )
+    other_link = cache.lookup(
+        TaskInputSchema(
+            jira_title="Build sales report.", jira_description="weekly", slack_link="l"
+        ),
+        embed,
+    )
+    different = cache.lookup(TaskInputSchema(jira_title="Fix login button"), embed)
+
+    assert near.response.predicted_hours == 5
+    assert near.similarity >= cache.similarity_threshold
+    assert other_link.response is None
+    assert different.response is None
+    assert cache.stats()["near_hits"] == 1
+
+
+def test_entries_expire(cache, clock):
+    task = TaskInputSchema(jira_title="Build report")
+    cache_response(cache, task)
+
+    clock.now = 61
+
+    assert cache.lookup(task, embed).response is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_is_evicted(cache):
+    tasks = [TaskInputSchema(jira_title=f"{word} report") for word in VOCABULARY[:4]]
+    for task in tasks[:3]:
+        cache_response(cache, task)
+    cache.lookup(tasks[0])
+
+    cache_response(cache, tasks[3])
+
+    assert len(cache) == 3
+    assert cache.lookup(tasks[1]).response is None
+    assert cache.lookup(tasks[0]).response is not None
+    # the embedding of the evicted entry does not give near hits
+    assert cache.lookup(tasks[1], embed).response is None
+
+
+def test_model_version_change_drops_entries(cache):
+    cache.set_model_version("v1")
+    task = TaskInputSchema(jira_title="Build report")
+    lookup = cache.lookup(task, embed)
+    cache.set_model_version("v2")
+
+    cache.store(lookup, output(task), model_version="v1")
+    assert len(cache) == 0
+
+    cache.store(lookup, output(task), model_version="v2")
+    cache.set_model_version("v3")
+    assert cache.lookup(task, embed).response is None
@@ -0,0 +1,356 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from src.api import services as services_module
+from src.api.metrics import REGISTRY, STAGE_SECONDS, service_metrics
+from src.api.response_cache import ResponseCache
+from src.api.schemas import TaskInputSchema
+from src.api.services import AsyncTaskEstimatorService
+from src.data.slack_client import SlackClient
+from src.tools.ask_anthropic import LLMEvaluationResultSchema
+from src.tools.task_creator import TaskCreatedSchema, TaskCreator
+
+
+class SlowTaskCreator:
+    combine_json_to_task = staticmethod(TaskCreator.combine_json_to_task)
+
+    async def acreate_task(self, text: str) -> TaskCreatedSchema:
+        await asyncio.sleep(0.2)
+        return TaskCreatedSchema(
+            result=f"**Summary** {text}", flg_ok_quality=True, flg_llm_work_done=True
+        )
+
+    async def astream_task(self, text: str):
+        created = await self.acreate_task(text)
+        for word in created.result.split(" "):
+            yield word
+        yield created
+
+
+class LengthModel:
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, texts):
+        self.calls += 1
+        return [len(text) / 10 for text in texts]
+
+
+class EchoRanker:
+    def __init__(self):
+        self.calls = 0
+
+    def rank_batch(self, queries, top_k=5):
+        self.calls += 1
+        return [[{"corpus_id": i, "score": 1.0}] for i, _ in enumerate(queries)]
+
+    def related_tasks(self, results):
+        return [{"jira_key": f"PRT-{r['corpus_id']}", **r} for r in results]
+
+
+@pytest.fixture
+def service():
+    return AsyncTaskEstimatorService(
+        task_creator=SlowTaskCreator(),
+        task_estimator=object(),
+        ranker=EchoRanker(),
+        model=LengthModel(),
+        slack_client=SlackClient(token=""),
+    )
+
+
+def test_estimate_without_slack_link(service):
+    task = TaskInputSchema(jira_title="Build report", jira_description="Sales")
+
+    result = asyncio.run(service(task))
+
+    assert result.jira_title == "Build report"
+    assert result.task_text.startswith("**Summary**")
+    assert result.predicted_hours == round(len(result.task_text) / 10)
+
+
+def test_requests_run_concurrently(service):
+    tasks = [TaskInputSchema(jira_title=f"Task {i}") for i in range(20)]
+
+    async def run_all():
+        return await asyncio.gather(*(service(task) for task in tasks))
+
+    start = time.perf_counter()
+    results = asyncio.run(run_all())
+    elapsed = time.perf_counter() - start
+
+    assert [result.jira_title for result in results] == [t.jira_title for t in tasks]
+    assert elapsed < 1
+
+
+def test_batch_uses_one_predict_and_one_ranker_pass(service):
+    tasks = [TaskInputSchema(jira_title=f"Task {i}") for i in range(50)]
+
+    start = time.perf_counter()
+    results = asyncio.run(service.aestimate_batch(tasks, include_related_tasks=True))
+    elapsed = time.perf_counter() - start
+
+    assert service.model.calls == 1
+    assert service.ranker.calls == 1
+    assert [result.jira_title for result in results] == [t.jira_title for t in tasks]
+    assert results[7].related_tasks == [
+        {"jira_key": "PRT-7", "corpus_id": 7, "score": 1.0}
+    ]
+    # 50 tasks, 8 concurrent LLM calls of 0.2s each
+    assert elapsed < 2
+
+
+def test_batch_without_related_tasks(service):
+    results = asyncio.run(service.aestimate_batch([TaskInputSchema(jira_title="A")]))
+
+    assert results[0].related_tasks is None
+    assert service.ranker.calls == 0
+
+
+def test_repeated_and_near_duplicate_tasks_are_answered_from_cache(monkeypatch):
+    def embed(encoder, texts):
+        return np.array([[1.0, 0.0] if "sales" in t else [0.0, 1.0] for t in texts])
+
+    monkeypatch.setattr(services_module, "encode", embed)
+    model = LengthModel()
+    service = AsyncTaskEstimatorService(
+        task_creator=SlowTaskCreator(),
+        task_estimator=object(),
+        ranker=EchoRanker(),
+        model=model,
+        slack_client=SlackClient(token=""),
+        response_cache=ResponseCache(),
+    )
+    service.ranker.bi_encoder = None
+
+    async def run():
+        return [
+            await service(TaskInputSchema(jira_title=title))
+            for title in ("Build sales report", "build  sales report", "Sales report!")
+        ]
+
+    first, repeat, near = asyncio.run(run())
+
+    assert model.calls == 1
+    assert repeat.predicted_hours == near.predicted_hours == first.predicted_hours
+    assert near.jira_title == "Sales report!"
+    assert service.response_cache.stats()["near_hits"] == 1
+
+
+def test_concurrent_identical_requests_are_coalesced(service):
+    tasks = [TaskInputSchema(jira_title="Build report") for _ in range(10)]
+    tasks.append(TaskInputSchema(jira_title="Build  REPORT"))
+
+    async def run_all():
+        return await asyncio.gather(*(service(task) for task in tasks))
+
+    results = asyncio.run(run_all())
+
+    assert service.model.calls == 1
+    assert len({result.id for result in results}) == len(tasks)
+    assert results[-1].jira_title == "Build  REPORT"
+    assert service.stats()["single_flight"]["coalesced"] == 10
+
+
+def test_stream_emits_draft_before_the_llm_answer(service):
+    task = TaskInputSchema(jira_title="Build report", jira_description="Sales")
+
+    async def collect():
+        return [event async for event in service.astream_estimate(task)]
+
+    events = asyncio.run(collect())
+    names = [name for name, _ in events]
+
+    assert names[:2] == ["slack", "draft"]
+    assert set(names[2:-1]) == {"task_text"}
+    assert names[-1] == "final"
+    assert events[1][1]["predicted_hours"] == round(len("Build report\n\nSales") / 10)
+
+    final = events[-1][1]
+    assert final["task_text"] == " ".join(data["delta"] for _, data in events[2:-1])
+    assert final["predicted_hours"] == round(len(final["task_text"]) / 10)
+    assert final["related_tasks"] == [
+        {"jira_key": "PRT-0", "corpus_id": 0, "score": 1.0}
+    ]
+
+
+def test_stream_and_request_of_the_same_task_are_coalesced(service):
+    task = TaskInputSchema(jira_title="Build report")
+
+    async def collect():
+        return [event async for event in service.astream_estimate(task)]
+
+    async def run():
+        stream = asyncio.ensure_future(collect())
+        await asyncio.sleep(0.05)
+        result = await service(task)
+        return await stream, result
+
+    events, result = asyncio.run(run())
+
+    assert events[-1][0] == "final"
+    assert result.predicted_hours == events[-1][1]["predicted_hours"]
+    assert result.id != events[-1][1]["id"]
+    assert service.stats()["single_flight"]["coalesced"] == 1
+
+
+def test_service_metrics_cover_stages_and_caches(service):
+    service.response_cache = ResponseCache(similarity_threshold=2)
+    task = TaskInputSchema(jira_title="Build report")
+
+    async def run():
+        await service._aestimate_time_cached(task)
+        await service._aestimate_time_cached(task)
+
+    count = STAGE_SECONDS.count(stage="task_creator")
+    asyncio.run(run())
+    text = REGISTRY.render(service_metrics(service, "v1"))
+
+    assert STAGE_SECONDS.count(stage="task_creator") == count + 1
+    assert 'estimator_model_info{version="v1"} 1' in text
+    assert 'cache_lookups_total{cache="response",result="exact_hit"} 1.0' in text
+    assert 'single_flight_calls_total{result="coalesced"} 0' in text
+
+
+class DelayedTaskEstimator:
+    def __init__(self, latency_seconds: float, hours: int = 10):
+        self.latency_seconds = latency_seconds
+        self.hours = hours
+        self.queries = []
+
+    async def aestimate_task_time(self, query):
+        self.queries.append(query)
+        await asyncio.sleep(self.latency_seconds)
+        return LLMEvaluationResultSchema(estimated_time=self.hours, explanation="x")
+
+
+class FailingTaskEstimator(DelayedTaskEstimator):
+    async def aestimate_task_time(self, query):
+        await super().aestimate_task_time(query)
+        raise RuntimeError("Anthropic is down")
+
+
+class HistoryRanker(EchoRanker):
+    def related_tasks(self, results):
+        return [
+            {
+                "jira_key": "PRT-1",
+                "assignee_level_order": 2,
+                "weeks_since_member_join": 30,
+            }
+        ]
+
+
+def hedged_service(task_estimator, response_cache=None):
+    return AsyncTaskEstimatorService(
+        task_creator=SlowTaskCreator(),
+        task_estimator=task_estimator,
+        ranker=HistoryRanker(),
+        model=LengthModel(),
+        slack_client=SlackClient(token=""),
+        response_cache=response_cache,
+        hedged=True,
+    )
+
+
+def test_hedged_estimate_combines_model_and_llm(monkeypatch):
+    monkeypatch.setattr(services_module.config, "llm_estimate_weight", 0.5)
+    task_estimator = DelayedTaskEstimator(0.01, hours=10)
+    service = hedged_service(task_estimator)
+
+    result = asyncio.run(service(TaskInputSchema(jira_title="Build report")))
+
+    assert result.llm_predicted_hours == 10
+    assert result.predicted_hours == round((10 + result.model_predicted_hours) / 2)
+    assert result.related_tasks[0]["jira_key"] == "PRT-1"
+    # the assignee is not known, the one of the related tasks is used
+    assert task_estimator.queries[0].assignee_level_order == 2
+    assert task_estimator.queries[0].weeks_since_member_join == 30
+
+
+def test_late_llm_estimate_is_cached_in_background(monkeypatch):
+    monkeypatch.setattr(services_module.config, "llm_estimate_deadline_seconds", 0.3)
+    service = hedged_service(
+        DelayedTaskEstimator(0.5), ResponseCache(similarity_threshold=2)
+    )
+    task = TaskInputSchema(jira_title="Build report", assignee_level_order=1)
+
+    async def run():
+        start = time.perf_counter()
+        first = await service(task)
+        elapsed = time.perf_counter() - start
+        await asyncio.gather(*service._background_tasks)
+        return first, elapsed, await service(task)
+
+    first, elapsed, second = asyncio.run(run())
+
+    assert elapsed < 0.45
+    assert first.llm_predicted_hours is None
+    assert first.predicted_hours == first.model_predicted_hours
+    assert second.llm_predicted_hours == 10
+    assert service.response_cache.stats()["exact_hits"] == 1
+
+
+def test_hedged_stream_caches_only_the_combined_estimate(monkeypatch):
+    monkeypatch.setattr(services_module.config, "llm_estimate_deadline_seconds", 0.3)
+    service = hedged_service(
+        DelayedTaskEstimator(0.5), ResponseCache(similarity_threshold=2)
+    )
+    task = TaskInputSchema(jira_title="Build report", assignee_level_order=1)
+
+    async def run():
+        events = [event async for event in service.astream_estimate(task)]
+        cached = len(service.response_cache)
+        await asyncio.gather(*service._background_tasks)
+        return events[-1][1], cached, await service(task)
+
+    final, cached, second = asyncio.run(run())
+
+    assert final["llm_predicted_hours"] is None
+    assert final["related_tasks"] is not None
+    assert cached == 0
+    assert second.llm_predicted_hours == 10
+
+
+@pytest.mark.parametrize(
+    "task_estimator",
+    [DelayedTaskEstimator(0.01, hours=None), FailingTaskEstimator(0.01)],
+    ids=["no_estimate", "llm_error"],
+)
+def test_hedged_model_only_answer_is_cached(task_estimator):
+    service = hedged_service(task_estimator, ResponseCache(similarity_threshold=2))
+    task = TaskInputSchema(jira_title="Build report", assignee_level_order=1)
+
+    async def run():
+        return await service(task), await service(task)
+
+    first, second = asyncio.run(run())
+
+    assert first.llm_predicted_hours is None
+    assert second.predicted_hours == first.model_predicted_hours
+    assert service.response_cache.stats()["exact_hits"] == 1
+    assert len(task_estimator.queries) == 1
+
+
+def test_late_llm_error_caches_the_model_estimate(monkeypatch):
+    monkeypatch.setattr(services_module.config, "llm_estimate_deadline_seconds", 0.1)
+    service = hedged_service(
+        FailingTaskEstimator(0.2), ResponseCache(similarity_threshold=2)
+    )
+    task = TaskInputSchema(jira_title="Build report", assignee_level_order=1)
+
+    async def run():
+        first = await service(task)
+        cached = len(service.response_cache)
+        await asyncio.gather(*service._background_tasks)
+        return first, cached, await service(task)
+
+    first, cached, second = asyncio.run(run())
+
+    assert cached == 0
+    assert second.predicted_hours == first.model_predicted_hours
+    assert service.response_cache.stats()["exact_hits"] == 1
+    assert not service._llm_pending
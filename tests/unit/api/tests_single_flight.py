@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from src.api.single_flight import SingleFlight
+
+
+def test_concurrent_calls_with_one_key_share_one_execution():
+    single_flight = SingleFlight()
+    executions = []
+
+    async def compute(key):
+        executions.append(key)
+        await asyncio.sleep(0.05)
+        return key.upper()
+
+    async def run():
+        return await asyncio.gather(
+            *(single_flight.run(key, lambda key=key: compute(key)) for key in "aaab")
+        )
+
+    results = asyncio.run(run())
+
+    assert [result for result, _ in results] == ["A", "A", "A", "B"]
+    assert [shared for _, shared in results] == [False, True, True, False]
+    assert sorted(executions) == ["a", "b"]
+    assert single_flight.stats() == {
+        "calls": 4,
+        "executions": 2,
+        "coalesced": 2,
+        "coalescing_ratio": 0.5,
+        "in_flight": 0,
+    }
+
+
+def test_sequential_calls_are_not_coalesced():
+    single_flight = SingleFlight()
+
+    async def compute():
+        return 1
+
+    async def run():
+        for _ in range(3):
+            await single_flight.run("key", compute)
+
+    asyncio.run(run())
+
+    assert single_flight.executions == 3
+
+
+def test_error_is_raised_to_all_callers():
+    single_flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("LLM is down")
+
+    async def run():
+        return await asyncio.gather(
+            *(single_flight.run("key", fail) for _ in range(3)), return_exceptions=True
+        )
+
+    errors = asyncio.run(run())
+
+    assert all(isinstance(error, ValueError) for error in errors)
+    assert single_flight.executions == 1
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    single_flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        first = asyncio.create_task(single_flight.run("key", compute))
+        second = asyncio.create_task(single_flight.run("key", compute))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == ("done", True)
@@ -0,0 +1,62 @@
+from src.data.filter_tasks_n_fields_jira_json import (
+    filter_jira_tasks,
+    index_employees_by_email,
+)
+from src.data.storage import append_jsonl, iter_latest_by_key
+
+EMPLOYEES = [
+    {
+        "email": "dev@example.com",
+        "level": "middle",
+        "join_date": "2024-01-01",
+        "level_order": 2,
+    }
+]
+
+
+def issue(key: str, status: str = "Done", email: str = "dev@example.com") -> dict:
+    return {
+        "key": key,
+        "fields": {
+            "summary": f"Task {key}",
+            "description": "See https://team.slack.com/archives/C1/p1700000000000100?x=1",
+            "issuetype": {"id": "1"},
+            "status": {"name": status},
+            "created": "2024-01-15T10:00:00.000+0000",
+            "timeestimate": None,
+            "timeoriginalestimate": 7200,
+            "assignee": {"emailAddress": email},
+        },
+    }
+
+
+def test_pipeline_filters_and_enriches():
+    data = [issue("PRT-1"), issue("PRT-2", status="To Do"), issue("PRT-3", email="x")]
+
+    tasks = list(filter_jira_tasks(data, index_employees_by_email(EMPLOYEES), {"1"}))
+
+    assert tasks == [
+        {
+            "jira_key": "PRT-1",
+            "jira_title": "Task PRT-1",
+            "jira_description": data[0]["fields"]["description"],
+            "jira_created": "2024-01-15T10:00:00.000+0000",
+            "assignee_email": "dev@example.com",
+            "assignee_level_order": 2,
+            "slack_link": "https://team.slack.com/archives/C1/p1700000000000100",
+            "weeks_since_member_join": 2,
+            "time_to_complete_hours": 2,
+        }
+    ]
+
+
+def test_latest_version_wins_when_streaming(tmp_path):
+    path = tmp_path / "raw.jsonl"
+    append_jsonl(path, [issue("PRT-1"), issue("PRT-2"), issue("PRT-1", "To Do")])
+
+    records = list(iter_latest_by_key(path))
+
+    assert [(r["key"], r["fields"]["status"]["name"]) for r in records] == [
+        ("PRT-2", "Done"),
+        ("PRT-1", "To Do"),
+    ]
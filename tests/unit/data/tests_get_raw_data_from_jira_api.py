@@ -0,0 +1,95 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from src.data import get_raw_data_from_jira_api as jira
+from src.data.storage import latest_by_key, read_records
+
+
+class FakeJira:
+    """Local stand-in for the search and bulkfetch endpoints."""
+
+    def __init__(self, issues: list[dict]):
+        self.issues = {issue["key"]: issue for issue in issues}
+        self.searches = []
+        self.bulk_calls = 0
+        self._lock = threading.Lock()
+
+    def post(self, url, json, timeout):
+        if url.endswith("/search/jql"):
+            self.searches.append(json)
+            keys = [
+                key
+                for key, issue in self.issues.items()
+                if "updated >=" not in json["jql"]
+                or issue["fields"]["updated"] >= "2024-02"
+            ]
+            start = int(json.get("nextPageToken") or 0)
+            end = start + json["maxResults"]
+            payload = {
+                "issues": [{"key": key} for key in keys[start:end]],
+                "isLast": end >= len(keys),
+            }
+            if end < len(keys):
+                payload["nextPageToken"] = str(end)
+        else:
+            with self._lock:
+                self.bulk_calls += 1
+            payload = {"issues": [self.issues[key] for key in json["issueIdsOrKeys"]]}
+
+        return SimpleNamespace(json=lambda: payload, raise_for_status=lambda: None)
+
+
+def issue(i: int, updated: str) -> dict:
+    return {"key": f"PRT-{i}", "fields": {"updated": updated, "summary": str(i)}}
+
+
+@pytest.fixture
+def fake_jira(monkeypatch):
+    fake = FakeJira([issue(i, "2024-01-10T10:00:00.000+0000") for i in range(250)])
+    monkeypatch.setattr(jira, "make_session", lambda pool_size: fake)
+    return fake
+
+
+def test_full_fetch_pages_and_streams(fake_jira, tmp_path):
+    output_path = tmp_path / "raw.jsonl"
+
+    jira.main(
+        output_path=output_path,
+        incremental=False,
+        watermark_path=tmp_path / "watermark.json",
+        watermark_overlap_hours=24,
+        max_workers=3,
+        page_size=100,
+    )
+
+    records = list(read_records(output_path))
+    assert len(fake_jira.searches) == 3
+    assert fake_jira.bulk_calls == 3
+    assert sorted(record["key"] for record in records) == sorted(fake_jira.issues)
+    watermark = json.loads((tmp_path / "watermark.json").read_text())
+    assert watermark["updated"].startswith("2024-01-10T10:00:00")
+
+
+def test_incremental_fetches_delta_only(fake_jira, tmp_path):
+    output_path = tmp_path / "raw.jsonl"
+    kwargs = {
+        "output_path": output_path,
+        "watermark_path": tmp_path / "watermark.json",
+        "watermark_overlap_hours": 24,
+        "max_workers": 2,
+        "page_size": 100,
+    }
+    jira.main(incremental=True, **kwargs)
+
+    fake_jira.issues["PRT-7"] = issue(7, "2024-02-01T09:00:00.000+0000")
+    fake_jira.bulk_calls = 0
+    jira.main(incremental=True, **kwargs)
+
+    assert 'updated >= "2024-01-09 10:00"' in fake_jira.searches[-1]["jql"]
+    assert fake_jira.bulk_calls == 1
+    records = {r["key"]: r for r in latest_by_key(read_records(output_path))}
+    assert len(records) == 250
+    assert records["PRT-7"]["fields"]["updated"].startswith("2024-02-01")
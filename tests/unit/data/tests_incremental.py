@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+from src.data.datasets import ENRICHED_SCHEMA
+from src.data.incremental import SOURCE_HASH_FIELD, IncrementalUpdate, manifest_path
+from src.data.storage import write_dataset
+
+
+def task(key: str, title: str) -> dict:
+    return {"jira_key": key, "jira_title": title}
+
+
+def run(output_path, data, calls, stage_version="v1", **kwargs):
+    update = IncrementalUpdate(output_path, stage_version, **kwargs)
+    to_process = update.split(data)
+    calls.extend(record["jira_key"] for record in to_process)
+    processed = [
+        {**record, "slack_thread_messages": "fetched"} for record in to_process
+    ]
+    result = update.merge(processed)
+    write_dataset(output_path, result, ENRICHED_SCHEMA)
+    update.write_manifest()
+    return result
+
+
+def test_only_new_and_changed_records_are_processed(tmp_path):
+    output_path = tmp_path / "enriched.parquet"
+    calls = []
+    run(
+        output_path, [task("PRT-1", "a"), task("PRT-2", "b"), task("PRT-3", "c")], calls
+    )
+
+    calls.clear()
+    result = run(
+        output_path, [task("PRT-4", "d"), task("PRT-2", "B"), task("PRT-1", "a")], calls
+    )
+
+    assert calls == ["PRT-4", "PRT-2"]
+    assert [r["jira_key"] for r in result] == ["PRT-4", "PRT-2", "PRT-1"]
+    assert result[1]["jira_title"] == "B"
+    assert all(r[SOURCE_HASH_FIELD] for r in result)
+    manifest = json.loads(manifest_path(output_path).read_text())
+    assert manifest == {
+        "total": 3,
+        "new": 1,
+        "changed": 1,
+        "retried": 0,
+        "processed": 2,
+        "carried_over": 1,
+        "removed": 1,
+    }
+
+
+def test_stage_version_and_reusable_force_reprocessing(tmp_path):
+    output_path = tmp_path / "enriched.parquet"
+    data = [task("PRT-1", "a"), task("PRT-2", "b")]
+    calls = []
+    run(output_path, data, calls)
+
+    calls.clear()
+    run(output_path, data, calls, stage_version="v2")
+    assert calls == ["PRT-1", "PRT-2"]
+
+    calls.clear()
+    run(
+        output_path,
+        data,
+        calls,
+        stage_version="v2",
+        reusable=lambda r: r["jira_key"] != "PRT-2",
+    )
+    assert calls == ["PRT-2"]
+
+    calls.clear()
+    run(output_path, data, calls, stage_version="v2", enabled=False)
+    assert calls == ["PRT-1", "PRT-2"]
+
+
+def test_duplicate_keys_are_rejected(tmp_path):
+    output_path = tmp_path / "enriched.parquet"
+    run(output_path, [task("PRT-1", "a")], [])
+
+    update = IncrementalUpdate(output_path, "v1")
+    with pytest.raises(ValueError, match="PRT-1"):
+        update.split([task("PRT-1", "a"), task("PRT-2", "b"), task("PRT-1", "A")])
+
+
+def test_merge_checks_the_number_of_outputs(tmp_path):
+    update = IncrementalUpdate(tmp_path / "enriched.parquet", "v1")
+    to_process = update.split([task("PRT-1", "a"), task("PRT-2", "b")])
+
+    with pytest.raises(ValueError, match="Expected 2"):
+        update.merge(to_process[:1])
@@ -0,0 +1,26 @@
+import os
+from functools import partial
+
+from src.data.parallel import iter_chunks, parallel_map_chunks
+
+
+def keep_multiples(chunk: list[int], of: int):
+    for item in chunk:
+        if item % of == 0:
+            yield item, os.getpid()
+
+
+def test_chunks_are_lazy_and_complete():
+    assert list(iter_chunks(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(iter_chunks([], 3)) == []
+
+
+def test_parallel_results_keep_input_order():
+    func = partial(keep_multiples, of=3)
+
+    sequential = list(parallel_map_chunks(func, range(1000), workers=1, chunk_size=7))
+    parallel = list(parallel_map_chunks(func, range(1000), workers=3, chunk_size=7))
+
+    assert [item for item, _ in parallel] == [item for item, _ in sequential]
+    assert [item for item, _ in parallel] == list(range(0, 1000, 3))
+    assert {pid for _, pid in parallel} != {os.getpid()}
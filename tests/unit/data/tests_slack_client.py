@@ -0,0 +1,135 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.data import slack_client as slack_module
+from src.data.slack_client import SlackClient, aclose_slack_client, get_slack_client
+from src.tools.kv_cache import SQLiteCache
+
+
+class FakeSession:
+    """Replays queued conversations.replies responses."""
+
+    def __init__(self, responses: list):
+        self.responses = list(responses)
+        self.calls = []
+
+    def get(self, url, headers, params, timeout):
+        self.calls.append(params)
+        return self.responses.pop(0)
+
+    def close(self):
+        pass
+
+
+def response(status_code: int, payload: dict | None = None, headers=None):
+    return SimpleNamespace(
+        status_code=status_code, json=lambda: payload, headers=headers or {}
+    )
+
+
+OLD_TS = "1700000000.000100"
+MESSAGES = [{"type": "message", "text": "hi", "ts": OLD_TS}]
+
+
+@pytest.fixture
+def client(tmp_path):
+    client = SlackClient(
+        token="",
+        cache=SQLiteCache(tmp_path / "slack.sqlite"),
+        requests_per_minute=6000,
+    )
+    yield client
+    client.cache.close()
+
+
+def test_cached_thread_is_fetched_once(client):
+    client.session = FakeSession([response(200, {"ok": True, "messages": MESSAGES})])
+
+    assert client.fetch_thread_messages("C1", OLD_TS) == MESSAGES
+    assert client.fetch_thread_messages("C1", OLD_TS) == MESSAGES
+    assert len(client.session.calls) == 1
+
+
+def test_retries_after_rate_limit(client, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(slack_module.time, "sleep", sleeps.append)
+    client.session = FakeSession(
+        [
+            response(429, headers={"Retry-After": "3"}),
+            response(200, {"ok": True, "messages": MESSAGES}),
+        ]
+    )
+
+    assert client.fetch_thread_messages("C1", OLD_TS) == MESSAGES
+    assert sleeps == [3.0]
+
+
+def test_errors_are_not_cached(client):
+    client.session = FakeSession(
+        [
+            response(200, {"ok": False, "error": "thread_not_found"}),
+            response(200, {"ok": True, "messages": MESSAGES}),
+        ]
+    )
+
+    assert client.fetch_thread_messages("C1", OLD_TS) == []
+    assert client.fetch_thread_messages("C1", OLD_TS) == MESSAGES
+
+
+def test_active_thread_expires(client, monkeypatch):
+    recent_ts = f"{time.time():.6f}"
+    stored = {}
+    monkeypatch.setattr(
+        client.cache,
+        "set",
+        lambda key, value, ttl_seconds: stored.update(ttl=ttl_seconds),
+    )
+    client.session = FakeSession([response(200, {"ok": True, "messages": []})])
+
+    client.fetch_thread_messages("C1", recent_ts)
+
+    assert stored["ttl"] == client.active_thread_ttl_seconds
+
+
+def test_async_fetch_uses_the_cache_off_the_event_loop(client, monkeypatch):
+    session = FakeSession([response(200, {"ok": True, "messages": MESSAGES})])
+
+    async def get(url, headers, params):
+        return session.get(url, headers, params, timeout=None)
+
+    monkeypatch.setattr(client.async_client, "get", get)
+    cache_threads = []
+    for name in ("get", "set"):
+        method = getattr(client.cache, name)
+
+        def record(*args, method=method, **kwargs):
+            cache_threads.append(threading.get_ident())
+            return method(*args, **kwargs)
+
+        monkeypatch.setattr(client.cache, name, record)
+
+    async def run():
+        return [await client.afetch_thread_messages("C1", OLD_TS) for _ in range(2)]
+
+    assert asyncio.run(run()) == [MESSAGES, MESSAGES]
+    assert len(session.calls) == 1
+    assert len(cache_threads) == 3
+    assert threading.get_ident() not in cache_threads
+
+
+def test_closed_default_client_is_replaced(tmp_path, monkeypatch):
+    monkeypatch.setattr(slack_module, "SLACK_THREADS_CACHE_PATH", tmp_path / "t.db")
+    monkeypatch.setattr(slack_module, "_default_client", None)
+    client = get_slack_client()
+
+    asyncio.run(aclose_slack_client(client))
+    new_client = get_slack_client()
+
+    assert client.async_client.is_closed
+    assert new_client is not client
+    assert not new_client.async_client.is_closed
+    asyncio.run(aclose_slack_client(new_client))
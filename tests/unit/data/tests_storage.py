@@ -0,0 +1,74 @@
+import json
+
+import pyarrow.parquet as pq
+
+from src.data import datasets
+from src.data.datasets import FINAL_SCHEMA
+from src.data.storage import (
+    iter_json_array,
+    read_dataframe,
+    read_dataset,
+    write_dataset,
+    write_json_array,
+)
+
+TASKS = [
+    {
+        "assignee_level_order": i % 3,
+        "jira_key": f"PRT-{i}",
+        "jira_created": f"2024-01-{i + 1:02d}T10:00:00.000+0000",
+        "weeks_since_member_join": i,
+        "time_to_complete_hours": i + 1,
+        "task_text": f"**Summary** task {i}",
+        "debug_only": "dropped",
+    }
+    for i in range(25)
+]
+
+
+def test_json_array_round_trip_in_small_chunks(tmp_path):
+    path = tmp_path / "tasks.json"
+
+    assert write_json_array(path, TASKS) == 25
+    assert json.loads(path.read_text()) == TASKS
+    assert list(iter_json_array(path, chunk_size=16)) == TASKS
+
+
+def test_parquet_is_typed_compressed_and_projected(tmp_path):
+    path = tmp_path / "tasks.parquet"
+
+    assert write_dataset(path, iter(TASKS), FINAL_SCHEMA, batch_size=10) == 25
+
+    parquet_file = pq.ParquetFile(path)
+    assert parquet_file.schema_arrow == FINAL_SCHEMA
+    assert parquet_file.metadata.num_row_groups == 3
+    assert parquet_file.metadata.row_group(0).column(0).compression == "ZSTD"
+
+    data = read_dataframe(path, columns=["jira_key", "task_text"])
+    assert list(data.columns) == ["jira_key", "task_text"]
+    assert data["jira_key"].tolist() == [task["jira_key"] for task in TASKS]
+
+
+def test_missing_fields_are_null(tmp_path):
+    path = tmp_path / "tasks.parquet"
+
+    write_dataset(path, [{"jira_key": "PRT-1"}], FINAL_SCHEMA)
+
+    assert read_dataset(path)[0] == {
+        "assignee_level_order": None,
+        "jira_key": "PRT-1",
+        "jira_created": None,
+        "weeks_since_member_join": None,
+        "time_to_complete_hours": None,
+        "task_text": None,
+    }
+
+
+def test_export_parquet_to_json(tmp_path):
+    parquet_path, json_path = tmp_path / "tasks.parquet", tmp_path / "tasks.json"
+    write_dataset(parquet_path, TASKS, FINAL_SCHEMA)
+
+    datasets.main(input_path=parquet_path, output_path=json_path)
+
+    exported = json.loads(json_path.read_text())
+    assert exported[0] == {k: v for k, v in TASKS[0].items() if k != "debug_only"}
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from src.modeling.embedding_index import (
+    INDEX_FORMAT_VERSION,
+    TaskEmbeddingIndex,
+    texts_fingerprint,
+)
+
+
+@pytest.fixture
+def index():
+    rng = np.random.default_rng(42)
+    embeddings = rng.normal(size=(200, 16)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    meta = {"version": INDEX_FORMAT_VERSION, "model_name": "test", "fingerprint": "x"}
+    return TaskEmbeddingIndex(embeddings, meta)
+
+
+def test_search_matches_full_sort(index):
+    queries = index.embeddings[[3, 50, 199]]
+
+    indices, scores = index.search(queries, top_n=10)
+
+    expected = np.argsort(-(queries @ index.embeddings.T), axis=1)[:, :10]
+    assert indices.shape == (3, 10)
+    np.testing.assert_array_equal(indices, expected)
+    np.testing.assert_array_equal(indices[:, 0], [3, 50, 199])
+    assert np.all(np.diff(scores, axis=1) <= 0)
+
+
+def test_search_top_n_larger_than_corpus(index):
+    indices, _ = index.search(index.embeddings[0], top_n=1000)
+
+    assert indices.shape == (1, len(index))
+    assert sorted(indices[0]) == list(range(len(index)))
+
+
+def test_save_load_mmap(index, tmp_path):
+    path = tmp_path / "task_embeddings.npy"
+    index.save(path)
+
+    loaded = TaskEmbeddingIndex.load(path)
+
+    assert isinstance(loaded.embeddings, np.memmap)
+    assert loaded.meta == index.meta
+    np.testing.assert_array_equal(
+        loaded.search(index.embeddings[:5], 3)[0],
+        index.search(index.embeddings[:5], 3)[0],
+    )
+
+
+def test_fingerprint_depends_on_order():
+    assert texts_fingerprint(["a", "b"]) != texts_fingerprint(["b", "a"])
+    assert texts_fingerprint(["ab", ""]) != texts_fingerprint(["a", "b"])
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.modeling.evaluation import (
+    OnlineWeightedAccuracy,
+    bootstrap_weighted_accuracy,
+    evaluate,
+    grouped_weighted_accuracy,
+    hour_buckets,
+)
+from src.modeling.metrics import weighted_accuracy
+
+
+@pytest.fixture
+def predictions():
+    rng = np.random.default_rng(0)
+    y_true = rng.integers(1, 24, size=2000).astype(float)
+    y_pred = np.clip(y_true + rng.normal(0, 3, size=len(y_true)), 1, None)
+    levels = rng.integers(0, 4, size=len(y_true))
+    return y_true, y_pred, levels
+
+
+def test_groups_match_weighted_accuracy(predictions):
+    y_true, y_pred, levels = predictions
+
+    result = grouped_weighted_accuracy(y_true, y_pred, levels)
+
+    for level in range(4):
+        mask = levels == level
+        assert result[level].count == mask.sum()
+        assert result[level].value == pytest.approx(
+            weighted_accuracy(y_true[mask], y_pred[mask])
+        )
+
+
+def test_hour_buckets():
+    assert hour_buckets([1, 2, 5, 8, 40]).tolist() == [
+        "<2",
+        "2-4",
+        "4-8",
+        "8-16",
+        ">=16",
+    ]
+
+
+def test_bootstrap_interval_contains_value(predictions):
+    y_true, y_pred, _ = predictions
+
+    estimate = bootstrap_weighted_accuracy(
+        y_true, y_pred, n_resamples=300, max_batch_elements=100_000
+    )
+
+    assert estimate.value == pytest.approx(weighted_accuracy(y_true, y_pred))
+    assert estimate.lower < estimate.value < estimate.upper
+    assert estimate.upper - estimate.lower < 0.1
+
+
+def test_evaluate_levels_with_missing_values(predictions):
+    y_true, y_pred, levels = predictions
+    levels = pd.Series(levels, dtype="Int64")
+    levels[:10] = pd.NA
+
+    report = evaluate(y_true, y_pred, levels=levels, n_resamples=50)
+
+    assert report["by_level"]["-1"]["count"] == 10
+    assert sum(group["count"] for group in report["by_bucket"].values()) == 2000
+
+
+def test_online_accumulator_matches_batch(predictions):
+    y_true, y_pred, levels = predictions
+    accumulator = OnlineWeightedAccuracy(random_state=0)
+
+    for start in range(0, len(y_true), 300):
+        batch = slice(start, start + 300)
+        accumulator.update(y_true[batch], y_pred[batch], levels[batch])
+    # a restart in the middle of the stream keeps the state
+    accumulator = OnlineWeightedAccuracy.from_dict(accumulator.to_dict())
+    accumulator.update([], [])
+
+    report = accumulator.report()
+    expected = evaluate(y_true, y_pred, levels=levels, n_resamples=200)
+    overall = report["weighted_accuracy"]
+    assert overall["count"] == 2000
+    assert overall["value"] == pytest.approx(expected["weighted_accuracy"]["value"])
+    assert overall["lower"] < overall["value"] < overall["upper"]
+    for name in ("by_bucket", "by_level"):
+        assert report[name].keys() == expected[name].keys()
+        for group, estimate in expected[name].items():
+            assert report[name][group]["value"] == pytest.approx(estimate["value"])
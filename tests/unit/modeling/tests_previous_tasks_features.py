@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from src.data.storage import read_dataframe, write_dataset
+from src.modeling.embedding_index import (
+    INDEX_FORMAT_VERSION,
+    TaskEmbeddingIndex,
+    texts_fingerprint,
+)
+from src.modeling.previous_tasks_features import build_previous_task_features, main
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    n = 300
+    # rows are shuffled, the creation time defines the order
+    created = pd.date_range("2024-01-01", periods=n, freq="h", tz="UTC")
+    permutation = rng.permutation(n)
+    return pd.DataFrame(
+        {
+            "jira_key": [f"PRT-{i}" for i in permutation],
+            "jira_created": created[permutation].strftime("%Y-%m-%dT%H:%M:%S.000+0000"),
+            "task_text": [f"task {i}" for i in permutation],
+            "time_to_complete_hours": permutation % 16 + 1,
+        }
+    )
+
+
+@pytest.fixture
+def embeddings(data):
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(len(data), 8)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def brute_force(data, embeddings, top_k, window, min_history):
+    position = data["jira_key"].str[4:].astype(int).to_numpy()
+    order = np.argsort(position)
+    expected = {}
+    for t, row in enumerate(order):
+        if t < min_history:
+            continue
+        earlier = order[max(0, t - window) : t]
+        scores = embeddings[earlier] @ embeddings[row]
+        best = earlier[np.argsort(-scores)[:top_k]]
+        expected[data["jira_key"][row]] = data["jira_key"][best].tolist()
+    return expected
+
+
+def test_matches_brute_force_without_leakage(data, embeddings):
+    features = build_previous_task_features(
+        data,
+        embeddings,
+        top_k=3,
+        window=40,
+        n_candidates=3,
+        min_history=5,
+        batch_size=32,
+    )
+
+    expected = brute_force(data, embeddings, top_k=3, window=40, min_history=5)
+    assert features["jira_key"].tolist() == data["jira_key"].tolist()
+    for key, prev_keys in zip(features["jira_key"], features["prev_task_keys"]):
+        if key in expected:
+            assert prev_keys == expected[key]
+            assert all(int(p[4:]) < int(key[4:]) for p in prev_keys)
+        else:
+            assert prev_keys is None
+
+    row = features.set_index("jira_key").loc["PRT-100"]
+    hours = dict(zip(data["jira_key"], data["time_to_complete_hours"]))
+    assert row["prev_task_hours"] == [hours[k] for k in row["prev_task_keys"]]
+    assert row["prev_task_eta_0"] == row["prev_task_hours"][0]
+
+
+def test_scorer_reorders_candidates(data, embeddings):
+    def by_key_number(pairs):
+        return np.array([int(candidate.split()[-1]) for _, candidate in pairs])
+
+    features = build_previous_task_features(
+        data,
+        embeddings,
+        top_k=2,
+        window=10,
+        n_candidates=10,
+        min_history=10,
+        scorer=by_key_number,
+    )
+
+    row = features.set_index("jira_key").loc["PRT-50"]
+    assert row["prev_task_keys"] == ["PRT-49", "PRT-48"]
+    assert row["prev_task_scores"] == [49.0, 48.0]
+
+
+def test_main_writes_parquet(data, embeddings, tmp_path):
+    input_path = tmp_path / "final_data_to_train.parquet"
+    output_path = tmp_path / "previous_tasks.parquet"
+    index_path = tmp_path / "task_embeddings.npy"
+    write_dataset(input_path, data.to_dict(orient="records"))
+    meta = {
+        "version": INDEX_FORMAT_VERSION,
+        "model_name": "test",
+        "fingerprint": texts_fingerprint(data["task_text"].tolist()),
+    }
+    TaskEmbeddingIndex(embeddings, meta).save(index_path)
+
+    main(
+        input_path=input_path,
+        output_path=output_path,
+        index_path=index_path,
+        bi_encoder_name="test",
+        top_k=3,
+        min_history=5,
+    )
+
+    assert pq.read_schema(output_path).field("prev_task_eta_0").type == pa.int64()
+    features = read_dataframe(output_path).set_index("jira_key")
+    assert len(features) == len(data)
+    # the earliest tasks have no history
+    assert features["prev_task_eta_0"].isna().sum() == 5
+    row = features.loc["PRT-100"]
+    assert row["prev_task_eta_0"] == row["prev_task_hours"][0]
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import Pipeline
+
+from src.modeling.sparse_model import SparseTextRegression, load_model
+
+WORDS = ["Fix", "add", "API", "button", "report", "login", "slow", "query", "ёлка"]
+
+
+@pytest.fixture
+def pipeline():
+    rng = np.random.default_rng(0)
+    texts = [" ".join(rng.choice(WORDS, size=10)) + "." for _ in range(80)]
+    y = rng.integers(2, 12, size=len(texts))
+    return Pipeline(
+        [
+            ("tfidf", CountVectorizer(ngram_range=(2, 2))),
+            ("lr", LinearRegression()),
+        ]
+    ).fit(texts, y)
+
+
+QUERIES = [
+    "fix slow query, add API button",
+    "ЁЛКА login report report login",
+    "unknown words only",
+    "",
+]
+
+
+def test_predictions_match_pipeline(pipeline, tmp_path):
+    path = tmp_path / "regression_model.npy"
+    SparseTextRegression.from_pipeline(pipeline).save(path)
+
+    model = load_model(path)
+
+    assert isinstance(model.features, np.memmap)
+    assert len(model) == len(pipeline[0].vocabulary_)
+    np.testing.assert_allclose(
+        model.predict(QUERIES), pipeline.predict(QUERIES), rtol=1e-5, atol=1e-4
+    )
+
+
+def test_pruning_drops_small_coefficients(pipeline):
+    threshold = np.median(np.abs(pipeline[-1].coef_))
+
+    model = SparseTextRegression.from_pipeline(pipeline, prune_below=threshold)
+
+    assert len(model) + model.meta["n_pruned"] == len(pipeline[0].vocabulary_)
+    assert np.all(np.abs(model.features["coef"]) > threshold)
+
+
+def test_unsupported_vectorizer(pipeline):
+    pipeline[0].set_params(binary=True)
+
+    with pytest.raises(ValueError, match="binary"):
+        SparseTextRegression.from_pipeline(pipeline)
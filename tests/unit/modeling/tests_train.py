@@ -0,0 +1,90 @@
+import json
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import Pipeline
+
+from src.data.storage import write_dataset
+from src.modeling import train
+from src.modeling.sparse_model import load_model
+from src.modeling.train import TokenizedCorpus, fit_model, transform_target
+
+WORDS = ["fix", "add", "api", "button", "report", "login", "slow", "query", "page"]
+
+
+@pytest.fixture
+def tasks():
+    rng = np.random.default_rng(0)
+    return [
+        {
+            "jira_key": f"PRT-{i}",
+            "task_text": " ".join(rng.choice(WORDS, size=8)),
+            "time_to_complete_hours": int(rng.integers(1, 16)),
+            "assignee_level_order": i % 3,
+        }
+        for i in range(60)
+    ]
+
+
+def test_fold_columns_match_fitted_vectorizer(tasks):
+    texts = [task["task_text"] for task in tasks]
+    corpus = TokenizedCorpus.from_texts(texts)
+    rows = np.arange(0, 60, 3)
+
+    columns = corpus.vocabulary(rows)
+
+    vectorizer = CountVectorizer(ngram_range=(2, 2))
+    expected = vectorizer.fit_transform([texts[i] for i in rows])
+    assert corpus.terms[columns].tolist() == vectorizer.get_feature_names_out().tolist()
+    assert (corpus.matrix[rows][:, columns] != expected).nnz == 0
+
+
+def test_model_predicts_as_plain_pipeline(tasks):
+    texts = [task["task_text"] for task in tasks]
+    y = transform_target(np.array([task["time_to_complete_hours"] for task in tasks]))
+
+    model = fit_model(TokenizedCorpus.from_texts(texts), y)
+
+    expected = Pipeline(
+        [
+            ("tfidf", CountVectorizer(ngram_range=(2, 2))),
+            ("lr", LinearRegression()),
+        ]
+    ).fit(texts, y)
+    queries = ["fix slow query page", "add api login button"]
+    np.testing.assert_allclose(model.predict(queries), expected.predict(queries))
+
+
+def test_main_saves_and_publishes_version(tasks, tmp_path):
+    input_path = tmp_path / "final_data_to_train.parquet"
+    write_dataset(input_path, tasks)
+    (tmp_path / "test_tasks.csv").write_text("jira_key\nPRT-0\nPRT-1\n")
+    models_dir = tmp_path / "models"
+    models_dir.mkdir()
+
+    train.main(
+        input_path=input_path,
+        test_keys_path=tmp_path / "test_tasks.csv",
+        models_dir=models_dir,
+        workers=2,
+    )
+
+    (version_dir,) = (models_dir / "versions").iterdir()
+    metrics = json.loads((models_dir / "metrics.json").read_text())
+    assert metrics == json.loads((version_dir / "metrics.json").read_text())
+    assert metrics["version"] == version_dir.name
+    assert metrics["n_train"] == 58
+    assert len(metrics["w_acc_test"]["folds"]) == 3
+    assert metrics["training_time_seconds"] > 0
+    assert set(metrics["out_of_fold"]["by_level"]) == {"0", "1", "2"}
+
+    model = joblib.load(models_dir / "regression_model.pkl")
+    sparse_model = load_model(models_dir / "regression_model.npy")
+    np.testing.assert_allclose(
+        sparse_model.predict(["fix slow query page"]),
+        model.predict(["fix slow query page"]),
+        rtol=1e-5,
+    )
@@ -0,0 +1,56 @@
+import time
+
+import pytest
+
+from src.tools.kv_cache import SQLiteCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SQLiteCache(tmp_path / "cache.sqlite", max_entries=3, evict_every=1)
+
+
+def test_get_set(cache):
+    assert cache.get("missing") is None
+
+    cache.set("key", {"result": "text", "flg": True})
+
+    assert cache.get("key") == {"result": "text", "flg": True}
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_ttl(cache):
+    cache.set("key", 1, ttl_seconds=-1)
+    cache.set("forever", 2)
+
+    assert cache.get("key") is None
+    assert cache.get("forever") == 2
+
+
+def test_lru_eviction(cache):
+    for i in range(3):
+        cache.set(f"key-{i}", i)
+        time.sleep(0.01)
+    cache.get("key-0")
+
+    cache.set("key-3", 3)
+
+    assert len(cache) == 3
+    assert cache.get("key-1") is None
+    assert cache.get("key-0") == 0
+
+
+def test_shared_file(cache):
+    cache.set("key", "value")
+
+    assert SQLiteCache(cache.path).get("key") == "value"
+
+
+def test_make_key_is_content_addressed():
+    assert SQLiteCache.make_key("model", "prompt", "text") == SQLiteCache.make_key(
+        "model", "prompt", "text"
+    )
+    assert SQLiteCache.make_key("model", "prompt", "text") != SQLiteCache.make_key(
+        "model", "prompt2", "text"
+    )
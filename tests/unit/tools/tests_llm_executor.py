@@ -0,0 +1,154 @@
+import threading
+import time
+from functools import partial
+from types import SimpleNamespace
+
+import pytest
+
+from src.data.combine_text_info_into_one_task import (
+    cached_task,
+    create_task,
+    handle_task_creation,
+    task_description_from_item,
+)
+from src.tools.kv_cache import SQLiteCache
+from src.tools.llm_executor import LLMBatchExecutor, is_retryable
+from src.tools.llm_usage import LLMUsage
+from src.tools.rate_limit import TokenBucket
+from src.tools.task_creator import TaskCreator
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class FlakyLLM:
+    """Fails with 429 on the first call for every item."""
+
+    def __init__(self):
+        self.calls = []
+        self.usage = LLMUsage()
+        self._lock = threading.Lock()
+
+    def __call__(self, text: str) -> dict:
+        with self._lock:
+            first_call = text not in self.calls
+            self.calls.append(text)
+        if first_call:
+            raise StatusError(429)
+
+        self.usage.record(None)
+        time.sleep(0.05)
+        return {"result": text.upper()}
+
+
+def make_executor(func, tmp_path, **kwargs):
+    return LLMBatchExecutor(
+        func,
+        checkpoint_path=tmp_path / "checkpoint.jsonl",
+        requests_per_minute=60_000,
+        backoff_base_seconds=0.01,
+        **kwargs,
+    )
+
+
+def test_retries_rate_limit_errors(tmp_path):
+    llm = FlakyLLM()
+    executor = make_executor(llm, tmp_path, usage=llm.usage)
+
+    results = executor.run({f"PRT-{i}": f"task {i}" for i in range(20)})
+
+    assert results == {f"PRT-{i}": {"result": f"TASK {i}"} for i in range(20)}
+    assert executor.stats.retries == 20
+    assert executor.stats.usage["requests"] == 20
+    assert executor.stats.requests_per_second > 0
+
+
+def test_resumes_from_checkpoint(tmp_path):
+    executor = make_executor(FlakyLLM(), tmp_path)
+    executor.run({"PRT-1": "a", "PRT-2": "b"})
+
+    llm = FlakyLLM()
+    executor = make_executor(llm, tmp_path)
+    results = executor.run({"PRT-1": "a", "PRT-2": "b, edited", "PRT-3": "c"})
+
+    assert executor.stats.resumed == 1
+    assert sorted(set(llm.calls)) == ["b, edited", "c"]
+    assert list(results) == ["PRT-1", "PRT-2", "PRT-3"]
+
+
+def test_non_retryable_errors_are_reported(tmp_path):
+    def bad_request(text):
+        raise StatusError(400)
+
+    executor = make_executor(bad_request, tmp_path)
+
+    assert executor.run({"PRT-1": "a"}) == {}
+    assert executor.errors == {"PRT-1": "HTTP 400"}
+    assert executor.stats.retries == 0
+    assert not (tmp_path / "checkpoint.jsonl").exists()
+
+
+@pytest.mark.parametrize(
+    ("status_code", "expected"), [(429, True), (500, True), (529, True), (400, False)]
+)
+def test_is_retryable(status_code, expected):
+    assert is_retryable(StatusError(status_code)) is expected
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=100, capacity=1)
+
+    start = time.perf_counter()
+    for _ in range(21):
+        bucket.acquire()
+
+    assert time.perf_counter() - start >= 0.18
+
+
+def test_cached_items_do_not_take_rate_limit_tokens(tmp_path):
+    calls = []
+
+    def llm(text):
+        calls.append(text)
+        return {"result": text.upper()}
+
+    cache = {f"task {i}": {"result": f"cached {i}"} for i in range(20)}
+    executor = make_executor(llm, tmp_path, lookup=cache.get)
+    executor.rate_limiter = TokenBucket(rate=1, capacity=1)
+
+    start = time.perf_counter()
+    results = executor.run({f"PRT-{i}": f"task {i}" for i in range(21)})
+
+    assert time.perf_counter() - start < 0.5
+    assert results["PRT-3"] == {"result": "cached 3"}
+    assert results["PRT-20"] == {"result": "TASK 20"}
+    assert executor.stats.cached == 20
+    assert calls == ["task 20"]
+
+
+def test_combine_stage_answers_cached_tasks_without_the_bucket(tmp_path):
+    creator = TaskCreator(cache=SQLiteCache(tmp_path / "llm_cache.sqlite"))
+    creator.client = SimpleNamespace(
+        messages=SimpleNamespace(
+            create=lambda **kwargs: SimpleNamespace(
+                content=[SimpleNamespace(text="**Summary:** done\n```")]
+            )
+        )
+    )
+    data = [{"jira_key": f"PRT-{i}", "jira_title": f"Task {i}"} for i in range(10)]
+    for item in data:
+        create_task(creator, task_description_from_item(creator, item))
+
+    executor = LLMBatchExecutor(
+        partial(create_task, creator), lookup=partial(cached_task, creator)
+    )
+    executor.rate_limiter = TokenBucket(rate=1, capacity=1)
+    start = time.perf_counter()
+    result = handle_task_creation(data, creator, executor)
+
+    assert time.perf_counter() - start < 0.5
+    assert executor.stats.cached == 10
+    assert all(item["prepared_task"]["flg_llm_work_done"] for item in result)
@@ -0,0 +1,128 @@
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+from src.data.combine_text_info_into_one_task import handle_task_creation_batch
+from src.data.remove_pii_from_data import remove_pii_from_data_batch
+from src.tools.message_batch import MessageBatchRunner
+from src.tools.pii_purifier import PIIPurifier
+from src.tools.task_creator import TaskCreator
+
+
+def message(text: str):
+    return SimpleNamespace(
+        content=[SimpleNamespace(text=text)],
+        usage=SimpleNamespace(input_tokens=100, output_tokens=10),
+    )
+
+
+class FakeBatches:
+    """Local stand-in for ``client.messages.batches``."""
+
+    def __init__(self, answer, polls_until_ended: int = 2, fail_when=None):
+        self.answer = answer
+        self.polls_until_ended = polls_until_ended
+        self.fail_when = fail_when or (lambda params: False)
+        self.batches = {}
+        self._ids = itertools.count()
+
+    def create(self, requests):
+        batch_id = f"msgbatch_{next(self._ids)}"
+        self.batches[batch_id] = {"requests": requests, "polls": 0}
+        return SimpleNamespace(id=batch_id, processing_status="in_progress")
+
+    def retrieve(self, batch_id):
+        batch = self.batches[batch_id]
+        batch["polls"] += 1
+        ended = batch["polls"] >= self.polls_until_ended
+        return SimpleNamespace(
+            id=batch_id,
+            processing_status="ended" if ended else "in_progress",
+            request_counts={"succeeded": len(batch["requests"])},
+        )
+
+    def results(self, batch_id):
+        for request in self.batches[batch_id]["requests"]:
+            if self.fail_when(request["params"]):
+                result = SimpleNamespace(type="errored", error="overloaded_error")
+            else:
+                result = SimpleNamespace(
+                    type="succeeded", message=message(self.answer(request["params"]))
+                )
+            yield SimpleNamespace(custom_id=request["custom_id"], result=result)
+
+    def cancel(self, batch_id):
+        self.batches[batch_id]["cancelled"] = True
+
+
+def prompt_text(params) -> str:
+    return params["messages"][0]["content"][-1]["text"]
+
+
+def make_runner(batches, **kwargs):
+    client = SimpleNamespace(messages=SimpleNamespace(batches=batches))
+    return MessageBatchRunner(client, poll_interval_seconds=0, **kwargs)
+
+
+def test_runner_maps_results_to_keys_across_chunks():
+    batches = FakeBatches(answer=lambda params: params["tag"])
+    runner = make_runner(batches, max_requests_per_batch=3)
+
+    messages = runner.run({("PRT", i): {"tag": f"answer {i}"} for i in range(7)})
+
+    assert len(batches.batches) == 3
+    assert list(messages) == [("PRT", i) for i in range(7)]
+    assert messages[("PRT", 5)].content[0].text == "answer 5"
+
+
+def test_runner_times_out_and_cancels():
+    batches = FakeBatches(answer=lambda params: "", polls_until_ended=10**9)
+    runner = make_runner(batches, timeout_seconds=0)
+
+    with pytest.raises(TimeoutError):
+        runner.run({"PRT-1": {}})
+    assert batches.batches["msgbatch_0"]["cancelled"]
+
+
+def test_task_creation_batch_by_jira_key():
+    batches = FakeBatches(
+        answer=lambda params: "**Summary:** " + prompt_text(params)[-40:] + "```",
+        fail_when=lambda params: "broken" in prompt_text(params),
+    )
+    creator = TaskCreator()
+    data = [
+        {"jira_key": "PRT-1", "jira_title": "Sales dashboard"},
+        {"jira_key": "PRT-2", "jira_title": "broken ticket"},
+        {"jira_key": "PRT-3", "jira_title": "Retention SQL"},
+    ]
+
+    result = handle_task_creation_batch(data, creator, make_runner(batches))
+
+    assert [item["jira_key"] for item in result] == ["PRT-1", "PRT-2", "PRT-3"]
+    assert result[0]["prepared_task"]["flg_ok_quality"]
+    assert not result[1]["prepared_task"]["flg_llm_work_done"]
+    assert result[1]["prepared_task"]["error"] == "overloaded_error"
+    assert result[2]["prepared_task"]["flg_llm_work_done"]
+
+
+def test_pii_batch_replaces_fields():
+    batches = FakeBatches(
+        answer=lambda params: "<pii_analysis>found</pii_analysis> [NAME] text"
+    )
+    data = [
+        {"jira_key": "PRT-1", "jira_title": "John", "jira_description": "Doe"},
+        {"jira_key": "PRT-2", "jira_title": "Jane", "jira_description": None},
+    ]
+
+    result = remove_pii_from_data_batch(
+        data,
+        ["jira_title", "jira_description"],
+        PIIPurifier(),
+        make_runner(batches),
+    )
+
+    assert len(batches.batches["msgbatch_0"]["requests"]) == 3
+    assert result[0]["jira_title"] == "[NAME] text"
+    assert result[0]["jira_description"] == "[NAME] text"
+    assert result[1]["jira_description"] is None
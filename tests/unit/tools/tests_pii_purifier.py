@@ -1,10 +1,16 @@
+import json
+
 import pytest
+from src.data.remove_pii_from_data import remove_pii_from_data
+from src.tools.llm_executor import LLMBatchExecutor
+from src.tools import pii_redactor
 from src.tools.pii_purifier import PIIPurifier
+from src.tools.pii_redactor import PIIRedactor
 
 
 @pytest.fixture
 def purifier():
-    return PIIPurifier()
+    return PIIPurifier(redactor=PIIRedactor(names=["John Doe"]))
 
 
 def test_purify(purifier):
@@ -13,4 +19,144 @@ def test_purify(purifier):
         " 555-555-5555, and test@mail.com"
     )
     purify_text = purifier.purify(text)
-    assert purify_text == text
+    assert purify_text == (
+        "This is a test text with some PII like [NAME], [PHONE], and [EMAIL]"
+    )
+
+
+def test_redactor_keeps_non_pii():
+    redactor = PIIRedactor(names=["Ivan", "Petrov"])
+    text = (
+        "Ping <@U04ABC123|ivan> and [~accountid:5b10a2844c20165700ede21g] about "
+        "PRT-123 from 2024-01-15, see https://team.slack.com/archives/C1/p1700 "
+        "or call +7 (999) 123-45-67. Ivan Petrov, ivan.petrov@corp.ru"
+    )
+
+    result = redactor.redact(text)
+
+    assert result.text == (
+        "Ping [SLACK_USER] and [JIRA_USER] about PRT-123 from 2024-01-15, see "
+        "[URL] or call [PHONE]. [NAME] [NAME], [EMAIL]"
+    )
+    assert result.counts == {
+        "URL": 1,
+        "EMAIL": 1,
+        "SLACK_USER": 1,
+        "JIRA_USER": 1,
+        "PHONE": 1,
+        "NAME": 2,
+    }
+    assert not result.flagged
+
+
+@pytest.mark.parametrize("automaton", [True, False], ids=["automaton", "regex"])
+def test_names_after_length_changing_lowercase(monkeypatch, automaton):
+    if automaton:
+        pytest.importorskip("ahocorasick")
+    else:
+        monkeypatch.setattr(pii_redactor, "ahocorasick", None)
+    redactor = PIIRedactor(names=["Ivan", "Petrov"])
+
+    # "İ".lower() is two characters long
+    result = redactor.redact("İstanbul office: Ivan Petrov, İzmir")
+
+    assert result.text == "İstanbul office: [NAME] [NAME], İzmir"
+    assert result.counts["NAME"] == 2
+
+
+def test_unknown_names_are_flagged():
+    result = PIIRedactor().redact("Ask Maria Ivanova about the report")
+
+    assert result.text == "Ask Maria Ivanova about the report"
+    assert result.flagged
+
+
+def test_flagged_text_goes_to_llm(monkeypatch):
+    purifier = PIIPurifier(redactor=PIIRedactor(), llm_fallback=True)
+    monkeypatch.setattr(purifier, "todo_purify", lambda text: "[LLM] " + text)
+
+    assert purifier.purify("Ask Maria Ivanova") == "[LLM] Ask Maria Ivanova"
+    assert purifier.purify("mail me: a@b.io") == "mail me: [EMAIL]"
+
+
+def test_remove_pii_in_process_pool(monkeypatch):
+    purifier = PIIPurifier(redactor=PIIRedactor(names=["John"]), llm_fallback=True)
+    monkeypatch.setattr(purifier, "todo_purify", lambda text: "[LLM]")
+    data = [
+        {"jira_title": f"Task {i} for John", "jira_description": "mail a@b.io"}
+        for i in range(20)
+    ] + [{"jira_title": "Ask Maria Ivanova", "jira_description": None}]
+
+    result = remove_pii_from_data(
+        data, ["jira_title", "jira_description"], purifier, workers=2
+    )
+
+    assert result[0] == {
+        "jira_title": "Task 0 for [NAME]",
+        "jira_description": "mail [EMAIL]",
+    }
+    assert result[-1] == {"jira_title": "[LLM]", "jira_description": None}
+
+
+def test_llm_fallback_survives_errors_and_resumes(tmp_path):
+    purifier = PIIPurifier(redactor=PIIRedactor(), llm_fallback=True)
+    data = [
+        {"jira_key": f"PRT-{i}", "jira_title": f"Ask Maria Ivanova {i}"}
+        for i in range(3)
+    ]
+    calls = []
+    failing = {"Ask Maria Ivanova 1"}
+
+    def purify(text):
+        calls.append(text)
+        if text in failing:
+            raise ValueError("bad request")
+        return "[LLM]"
+
+    def run():
+        executor = LLMBatchExecutor(
+            purify,
+            checkpoint_path=tmp_path / "checkpoint.jsonl",
+            requests_per_minute=60_000,
+        )
+        return remove_pii_from_data(
+            [dict(item) for item in data],
+            ["jira_title"],
+            purifier,
+            executor=executor,
+        )
+
+    first = run()
+    assert [item["jira_title"] for item in first] == [
+        "[LLM]",
+        "Ask Maria Ivanova 1",
+        "[LLM]",
+    ]
+
+    calls.clear()
+    failing.clear()
+    second = run()
+    assert calls == ["Ask Maria Ivanova 1"]
+    assert all(item["jira_title"] == "[LLM]" for item in second)
+
+
+def test_employee_dictionary_keeps_only_full_names(tmp_path):
+    path = tmp_path / "employees.json"
+    employees = [
+        {
+            "first_name": "Mark",
+            "last_name": "Long",
+            "slack_name": "ml",
+            "email": "mark.long@corp.io",
+        },
+        {"name": "Support", "email": "support@corp.io"},
+    ]
+    path.write_text(json.dumps(employees))
+    redactor = PIIRedactor.from_employees(path, flag_residual=False)
+
+    text = "Mark the long task for support, ask Mark Long or mark.long"
+    assert redactor(text) == ("Mark the long task for support, ask [NAME] or [NAME]")
+
+    employees[0]["last_name"] = "Short"
+    path.write_text(json.dumps(employees))
+    assert PIIRedactor.from_employees(path).fingerprint != redactor.fingerprint
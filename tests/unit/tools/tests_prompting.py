@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+
+from src.tools.llm_usage import LLMUsage
+from src.tools.prompting import CACHE_CONTROL, cacheable_prompt_content
+
+
+def test_static_prefix_is_cacheable():
+    content = cacheable_prompt_content(
+        "EXAMPLES",
+        "Instructions.\n<text>{{TEXT}}</text>\nMore {{OTHER}}.",
+        {"{{TEXT}}": "ticket", "{{OTHER}}": "rules"},
+    )
+
+    assert content == [
+        {"type": "text", "text": "EXAMPLES", "cache_control": CACHE_CONTROL},
+        {
+            "type": "text",
+            "text": "Instructions.\n<text>",
+            "cache_control": CACHE_CONTROL,
+        },
+        {"type": "text", "text": "ticket</text>\nMore rules."},
+    ]
+
+
+def test_same_text_as_plain_replacement():
+    prompt = "A {{X}} b {{Y}} c"
+    variables = {"{{X}}": "1", "{{Y}}": "2"}
+
+    content = cacheable_prompt_content("", prompt, variables)
+
+    assert "".join(block["text"] for block in content) == "A 1 b 2 c"
+    assert "cache_control" not in content[-1]
+
+
+def test_usage_records_cache_tokens():
+    usage = LLMUsage()
+    for cache_write, cache_read in [(1000, 0), (0, 1000)]:
+        usage.record(
+            SimpleNamespace(
+                usage=SimpleNamespace(
+                    input_tokens=50,
+                    output_tokens=10,
+                    cache_creation_input_tokens=cache_write,
+                    cache_read_input_tokens=cache_read,
+                )
+            )
+        )
+
+    assert usage.snapshot() == {
+        "requests": 2,
+        "input_tokens": 100,
+        "output_tokens": 20,
+        "cache_creation_input_tokens": 1000,
+        "cache_read_input_tokens": 1000,
+    }
+    assert usage.cache_hit_ratio == 1000 / 2100
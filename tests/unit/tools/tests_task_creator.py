@@ -1,6 +1,11 @@
+import asyncio
+import threading
+
 import pytest
+from src.tools.kv_cache import SQLiteCache
 from src.tools.task_creator import TaskCreator
 from pathlib import Path
+from types import SimpleNamespace
 import json
 
 
@@ -19,3 +24,128 @@ def test_creator(creator):
     print(creator_result)
 
     assert creator_result.flg_ok_quality
+
+
+class FakeMessages:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        text = "**Summary:** done\n```"
+        return SimpleNamespace(content=[SimpleNamespace(text=text)])
+
+
+@pytest.fixture
+def cached_creator(tmp_path):
+    creator = TaskCreator(cache=SQLiteCache(tmp_path / "llm_cache.sqlite"))
+    creator.client = SimpleNamespace(messages=FakeMessages())
+    return creator
+
+
+def test_same_text_calls_llm_once(cached_creator):
+    first = cached_creator.create_task("ticket")
+    second = cached_creator.create_task("ticket")
+
+    assert cached_creator.client.messages.calls == 1
+    assert first == second
+    assert first.flg_ok_quality
+
+
+def test_changed_input_or_prompt_misses(cached_creator, tmp_path):
+    cached_creator.create_task("ticket")
+    cached_creator.create_task("ticket, edited")
+    assert cached_creator.client.messages.calls == 2
+
+    prompt_path = tmp_path / "prompt.json"
+    prompt_path.write_text(
+        '{"prompt": "new {{UNSTRUCTURED_TEXT}}", "examples": "",'
+        ' "assistant_prefilled_part": ""}'
+    )
+    other = TaskCreator(system_prompt_path=prompt_path, cache=cached_creator.cache)
+    other.client = cached_creator.client
+    other.create_task("ticket")
+    assert cached_creator.client.messages.calls == 3
+
+
+def test_errors_are_not_cached(cached_creator):
+    def fail(**kwargs):
+        raise RuntimeError("overloaded")
+
+    cached_creator.client = SimpleNamespace(messages=SimpleNamespace(create=fail))
+    assert not cached_creator.create_task("ticket").flg_llm_work_done
+
+    cached_creator.client = SimpleNamespace(messages=FakeMessages())
+    assert cached_creator.create_task("ticket").flg_llm_work_done
+    assert cached_creator.client.messages.calls == 1
+
+
+def test_async_cache_access_does_not_block_the_event_loop(cached_creator):
+    messages = FakeMessages()
+
+    async def create(**kwargs):
+        return messages.create(**kwargs)
+
+    cached_creator.async_client = SimpleNamespace(
+        messages=SimpleNamespace(create=create)
+    )
+    cache_threads = []
+    for name in ("get", "set"):
+        method = getattr(cached_creator.cache, name)
+
+        def record(*args, method=method, **kwargs):
+            cache_threads.append(threading.get_ident())
+            return method(*args, **kwargs)
+
+        setattr(cached_creator.cache, name, record)
+
+    async def run():
+        first = await cached_creator.acreate_task("ticket")
+        return first, await cached_creator.acreate_task("ticket")
+
+    first, second = asyncio.run(run())
+
+    assert second == first
+    assert messages.calls == 1
+    assert len(cache_threads) == 3
+    assert threading.get_ident() not in cache_threads
+
+
+class FakeStream:
+    def __init__(self, fragments):
+        self.fragments = fragments
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    @property
+    async def text_stream(self):
+        for fragment in self.fragments:
+            yield fragment
+
+    async def get_final_message(self):
+        return SimpleNamespace(content=[SimpleNamespace(text="".join(self.fragments))])
+
+
+def collect(creator, text):
+    async def run():
+        return [fragment async for fragment in creator.astream_task(text)]
+
+    return asyncio.run(run())
+
+
+def test_stream_yields_fragments_then_result(cached_creator):
+    fragments = ["**Summary:**", " done", "\n```"]
+    cached_creator.async_client = SimpleNamespace(
+        messages=SimpleNamespace(stream=lambda **kwargs: FakeStream(fragments))
+    )
+
+    *streamed, result = collect(cached_creator, "ticket")
+
+    assert streamed == fragments
+    assert result.result == "**Summary:** done"
+    assert result.flg_ok_quality
+    assert collect(cached_creator, "ticket") == [result.result, result]